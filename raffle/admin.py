@@ -1,75 +1,138 @@
 import json
 from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import QuerySet
 from django.urls import reverse
+from django.utils.functional import cached_property
 from django.utils.html import format_html
 
-from .models import Raffle, Payment, Ticket
-from .views import _confirm_tickets_from_payment_id
+from . import search
+from .caching import invalidate_active_raffle, invalidate_prizes
+from .models import Raffle, Payment, Ticket, Reservation, Prize, StatementLine
+from .views import _confirm_payments_batch
+
+
+# Máximo de pagos con conflicto detallados en mensajes individuales
+MAX_CONFLICT_MESSAGES = 20
+# Máximo de pagos que una acción del admin confirma dentro de la request;
+# para más, usar `manage.py confirm_payments` (muestra el avance por lote)
+MAX_ADMIN_CONFIRM = 500
+
+
+def _numbers_label(numbers, ranges=()) -> str:
+    return ", ".join([str(n) for n in numbers] + [f"{lo}-{hi}" for lo, hi in ranges])
+
+
+def _too_many_to_confirm(request, count: int) -> bool:
+    if count <= MAX_ADMIN_CONFIRM:
+        return False
+    messages.error(
+        request,
+        f"Seleccionaste más de {MAX_ADMIN_CONFIRM} pagos. Para confirmar lotes grandes "
+        f"usa `python manage.py confirm_payments --file ids.txt` (un ID por línea).",
+    )
+    return True
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    En Postgres, si el planner estima más de EXACT_COUNT_BELOW filas, usa esa
+    estimación en vez de un COUNT(*) que recorre toda la tabla. El total de
+    páginas queda aproximado, que en listas de este tamaño da lo mismo.
+    """
+    EXACT_COUNT_BELOW = 10_000
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if isinstance(qs, QuerySet) and connections[qs.db].vendor == "postgresql":
+            estimate = self._estimate(qs)
+            if estimate >= self.EXACT_COUNT_BELOW:
+                return estimate
+        return super().count
+
+    @staticmethod
+    def _estimate(qs) -> int:
+        sql, params = qs.order_by().query.sql_with_params()
+        with connections[qs.db].cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Listados de tablas grandes: sin COUNT(*) exactos (ni el total "de N" al
+    filtrar) y con las FK de list_display en la misma consulta.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.action(description="Marcar como pagados y crear tickets")
 def mark_as_paid_and_create_tickets(modeladmin, request, queryset):
     """
     Admin action para:
-    - Marcar el Payment como paid
-    - Crear los Tickets a partir de metadata['chosen_numbers'].
+    - Marcar los Payments como paid
+    - Crear los Tickets a partir de sus reservas / metadata['chosen_numbers'].
     Pensado especialmente para pagos por transferencia.
-    """
-    count_ok = 0
 
-    for p in queryset:
-        try:
-            ok = _confirm_tickets_from_payment_id(p.gateway_payment_id)
-        except Exception as e:
-            messages.error(
-                request,
-                (
-                    f"Error al confirmar tickets para payment ID={p.id} "
-                    f"(gateway_payment_id={p.gateway_payment_id}): {e!r}"
-                ),
-            )
-            continue
-
-        if not ok:
-            messages.warning(
-                request,
-                f"No se encontró el payment {p.gateway_payment_id} para confirmar.",
-            )
-            continue
+    Confirma todo el lote junto (ver _confirm_payments_batch): ante números
+    repetidos entre pagos seleccionados gana el más antiguo. Hasta
+    MAX_ADMIN_CONFIRM pagos por vez.
+    """
+    ids = list(queryset.values_list("id", flat=True)[:MAX_ADMIN_CONFIRM + 1])
+    if _too_many_to_confirm(request, len(ids)):
+        return
+    try:
+        summary = _confirm_payments_batch(ids)
+    except Exception as e:
+        messages.error(request, f"Error al confirmar los pagos seleccionados: {e!r}")
+        return
 
-        # Revisar metadata por conflictos
-        meta = p.metadata or {}
-        conflict = meta.get("conflict_numbers") or []
-        paid_nums = meta.get("paid_numbers") or meta.get("chosen_numbers") or []
+    results = summary["results"]
+    with_conflict = [r for r in results if r["conflict_numbers"] or r["conflict_ranges"]]
+    tickets = sum(len(r["paid_numbers"]) + len(r["paid_ranges"]) for r in results)
 
-        if conflict:
-            messages.warning(
-                request,
-                (
-                    f"Payment {p.id} marcado como pagado. "
-                    f"Se emitieron tickets para: {', '.join(str(n) for n in paid_nums)}. "
-                    f"Los siguientes números ya estaban vendidos: "
-                    f"{', '.join(str(n) for n in conflict)}. "
-                    f"Contacta a la persona para ofrecer otros números o devolver esa parte."
-                ),
-            )
-        else:
-            messages.success(
-                request,
-                (
-                    f"Payment {p.id} marcado como pagado y tickets creados para: "
-                    f"{', '.join(str(n) for n in paid_nums)}."
-                ),
-            )
+    for r in with_conflict[:MAX_CONFLICT_MESSAGES]:
+        paid = _numbers_label(r["paid_numbers"], r["paid_ranges"])
+        conflicts = _numbers_label(r["conflict_numbers"], r["conflict_ranges"])
+        messages.warning(
+            request,
+            (
+                f"Payment {r['payment_id']} marcado como pagado. "
+                f"Se emitieron tickets para: {paid or '-'}. "
+                f"Los siguientes números ya estaban vendidos: "
+                f"{conflicts}. "
+                f"Contacta a la persona para ofrecer otros números o devolver esa parte."
+            ),
+        )
+    if len(with_conflict) > MAX_CONFLICT_MESSAGES:
+        messages.warning(
+            request,
+            f"... y {len(with_conflict) - MAX_CONFLICT_MESSAGES} pagos más con conflictos.",
+        )
 
-        count_ok += 1
+    if summary["missing"]:
+        messages.warning(
+            request,
+            f"No se encontraron {len(summary['missing'])} pagos para confirmar.",
+        )
 
-    if count_ok > 1:
-        messages.info(request, f"Se procesaron {count_ok} pagos.")
+    messages.success(
+        request,
+        (
+            f"Se procesaron {len(results)} pagos: {tickets} tickets emitidos, "
+            f"{len(with_conflict)} pagos con conflictos."
+        ),
+    )
 
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(LargeTableAdmin):
     list_display = (
         "id",
         "raffle",
@@ -83,29 +146,33 @@ class PaymentAdmin(admin.ModelAdmin):
         "conflict_numbers_display",
     )
     list_filter = ("gateway", "status", "raffle")
+    list_select_related = ("raffle",)
+    # Solo para mostrar la caja de búsqueda: se busca en SearchToken
     search_fields = ("buyer_name", "buyer_email", "gateway_payment_id")
+    search_help_text = "Nombre, email, teléfono, ID de pasarela o N° de pago (prefijos: \"jua per\")"
     actions = [mark_as_paid_and_create_tickets]
     readonly_fields = ("metadata_pretty",)
 
-    # Números originalmente elegidos (chosen_numbers / chosen_number legacy)
+    def get_search_results(self, request, queryset, search_term):
+        return search.filter_payments(queryset, search_term), False
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        # metadata puede ser grande y la lista solo usa los resúmenes
+        if request.resolver_match and request.resolver_match.url_name.endswith("changelist"):
+            qs = qs.defer("metadata")
+        return qs
+
+    # Números originalmente elegidos (chosen_numbers / chosen_number legacy),
+    # precalculados en Payment.numbers_summary
     def chosen_numbers_display(self, obj):
-        meta = obj.metadata or {}
-        nums = meta.get("chosen_numbers") or []
-        if not nums and getattr(obj, "chosen_number", None):
-            return str(obj.chosen_number)
-        if not nums:
-            return "-"
-        return ", ".join(str(n) for n in nums)
+        return obj.numbers_summary or "-"
 
     chosen_numbers_display.short_description = "Números elegidos"
 
     # Números en conflicto (ya vendidos a otra persona)
     def conflict_numbers_display(self, obj):
-        meta = obj.metadata or {}
-        nums = meta.get("conflict_numbers") or []
-        if not nums:
-            return "-"
-        return ", ".join(str(n) for n in nums)
+        return obj.conflicts_summary or "-"
 
     conflict_numbers_display.short_description = "Números en conflicto"
 
@@ -122,10 +189,113 @@ class PaymentAdmin(admin.ModelAdmin):
 
 
 @admin.register(Ticket)
-class TicketAdmin(admin.ModelAdmin):
-    list_display = ("id", "raffle", "number", "buyer_name", "buyer_email", "created_at")
+class TicketAdmin(LargeTableAdmin):
+    list_display = ("id", "raffle", "number", "number_end", "buyer_name", "buyer_email", "created_at")
     list_filter = ("raffle",)
+    list_select_related = ("raffle",)
+    # Solo para mostrar la caja de búsqueda: se busca en SearchToken
     search_fields = ("buyer_name", "buyer_email", "number")
+    search_help_text = "Número, o nombre/email/teléfono de quien compró"
+
+    def get_search_results(self, request, queryset, search_term):
+        return search.filter_tickets(queryset, search_term), False
+
+
+@admin.register(Reservation)
+class ReservationAdmin(LargeTableAdmin):
+    list_display = ("id", "raffle", "number", "number_end", "payment", "expires_at", "is_active")
+    list_filter = ("is_active", "raffle")
+    list_select_related = ("raffle", "payment")
+    search_fields = ("number", "payment__gateway_payment_id")
+    raw_id_fields = ("payment",)
+
+
+@admin.action(description="Confirmar el pago sugerido")
+def confirm_suggested_payments(modeladmin, request, queryset):
+    """
+    Confirma (como mark_as_paid_and_create_tickets) los pagos sugeridos de
+    las líneas de cartola por revisar y las marca como resueltas.
+    """
+    lines = list(queryset.filter(status="review", payment__isnull=False)[:MAX_ADMIN_CONFIRM + 1])
+    if _too_many_to_confirm(request, len(lines)):
+        return
+    if not lines:
+        messages.warning(request, "Ninguna línea seleccionada por revisar tiene un pago sugerido.")
+        return
+    try:
+        summary = _confirm_payments_batch([l.payment_id for l in lines])
+    except Exception as e:
+        messages.error(request, f"Error al confirmar los pagos: {e!r}")
+        return
+
+    confirmed = {r["payment_id"]: r for r in summary["results"]}
+    for line in lines:
+        r = confirmed.get(line.payment_id)
+        if r is None:
+            continue
+        line.status = "resolved"
+        line.note = "Confirmado desde el admin"
+        if r["conflict_numbers"] or r["conflict_ranges"]:
+            conflicts = _numbers_label(r["conflict_numbers"], r["conflict_ranges"])
+            messages.warning(
+                request,
+                f"Payment {line.payment_id}: los números {conflicts} ya estaban vendidos. "
+                f"Contacta a la persona para ofrecer otros números o devolver esa parte.",
+            )
+    StatementLine.objects.bulk_update(lines, ["status", "note"])
+    messages.success(request, f"Se confirmaron {len(confirmed)} pagos.")
+
+
+@admin.action(description="Ignorar (no corresponde a una transferencia de la rifa)")
+def ignore_statement_lines(modeladmin, request, queryset):
+    updated = queryset.exclude(status="matched").update(status="ignored")
+    messages.success(request, f"{updated} líneas ignoradas.")
+
+
+@admin.register(StatementLine)
+class StatementLineAdmin(LargeTableAdmin):
+    list_display = (
+        "id", "booked_on", "amount_clp", "payer_name", "description",
+        "status", "payment", "note", "source",
+    )
+    list_filter = ("status", "source")
+    list_select_related = ("payment",)
+    search_fields = ("payer_name", "description", "reference")
+    raw_id_fields = ("payment",)
+    readonly_fields = (
+        "source", "line_no", "fingerprint", "booked_on", "amount_clp",
+        "payer_name", "description", "reference", "candidates", "created_at",
+    )
+    actions = [confirm_suggested_payments, ignore_statement_lines]
+
+
+class PrizeInline(admin.TabularInline):
+    model = Prize
+    extra = 0
+    fields = ("position", "name", "image", "description", "winner_ticket")
+    raw_id_fields = ("winner_ticket",)
+
+
+@admin.register(Prize)
+class PrizeAdmin(admin.ModelAdmin):
+    list_display = ("id", "raffle", "position", "name", "image", "image_width", "image_height", "winner_ticket")
+    list_display_links = ("id", "name")
+    list_editable = ("position",)
+    list_filter = ("raffle",)
+    list_select_related = ("raffle", "winner_ticket")
+    search_fields = ("name",)
+    raw_id_fields = ("winner_ticket",)
+
+    def delete_queryset(self, request, queryset):
+        # El borrado masivo no pasa por Prize.delete
+        raffle_ids = set(queryset.values_list("raffle_id", flat=True))
+        super().delete_queryset(request, queryset)
+
+        def invalidate():
+            for raffle_id in raffle_ids:
+                invalidate_prizes(raffle_id)
+
+        transaction.on_commit(invalidate)
 
 
 @admin.register(Raffle)
@@ -135,11 +305,18 @@ class RaffleAdmin(admin.ModelAdmin):
         "title",
         "price_clp",
         "numbers_total",
+        "allows_ranges",
         "is_active",
         "export_links",
     )
     list_filter = ("is_active",)
     search_fields = ("title",)
+    inlines = [PrizeInline]
+
+    def delete_queryset(self, request, queryset):
+        # El borrado masivo no pasa por Raffle.delete
+        super().delete_queryset(request, queryset)
+        transaction.on_commit(invalidate_active_raffle)
 
     def export_links(self, obj):
         url_tickets = reverse("export_tickets_csv", args=[obj.id])
@@ -1,6 +1,24 @@
 from django.apps import AppConfig
+from django.core.management import call_command
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def create_cache_table(sender, using, **kwargs):
+    """
+    Crea la tabla de la cache en BD (CACHE_URL=db://, el valor por defecto)
+    al migrar; no hace nada si ya existe o si la cache no es de BD.
+    """
+    call_command("createcachetable", database=using, verbosity=0)
+
 
 class RaffleConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "raffle"
     verbose_name = "Rifas"
+
+    def ready(self):
+        from . import checks  # noqa: F401  (registra los checks de despliegue)
+        from .metrics import install_query_wrapper
+        connection_created.connect(install_query_wrapper, dispatch_uid="raffle_metrics_queries")
+        post_migrate.connect(create_cache_table, sender=self, dispatch_uid="raffle_cache_table")
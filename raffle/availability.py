@@ -0,0 +1,1051 @@
+"""
+Mapa de disponibilidad por rifa.
+
+Se guarda en cache, en bloques de CHUNK_SIZE números, un bytearray con un
+byte por número y su estado: libre, reservado o vendido. Reservar / confirmar /
+liberar no reescriben ni invalidan el mapa: publican un evento con id
+correlativo (ver publish_event) y cada lectura aplica sobre los bloques los
+eventos posteriores a la foto guardada. Solo se arma un bloque desde la BD si
+no está en cache, si venció alguna de sus reservas o si faltan eventos.
+
+Tickets y reservas pueden cubrir un tramo (number..number_end) en rifas con
+`allows_ranges`: se aplican al mapa por tramo y se validan con aritmética de
+intervalos (ver intervals.py), así que el costo en BD crece con la cantidad
+de compras y no con la cantidad de números.
+"""
+import asyncio
+import base64
+import hashlib
+import logging
+import random
+import re
+import time
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import intervals, metrics
+from .models import AvailabilityEvent, EventSequence, Raffle, Reservation, Ticket
+
+logger = logging.getLogger(__name__)
+
+FREE = 0
+RESERVED = 1
+SOLD = 2
+
+def iter_pending_reserved_numbers(raffle_id: int, now=None):
+    """
+    Itera (número, number_end, expires_at) de las reservas activas y no
+    vencidas de la rifa. number_end es None salvo en reservas por tramo.
+    """
+    now = now or timezone.now()
+    return Reservation.objects.filter(
+        raffle_id=raffle_id,
+        is_active=True,
+        expires_at__gt=now,
+    ).values_list("number", "number_end", "expires_at").iterator()
+
+
+# ========= Tramos (number..number_end) =========
+
+def lock_raffle_for_ranges(raffle_id: int) -> bool:
+    """
+    En rifas con tramos bloquea la fila de la rifa hasta el fin de la
+    transacción y devuelve True. Los índices únicos solo comparan `number`,
+    así que los solapes con tramos se validan bajo este bloqueo: toda
+    escritura de tickets o reservas en esas rifas debe pasar por aquí.
+    En rifas sin tramos no bloquea nada y devuelve False.
+    Debe llamarse dentro de transaction.atomic().
+    """
+    return bool(
+        Raffle.objects.select_for_update()
+        .filter(pk=raffle_id, allows_ranges=True)
+        .values_list("allows_ranges", flat=True)
+        .first()
+    )
+
+
+def _overlapping(lo: int, hi: int) -> Q:
+    """
+    Filas (número suelto o tramo) que tocan algún número entre lo y hi.
+    """
+    return (
+        Q(number_end__isnull=True, number__gte=lo, number__lte=hi)
+        | Q(number_end__isnull=False, number__lte=hi, number_end__gte=lo)
+    )
+
+
+def _spans(rows):
+    return intervals.normalize((n, end or n) for n, end in rows)
+
+
+def taken_intervals(raffle_id: int, lo: int, hi: int, now=None) -> list[tuple[int, int]]:
+    """
+    Tramos tomados (vendidos o reservados) que tocan lo..hi, normalizados.
+    """
+    now = now or timezone.now()
+    overlap = _overlapping(lo, hi)
+    sold = Ticket.objects.filter(overlap, raffle_id=raffle_id).values_list("number", "number_end")
+    held = Reservation.objects.filter(
+        overlap, raffle_id=raffle_id, is_active=True, expires_at__gt=now,
+    ).values_list("number", "number_end")
+    return _spans(list(sold) + list(held))
+
+
+async def ataken_intervals(raffle_id: int, lo: int, hi: int, now=None) -> list[tuple[int, int]]:
+    """
+    Versión async de taken_intervals.
+    """
+    now = now or timezone.now()
+    overlap = _overlapping(lo, hi)
+    rows = [
+        row async for row in
+        Ticket.objects.filter(overlap, raffle_id=raffle_id).values_list("number", "number_end")
+    ]
+    rows += [
+        row async for row in
+        Reservation.objects.filter(
+            overlap, raffle_id=raffle_id, is_active=True, expires_at__gt=now,
+        ).values_list("number", "number_end")
+    ]
+    return _spans(rows)
+
+
+def spans_version(spans) -> str:
+    """
+    Como range_version, pero a partir de tramos tomados (rifas con tramos).
+    """
+    return hashlib.blake2b(repr(list(spans)).encode(), digest_size=8).hexdigest()
+
+
+def covered_by_ranges(raffle_id: int, numbers, now=None, holds: bool = True) -> set[int]:
+    """
+    Números sueltos que caen dentro de un ticket (o, con holds=True, de una
+    reserva activa) por tramo.
+    """
+    numbers = sorted(numbers)
+    if not numbers:
+        return set()
+    now = now or timezone.now()
+    lo, hi = numbers[0], numbers[-1]
+    in_span = Q(number_end__isnull=False, number__lte=hi, number_end__gte=lo)
+    rows = list(
+        Ticket.objects.filter(in_span, raffle_id=raffle_id).values_list("number", "number_end")
+    )
+    if holds:
+        rows += Reservation.objects.filter(
+            in_span, raffle_id=raffle_id, is_active=True, expires_at__gt=now,
+        ).values_list("number", "number_end")
+    if not rows:
+        return set()
+    spans = _spans(rows)
+    return {n for n in numbers if intervals.contains(spans, n)}
+
+
+def hold_ranges(raffle, payment, ranges, expires_at) -> list[tuple[int, int]]:
+    """
+    Reserva tramos completos para el Payment (una fila por tramo).
+    Devuelve las partes en conflicto; si hay alguna no se reserva nada.
+    Solo para rifas con allows_ranges; debe llamarse dentro de
+    transaction.atomic().
+    """
+    ranges = intervals.normalize(ranges)
+    if not ranges:
+        return []
+    lock_raffle_for_ranges(raffle.id)
+    now = timezone.now()
+    lo, hi = ranges[0][0], ranges[-1][1]
+
+    Reservation.objects.filter(
+        _overlapping(lo, hi), raffle=raffle, is_active=True, expires_at__lte=now,
+    ).update(is_active=False)
+
+    conflict = intervals.intersect(ranges, taken_intervals(raffle.id, lo, hi, now))
+    if conflict:
+        return conflict
+
+    Reservation.objects.bulk_create([
+        Reservation(
+            raffle=raffle, number=a, number_end=b if b > a else None,
+            payment=payment, expires_at=expires_at,
+        )
+        for a, b in ranges
+    ])
+    return []
+
+
+def sell_ranges(payment, ranges) -> tuple[list[tuple[int, int]], list[tuple[int, int]]]:
+    """
+    Emite tickets por tramo para las partes de `ranges` que nadie más tiene
+    (idempotente: lo ya emitido a este Payment cuenta como pagado).
+    Devuelve (tramos pagados, tramos en conflicto). Debe llamarse dentro de
+    transaction.atomic() y con la rifa bloqueada (lock_raffle_for_ranges).
+    """
+    ranges = intervals.normalize(ranges)
+    if not ranges:
+        return [], []
+    lo, hi = ranges[0][0], ranges[-1][1]
+    mine, others = [], []
+    rows = Ticket.objects.filter(
+        _overlapping(lo, hi), raffle_id=payment.raffle_id,
+    ).values_list("number", "number_end", "payment_id")
+    for n, end, payment_id in rows:
+        (mine if payment_id == payment.id else others).append((n, end))
+
+    owned = _spans(mine)
+    free = intervals.subtract(ranges, _spans(mine + others))
+    Ticket.objects.bulk_create([
+        Ticket(
+            raffle_id=payment.raffle_id,
+            number=a,
+            number_end=b if b > a else None,
+            payment=payment,
+            buyer_name=payment.buyer_name,
+            buyer_email=payment.buyer_email,
+            buyer_phone=payment.buyer_phone,
+        )
+        for a, b in free
+    ])
+    sold = intervals.size(free)
+    transaction.on_commit(lambda: metrics.inc("raffle_numbers_sold_total", sold))
+    paid = intervals.intersect(ranges, intervals.normalize(owned + free))
+    return paid, intervals.subtract(ranges, paid)
+
+
+def hold_numbers(raffle, payment, numbers, expires_at) -> list[int]:
+    """
+    Reserva los números para el Payment con un solo INSERT.
+    La BD detecta los choques (índice único de reservas activas).
+    Debe llamarse dentro de transaction.atomic(). Devuelve los números en
+    conflicto; si hay alguno no se reserva nada.
+    """
+    uses_ranges = lock_raffle_for_ranges(raffle.id)
+    now = timezone.now()
+
+    # Las reservas vencidas siguen ocupando el índice único hasta liberarlas
+    Reservation.objects.filter(
+        raffle=raffle, number__in=numbers, is_active=True, expires_at__lte=now,
+    ).update(is_active=False)
+
+    sold = set(
+        Ticket.objects.filter(raffle=raffle, number__in=numbers)
+        .values_list("number", flat=True)
+    )
+    if uses_ranges:
+        sold |= covered_by_ranges(raffle.id, numbers, now)
+    if sold:
+        return sorted(sold)
+
+    try:
+        with transaction.atomic():
+            Reservation.objects.bulk_create([
+                Reservation(
+                    raffle=raffle, number=n, payment=payment, expires_at=expires_at,
+                )
+                for n in numbers
+            ])
+    except IntegrityError:
+        return sorted(
+            Reservation.objects.filter(
+                raffle=raffle, number__in=numbers, is_active=True,
+            ).values_list("number", flat=True)
+        )
+    return []
+
+
+def hold_available_numbers(raffle, payment, candidates, expires_at, limit: int) -> list[int]:
+    """
+    Reserva para el Payment hasta `limit` números de `candidates` (en orden),
+    saltando los vendidos o ya reservados. A diferencia de hold_numbers no
+    falla ante choques: los ignora y devuelve los números que sí se reservaron.
+    Debe llamarse dentro de transaction.atomic().
+    """
+    uses_ranges = lock_raffle_for_ranges(raffle.id)
+    now = timezone.now()
+    Reservation.objects.filter(
+        raffle=raffle, number__in=candidates, is_active=True, expires_at__lte=now,
+    ).update(is_active=False)
+
+    taken = set(
+        Ticket.objects.filter(raffle=raffle, number__in=candidates)
+        .values_list("number", flat=True)
+    )
+    taken.update(
+        Reservation.objects.filter(raffle=raffle, number__in=candidates, is_active=True)
+        .values_list("number", flat=True)
+    )
+    if uses_ranges:
+        taken |= covered_by_ranges(raffle.id, candidates, now)
+    wanted = [n for n in candidates if n not in taken][:limit]
+    if not wanted:
+        return []
+
+    # Si otra transacción gana un número entre la lectura y el INSERT,
+    # el índice único descarta esa fila en vez de abortar
+    Reservation.objects.bulk_create(
+        [
+            Reservation(raffle=raffle, number=n, payment=payment, expires_at=expires_at)
+            for n in wanted
+        ],
+        ignore_conflicts=True,
+    )
+    return list(
+        Reservation.objects.filter(
+            payment=payment, number__in=wanted, is_active=True,
+        ).values_list("number", flat=True)
+    )
+
+
+def _apply_span(bitmap: bytearray, lo: int, hi: int, state: int):
+    """
+    Aplica `state` a los números lo..hi (recortado al mapa) con operaciones
+    sobre el tramo completo. Una reserva nunca pisa un vendido y liberar
+    solo afecta a los reservados.
+    """
+    lo, hi = max(lo, 1), min(hi, len(bitmap))
+    if lo > hi:
+        return
+    if state == SOLD:
+        bitmap[lo - 1:hi] = bytes([SOLD]) * (hi - lo + 1)
+    elif state == RESERVED:
+        bitmap[lo - 1:hi] = bitmap[lo - 1:hi].replace(bytes([FREE]), bytes([RESERVED]))
+    else:
+        bitmap[lo - 1:hi] = bitmap[lo - 1:hi].replace(bytes([RESERVED]), bytes([FREE]))
+
+
+# ========= Mapa en cache por bloques =========
+#
+# Cada bloque es una foto {seq, total, lo, bitmap, next_expiry, updated_at}
+# que ya incluye todos los eventos hasta `seq`. Al leer se le aplican los
+# eventos posteriores y, cuando ya son COMPACT_AFTER_EVENTS, se guarda de
+# nuevo al día. Como cada foto es consistente con su seq, dos workers que
+# guardan el mismo bloque no se pisan cambios: a lo más queda una foto más
+# vieja, que la próxima lectura pone al día con los mismos eventos.
+
+CHUNK_SIZE = 10_000
+# Red de seguridad: aunque no cambie nada, cada bloque se relee de la BD cada tanto
+AVAILABILITY_CACHE_TTL = 60 * 60 * 6
+COMPACT_AFTER_EVENTS = 20
+# ...o cuando la foto guardada tiene más que esto (sus eventos salen de la cache)
+COMPACT_AFTER_SECONDS = 60
+# Con más eventos pendientes que esto conviene armar el bloque desde la BD
+MAX_REPLAY_EVENTS = 500
+# Solo un worker por rifa arma bloques desde la BD; el resto espera un poco
+REBUILD_LOCK_SECONDS = 30
+REBUILD_WAIT_SECONDS = 2
+REBUILD_POLL_SECONDS = 0.05
+# Bloques que se leen de una vez al buscar la próxima página con libres
+SEEK_CHUNKS = 8
+
+
+def _chunk_key(raffle_id: int, index: int) -> str:
+    return f"raffle:{raffle_id}:availability:{index}"
+
+
+def _rebuild_lock_key(raffle_id: int) -> str:
+    return f"raffle:{raffle_id}:availability:rebuild"
+
+
+def _chunk_bounds(total: int, index: int) -> tuple[int, int]:
+    lo = index * CHUNK_SIZE + 1
+    return lo, min(lo + CHUNK_SIZE - 1, total)
+
+
+def _chunk_keys(raffle, lo: int, hi: int) -> dict[str, int]:
+    first, last = (lo - 1) // CHUNK_SIZE, (hi - 1) // CHUNK_SIZE
+    return {_chunk_key(raffle.id, i): i for i in range(first, last + 1)}
+
+
+def _usable_chunks(raffle, keys: dict[str, int], found: dict) -> dict[int, dict]:
+    """
+    Bloques leídos de la cache que corresponden al tamaño actual de la rifa.
+    """
+    chunks = {}
+    for key, chunk in found.items():
+        index = keys[key]
+        lo, hi = _chunk_bounds(raffle.numbers_total, index)
+        if chunk.get("total") == raffle.numbers_total and len(chunk["bitmap"]) == hi - lo + 1:
+            chunks[index] = chunk
+    return chunks
+
+
+def _stale_indexes(indexes, chunks: dict[int, dict], now) -> list[int]:
+    """
+    Bloques que hay que armar desde la BD: los que faltan y los que tienen
+    alguna reserva ya vencida (el vencimiento no publica eventos).
+    """
+    return [
+        i for i in indexes
+        if i not in chunks
+        or (chunks[i]["next_expiry"] is not None and chunks[i]["next_expiry"] <= now)
+    ]
+
+
+def _apply_to_chunk(chunk: dict, lo: int, hi: int, state: int) -> bool:
+    """
+    Aplica `state` a la parte de lo..hi que cae en el bloque (mismas reglas
+    que _apply_span). Devuelve False si el tramo no toca el bloque.
+    """
+    start, bitmap = chunk["lo"], chunk["bitmap"]
+    lo, hi = max(lo, start), min(hi, start + len(bitmap) - 1)
+    if lo > hi:
+        return False
+    if lo == hi:
+        current = bitmap[lo - start]
+        if state == SOLD or current == (FREE if state == RESERVED else RESERVED):
+            bitmap[lo - start] = state
+    else:
+        _apply_span(bitmap, lo - start + 1, hi - start + 1, state)
+    return True
+
+
+def _apply_to_chunks(chunks: dict[int, dict], lo: int, hi: int, state: int, expires_at=None):
+    first = max((lo - 1) // CHUNK_SIZE, min(chunks))
+    last = min((hi - 1) // CHUNK_SIZE, max(chunks))
+    for index in range(first, last + 1):
+        chunk = chunks.get(index)
+        if chunk is None or not _apply_to_chunk(chunk, lo, hi, state):
+            continue
+        if expires_at is not None and (chunk["next_expiry"] is None or expires_at < chunk["next_expiry"]):
+            chunk["next_expiry"] = expires_at
+
+
+def _fill_chunks(total: int, indexes, seq: int, sold_rows, holds) -> dict[int, dict]:
+    now = timezone.now()
+    chunks = {}
+    for index in indexes:
+        lo, hi = _chunk_bounds(total, index)
+        chunks[index] = {
+            "seq": seq,
+            "total": total,
+            "lo": lo,
+            "bitmap": bytearray(hi - lo + 1),
+            "next_expiry": None,
+            "updated_at": now,
+            "saved_at": now,
+        }
+    for n, end in sold_rows:
+        _apply_to_chunks(chunks, n, end or n, SOLD)
+    for n, end, expires_at in holds:
+        _apply_to_chunks(chunks, n, end or n, RESERVED, expires_at)
+    return chunks
+
+
+def _chunk_rows_q(raffle, indexes) -> Q:
+    lo = _chunk_bounds(raffle.numbers_total, min(indexes))[0]
+    hi = _chunk_bounds(raffle.numbers_total, max(indexes))[1]
+    if raffle.allows_ranges:
+        return _overlapping(lo, hi)
+    return Q(number__gte=lo, number__lte=hi)
+
+
+def _build_chunks(raffle, indexes) -> dict[int, dict]:
+    # El id se lee antes que las filas: lo que cambie después llega como evento
+    seq = (
+        EventSequence.objects.filter(raffle_id=raffle.id)
+        .values_list("last_seq", flat=True).first()
+    ) or 0
+    where = _chunk_rows_q(raffle, indexes)
+    return _fill_chunks(
+        raffle.numbers_total, indexes, seq,
+        Ticket.objects.filter(where, raffle_id=raffle.id).values_list("number", "number_end"),
+        Reservation.objects.filter(
+            where, raffle_id=raffle.id, is_active=True, expires_at__gt=timezone.now(),
+        ).values_list("number", "number_end", "expires_at"),
+    )
+
+
+async def _abuild_chunks(raffle, indexes) -> dict[int, dict]:
+    seq = await aget_event_seq(raffle.id)
+    where = _chunk_rows_q(raffle, indexes)
+    sold = [
+        row async for row in
+        Ticket.objects.filter(where, raffle_id=raffle.id).values_list("number", "number_end")
+    ]
+    holds = [
+        row async for row in
+        Reservation.objects.filter(
+            where, raffle_id=raffle.id, is_active=True, expires_at__gt=timezone.now(),
+        ).values_list("number", "number_end", "expires_at")
+    ]
+    return _fill_chunks(raffle.numbers_total, indexes, seq, sold, holds)
+
+
+def _rebuild_chunks(raffle, indexes, cached: dict[int, dict]) -> dict[int, dict]:
+    """
+    Arma desde la BD los bloques `indexes` y los guarda. Si otro worker ya
+    los está armando se usa la foto en cache (aunque tenga una reserva
+    vencida) o se espera hasta REBUILD_WAIT_SECONDS a que aparezca.
+    """
+    lock = _rebuild_lock_key(raffle.id)
+    if cache.add(lock, 1, REBUILD_LOCK_SECONDS):
+        try:
+            chunks = _build_chunks(raffle, indexes)
+            cache.set_many(
+                {_chunk_key(raffle.id, i): c for i, c in chunks.items()}, AVAILABILITY_CACHE_TTL,
+            )
+            return chunks
+        finally:
+            cache.delete(lock)
+
+    if all(i in cached for i in indexes):
+        return {i: cached[i] for i in indexes}
+    keys = {_chunk_key(raffle.id, i): i for i in indexes}
+    deadline = time.monotonic() + REBUILD_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(REBUILD_POLL_SECONDS)
+        found = _usable_chunks(raffle, keys, cache.get_many(list(keys)))
+        if not _stale_indexes(indexes, found, timezone.now()):
+            return found
+    # El otro worker no terminó a tiempo: se arma sin guardarlo
+    return _build_chunks(raffle, indexes)
+
+
+async def _arebuild_chunks(raffle, indexes, cached: dict[int, dict]) -> dict[int, dict]:
+    lock = _rebuild_lock_key(raffle.id)
+    if await cache.aadd(lock, 1, REBUILD_LOCK_SECONDS):
+        try:
+            chunks = await _abuild_chunks(raffle, indexes)
+            await cache.aset_many(
+                {_chunk_key(raffle.id, i): c for i, c in chunks.items()}, AVAILABILITY_CACHE_TTL,
+            )
+            return chunks
+        finally:
+            await cache.adelete(lock)
+
+    if all(i in cached for i in indexes):
+        return {i: cached[i] for i in indexes}
+    keys = {_chunk_key(raffle.id, i): i for i in indexes}
+    deadline = time.monotonic() + REBUILD_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        await asyncio.sleep(REBUILD_POLL_SECONDS)
+        found = _usable_chunks(raffle, keys, await cache.aget_many(list(keys)))
+        if not _stale_indexes(indexes, found, timezone.now()):
+            return found
+    return await _abuild_chunks(raffle, indexes)
+
+
+def _apply_delta(chunks: dict[int, dict], delta: dict):
+    if delta.get("sold"):
+        state, expires_at = SOLD, None
+    else:
+        state = RESERVED
+        expires_at = delta.get("expires_at")
+        expires_at = datetime.fromisoformat(expires_at) if expires_at else None
+    for n in delta.get("taken", ()):
+        _apply_to_chunks(chunks, n, n, state, expires_at)
+    for lo, hi in delta.get("taken_ranges", ()):
+        _apply_to_chunks(chunks, lo, hi, state, expires_at)
+    for n in delta.get("released", ()):
+        _apply_to_chunks(chunks, n, n, FREE)
+    for lo, hi in delta.get("released_ranges", ()):
+        _apply_to_chunks(chunks, lo, hi, FREE)
+
+
+def _behind(chunks: dict[int, dict], events) -> list[int]:
+    """
+    Bloques que no se pueden poner al día con `events`: hay demasiados
+    pendientes (events None) o falta uno que ya se purgó.
+    """
+    if events is None:
+        return list(chunks)
+    if events and events[-1][1] is None:
+        gap = events[-1][0]
+        return [i for i, chunk in chunks.items() if chunk["seq"] < gap]
+    return []
+
+
+def _catch_up(chunks: dict[int, dict], events) -> dict[int, dict]:
+    """
+    Aplica a cada bloque los eventos posteriores a su foto. Devuelve los
+    bloques que acumularon COMPACT_AFTER_EVENTS y conviene volver a guardar.
+    """
+    events = [(seq, delta) for seq, delta in events or () if delta is not None]
+    now = timezone.now()
+    compact = {}
+    for index, chunk in chunks.items():
+        pending = [delta for seq, delta in events if seq > chunk["seq"]]
+        if not pending:
+            continue
+        for delta in pending:
+            _apply_delta({index: chunk}, delta)
+        chunk["seq"] = events[-1][0]
+        chunk["updated_at"] = now
+        if (
+            len(pending) >= COMPACT_AFTER_EVENTS
+            or (now - chunk["saved_at"]).total_seconds() > COMPACT_AFTER_SECONDS
+        ):
+            chunk["saved_at"] = now
+            compact[index] = chunk
+    return compact
+
+
+def _entry(chunks: dict[int, dict], keys: dict[str, int], lo: int, hi: int) -> dict:
+    ordered = [chunks[i] for i in sorted(keys.values())]
+    bitmap = bytearray().join(chunk["bitmap"] for chunk in ordered)
+    first = ordered[0]["lo"]
+    return {
+        "bitmap": bitmap[lo - first:hi - first + 1],
+        "start": lo,
+        "updated_at": max(chunk["updated_at"] for chunk in ordered),
+    }
+
+
+def _empty_entry(lo: int) -> dict:
+    return {"bitmap": bytearray(), "start": lo, "updated_at": timezone.now()}
+
+
+def get_availability_entry(raffle, lo: int = 1, hi: int | None = None) -> dict:
+    """
+    Estado de los números lo..hi (por defecto todos): 'bitmap' (índice
+    n - start → estado), 'start' y 'updated_at' (último cambio conocido).
+    """
+    hi = min(hi or raffle.numbers_total, raffle.numbers_total)
+    if lo > hi:
+        return _empty_entry(lo)
+    keys = _chunk_keys(raffle, lo, hi)
+    chunks = _usable_chunks(raffle, keys, cache.get_many(list(keys)))
+    missing = [i for i in keys.values() if i not in chunks]
+    metrics.cache_lookup("availability", not missing)
+    if missing:
+        chunks.update(_rebuild_chunks(raffle, missing, chunks))
+
+    _head, events = get_events(raffle.id, min(c["seq"] for c in chunks.values()), MAX_REPLAY_EVENTS)
+    behind = _behind(chunks, events)
+    if behind:
+        # Faltan eventos para ponerlos al día: se arman de nuevo (sin fotos viejas)
+        chunks.update(_rebuild_chunks(raffle, behind, {}))
+        _head, events = get_events(raffle.id, min(c["seq"] for c in chunks.values()), MAX_REPLAY_EVENTS)
+    compact = _catch_up(chunks, events)
+
+    expired = _stale_indexes(chunks, chunks, timezone.now())
+    if expired:
+        chunks.update(_rebuild_chunks(raffle, expired, chunks))
+        compact = {i: c for i, c in compact.items() if i not in expired}
+    if compact:
+        cache.set_many({_chunk_key(raffle.id, i): c for i, c in compact.items()}, AVAILABILITY_CACHE_TTL)
+    return _entry(chunks, keys, lo, hi)
+
+
+async def aget_availability_entry(raffle, lo: int = 1, hi: int | None = None) -> dict:
+    """
+    Versión async de get_availability_entry (ORM y cache async).
+    """
+    hi = min(hi or raffle.numbers_total, raffle.numbers_total)
+    if lo > hi:
+        return _empty_entry(lo)
+    keys = _chunk_keys(raffle, lo, hi)
+    chunks = _usable_chunks(raffle, keys, await cache.aget_many(list(keys)))
+    missing = [i for i in keys.values() if i not in chunks]
+    metrics.cache_lookup("availability", not missing)
+    if missing:
+        chunks.update(await _arebuild_chunks(raffle, missing, chunks))
+
+    _head, events = await aget_events(raffle.id, min(c["seq"] for c in chunks.values()), MAX_REPLAY_EVENTS)
+    behind = _behind(chunks, events)
+    if behind:
+        chunks.update(await _arebuild_chunks(raffle, behind, {}))
+        _head, events = await aget_events(
+            raffle.id, min(c["seq"] for c in chunks.values()), MAX_REPLAY_EVENTS,
+        )
+    compact = _catch_up(chunks, events)
+
+    expired = _stale_indexes(chunks, chunks, timezone.now())
+    if expired:
+        chunks.update(await _arebuild_chunks(raffle, expired, chunks))
+        compact = {i: c for i, c in compact.items() if i not in expired}
+    if compact:
+        await cache.aset_many(
+            {_chunk_key(raffle.id, i): c for i, c in compact.items()}, AVAILABILITY_CACHE_TTL,
+        )
+    return _entry(chunks, keys, lo, hi)
+
+
+def get_availability(raffle) -> bytearray:
+    """
+    Mapa completo de la rifa (índice n-1 → estado).
+    """
+    return get_availability_entry(raffle)["bitmap"]
+
+
+def range_version(bitmap: bytearray, start: int, end: int, first: int = 1) -> str:
+    """
+    Versión del tramo start..end de un mapa que empieza en el número `first`:
+    cambia solo si cambia el estado de alguno de sus números (sirve como
+    ETag y como parte de claves de cache).
+    """
+    return hashlib.blake2b(bytes(bitmap[start - first:end - first + 1]), digest_size=8).hexdigest()
+
+
+def taken_in_range(bitmap: bytearray, start: int, end: int, first: int = 1) -> set[int]:
+    """
+    Números no libres entre start y end (inclusive), leyendo solo ese tramo.
+    """
+    chunk = bitmap[start - first:end - first + 1]
+    return {start + i for i, state in enumerate(chunk) if state != FREE}
+
+
+async def apage_state(raffle, start: int, end: int) -> dict:
+    """
+    Estado de la página start..end para la grilla: 'taken' (números no
+    libres), 'version' (cambia solo si cambia alguno) y 'updated_at' (None si
+    no se conoce). En rifas con tramos sale de taken_intervals, sin mapa.
+    """
+    if raffle.allows_ranges:
+        spans = intervals.intersect([(start, end)], await ataken_intervals(raffle.id, start, end))
+        return {
+            "taken": {n for lo, hi in spans for n in range(lo, hi + 1)},
+            "version": spans_version(spans),
+            "updated_at": None,
+        }
+    entry = await aget_availability_entry(raffle, start, end)
+    return {
+        "taken": taken_in_range(entry["bitmap"], start, end, entry["start"]),
+        "version": range_version(entry["bitmap"], start, end, entry["start"]),
+        "updated_at": entry["updated_at"],
+    }
+
+
+async def afirst_free_page(raffle, from_page: int, page_size: int) -> int | None:
+    """
+    Primera página >= from_page con algún número libre (None si no hay).
+    Lee el mapa de a SEEK_CHUNKS bloques, no entero; en rifas con tramos
+    resta los tramos tomados.
+    """
+    total = raffle.numbers_total
+    lo = (from_page - 1) * page_size + 1
+    if raffle.allows_ranges:
+        if lo > total:
+            return None
+        free = intervals.subtract([(lo, total)], await ataken_intervals(raffle.id, lo, total))
+        return (free[0][0] - 1) // page_size + 1 if free else None
+    while lo <= total:
+        hi = min(((lo - 1) // CHUNK_SIZE + SEEK_CHUNKS) * CHUNK_SIZE, total)
+        entry = await aget_availability_entry(raffle, lo, hi)
+        idx = entry["bitmap"].find(FREE)
+        if idx >= 0:
+            return (lo + idx - 1) // page_size + 1
+        lo = hi + 1
+    return None
+
+
+_SAMPLE_CHUNK = 4096
+
+
+def sample_free_numbers(bitmap: bytearray, k: int, lo: int = 1, hi: int | None = None,
+                        ends_with: str = "", exclude=(), start: int = 1) -> list[int]:
+    """
+    Elige al azar (uniforme) hasta k números libres entre lo y hi, opcionalmente
+    solo los terminados en `ends_with`, sin armar la lista de todos los números:
+    se cuentan libres por bloques del mapa y se ubica cada sorteo en su bloque.
+    `start` es el número del primer byte del mapa (ver get_availability_entry).
+    """
+    lo = max(lo, start)
+    hi = min(hi or start + len(bitmap) - 1, start + len(bitmap) - 1)
+    step = 10 ** len(ends_with) if ends_with else 1
+    suffix = int(ends_with) if ends_with else 0
+    first = lo + (suffix - lo) % step  # primer número >= lo con esa terminación
+    if k <= 0 or first > hi:
+        return []
+
+    # Candidatos: first, first+step, ... ≤ hi (un byte de estado por candidato)
+    view = bitmap[first - start:hi - start + 1:step]
+    for n in exclude:
+        if first <= n <= hi and (n - first) % step == 0:
+            view[(n - first) // step] = SOLD
+
+    free = view.count(FREE)
+    if not free:
+        return []
+    ranks = sorted(random.sample(range(free), min(k, free)))
+
+    picked = []
+    seen = 0  # libres en los bloques anteriores
+    r = 0
+    for chunk_start in range(0, len(view), _SAMPLE_CHUNK):
+        chunk = view[chunk_start:chunk_start + _SAMPLE_CHUNK]
+        in_chunk = chunk.count(FREE)
+        if r < len(ranks) and ranks[r] < seen + in_chunk:
+            positions = [i for i, state in enumerate(chunk) if state == FREE]
+            while r < len(ranks) and ranks[r] < seen + in_chunk:
+                idx = chunk_start + positions[ranks[r] - seen]
+                picked.append(first + idx * step)
+                r += 1
+        seen += in_chunk
+        if r >= len(ranks):
+            break
+
+    random.shuffle(picked)
+    return picked
+
+
+def page_free_counts(bitmap: bytearray, page_size: int) -> list[int]:
+    """
+    Cantidad de números libres por página.
+    """
+    return [
+        bitmap.count(FREE, start, start + page_size)
+        for start in range(0, len(bitmap), page_size)
+    ]
+
+
+def page_free_counts_from_spans(spans, total: int, page_size: int) -> list[int]:
+    """
+    Como page_free_counts, a partir de tramos tomados (normalizados).
+    """
+    free = [min(page_size, total - start) for start in range(0, total, page_size)]
+    for lo, hi in spans:
+        lo, hi = max(lo, 1), min(hi, total)
+        while lo <= hi:
+            page = (lo - 1) // page_size
+            page_end = min((page + 1) * page_size, hi)
+            free[page] -= page_end - lo + 1
+            lo = page_end + 1
+    return free
+
+
+def mark_numbers(raffle_id: int, numbers, state: int, expires_at=None):
+    """
+    Avisa que cambió el estado de los números: publica el cambio, que se
+    aplica a los mapas en cache y a los clientes conectados (ver
+    publish_event). Las reservas pasan su vencimiento en `expires_at`. Al
+    liberar no se publican los números que ya están vendidos. Llamar
+    después del commit.
+    """
+    numbers = list(numbers)
+    if state == FREE:
+        publish_event(raffle_id, released=sorted(set(numbers) - _sold_numbers(raffle_id, numbers)))
+    else:
+        publish_event(raffle_id, taken=numbers, sold=state == SOLD, expires_at=expires_at)
+
+
+def mark_ranges(raffle_id: int, ranges, state: int, expires_at=None):
+    """
+    Como mark_numbers pero para tramos completos: publica los tramos (no
+    número a número).
+    """
+    ranges = intervals.normalize(ranges)
+    if not ranges:
+        return
+    if state == FREE:
+        ranges = intervals.subtract(ranges, _sold_intervals(raffle_id, ranges[0][0], ranges[-1][1]))
+        if ranges:
+            publish_event(raffle_id, released_ranges=ranges)
+    else:
+        publish_event(raffle_id, taken_ranges=ranges, sold=state == SOLD, expires_at=expires_at)
+
+
+def _sold_numbers(raffle_id: int, numbers) -> set[int]:
+    if not numbers:
+        return set()
+    sold = set(
+        Ticket.objects.filter(raffle_id=raffle_id, number__in=numbers)
+        .values_list("number", flat=True)
+    )
+    return sold | covered_by_ranges(raffle_id, numbers, holds=False)
+
+
+def _sold_intervals(raffle_id: int, lo: int, hi: int) -> list[tuple[int, int]]:
+    return _spans(
+        Ticket.objects.filter(_overlapping(lo, hi), raffle_id=raffle_id)
+        .values_list("number", "number_end")
+    )
+
+
+# Tabla de traducción estado → '0' (libre) / '1' (tomado)
+_TAKEN_BITS = bytes.maketrans(bytes([FREE, RESERVED, SOLD]), b"011")
+_TAKEN_RUN = re.compile(rb"[\x01\x02]+")
+
+
+def encode_taken_bitmap(bitmap: bytearray) -> str:
+    """
+    Empaqueta el mapa en 1 bit por número (1 = tomado), el número 1 en el bit
+    más significativo del primer byte, y lo devuelve en base64.
+    """
+    if not bitmap:
+        return ""
+    bits = bytes(bitmap).translate(_TAKEN_BITS)
+    padding = -len(bits) % 8
+    packed = int(bits + b"0" * padding, 2).to_bytes((len(bits) + padding) // 8, "big")
+    return base64.b64encode(packed).decode("ascii")
+
+
+def encode_taken_spans(spans, total: int) -> str:
+    """
+    Como encode_taken_bitmap, a partir de tramos tomados (rifas con tramos).
+    """
+    bitmap = bytearray(total)
+    for lo, hi in spans:
+        lo, hi = max(lo, 1), min(hi, total)
+        if lo <= hi:
+            bitmap[lo - 1:hi] = bytes([SOLD]) * (hi - lo + 1)
+    return encode_taken_bitmap(bitmap)
+
+
+def taken_ranges(bitmap: bytearray) -> list[list[int]]:
+    """
+    Tramos [desde, hasta] (inclusive) de números tomados.
+    """
+    return [[m.start() + 1, m.end()] for m in _TAKEN_RUN.finditer(bitmap)]
+
+
+# ========= Eventos de disponibilidad =========
+#
+# Cada cambio recibe un id correlativo por rifa tomado de la BD
+# (EventSequence) y se guarda en AvailabilityEvent y en la cache. Los mapas
+# en cache y los streams SSE leen de la cache las entradas nuevas desde el
+# último id que vieron; las que la cache perdió se recuperan de la BD.
+
+EVENT_TTL = 60 * 10
+# Los eventos se borran de la BD después de esto (ver prune_events)
+EVENT_RETENTION = timedelta(days=1)
+# Ids más allá del último conocido que se buscan igual en la cache: el
+# "head" en cache puede ir atrasado respecto de los eventos ya guardados
+EVENT_PROBE = 2
+
+
+def _event_head_key(raffle_id: int) -> str:
+    return f"raffle:{raffle_id}:events:head"
+
+
+def _event_key(raffle_id: int, seq: int) -> str:
+    return f"raffle:{raffle_id}:events:{seq}"
+
+
+def _next_event_seq(raffle_id: int) -> int:
+    """
+    Siguiente id de evento de la rifa. El UPDATE bloquea la fila hasta el
+    commit, así que es único aunque publiquen varios workers a la vez.
+    Debe llamarse dentro de transaction.atomic().
+    """
+    counter = EventSequence.objects.filter(raffle_id=raffle_id)
+    if not counter.update(last_seq=F("last_seq") + 1):
+        EventSequence.objects.get_or_create(raffle_id=raffle_id)
+        counter.update(last_seq=F("last_seq") + 1)
+    return counter.values_list("last_seq", flat=True).get()
+
+
+def publish_event(raffle_id: int, taken=(), released=(),
+                  taken_ranges=(), released_ranges=(), sold: bool = False,
+                  expires_at=None) -> int | None:
+    """
+    Publica un delta {taken: [...], released: [...]} y devuelve su id.
+    Los cambios por tramo van en taken_ranges / released_ranges ([desde, hasta]).
+    Lo tomado queda vendido con sold=True y si no reservado hasta `expires_at`.
+    """
+    if not (taken or released or taken_ranges or released_ranges):
+        return None
+    delta = {"taken": sorted(taken), "released": sorted(released)}
+    if taken_ranges:
+        delta["taken_ranges"] = [list(r) for r in taken_ranges]
+    if released_ranges:
+        delta["released_ranges"] = [list(r) for r in released_ranges]
+    if sold:
+        delta["sold"] = True
+    elif expires_at is not None:
+        delta["expires_at"] = expires_at.isoformat()
+
+    with transaction.atomic():
+        seq = _next_event_seq(raffle_id)
+        AvailabilityEvent.objects.create(raffle_id=raffle_id, seq=seq, delta=delta)
+    cache.set(_event_key(raffle_id, seq), delta, EVENT_TTL)
+    # Sin atomicidad: otro worker puede dejarlo un id atrás por un momento
+    # (los lectores igual buscan EVENT_PROBE ids más allá)
+    cache.set(_event_head_key(raffle_id), seq, None)
+    return seq
+
+
+def prune_events(now=None) -> int:
+    """
+    Borra de la BD los eventos más antiguos que EVENT_RETENTION.
+    """
+    now = now or timezone.now()
+    deleted, _ = AvailabilityEvent.objects.filter(created_at__lt=now - EVENT_RETENTION).delete()
+    return deleted
+
+
+async def aget_event_seq(raffle_id: int) -> int:
+    """
+    Último id publicado según la BD (no depende de la cache).
+    """
+    seq = await (
+        EventSequence.objects.filter(raffle_id=raffle_id)
+        .values_list("last_seq", flat=True).afirst()
+    )
+    return seq or 0
+
+
+def _event_keys(raffle_id: int, after: int, upto: int) -> dict[str, int]:
+    return {_event_key(raffle_id, seq): seq for seq in range(after + 1, upto + 1)}
+
+
+def _consecutive_events(after: int, head: int, upto: int, found: dict) -> list[tuple[int, dict | None]]:
+    """
+    Eventos desde after+1 sin saltos. Hasta `head` todos deben existir: uno
+    que falta (ni en cache ni en BD) se devuelve con delta None y corta la
+    lista. Después de head, solo los que ya están.
+    """
+    events = []
+    for seq in range(after + 1, upto + 1):
+        if seq in found:
+            events.append((seq, found[seq]))
+        elif seq <= head:
+            events.append((seq, None))
+            break
+        else:
+            break
+    return events
+
+
+async def aget_events(raffle_id: int, after: int, limit: int) -> tuple[int, list | None]:
+    """
+    (head, eventos) con los eventos (id, delta) posteriores a `after`, sin
+    saltos; delta es None si ya se purgó (el cliente debe resincronizar).
+    Si hay más de `limit` pendientes devuelve (head, None).
+    """
+    head_key = _event_head_key(raffle_id)
+    keys = _event_keys(raffle_id, after, after + EVENT_PROBE)
+    found = await cache.aget_many([head_key, *keys])
+    head = found.pop(head_key, 0)
+    if head - after > limit:
+        return head, None
+    upto = max(head, after) + EVENT_PROBE
+    if upto > after + EVENT_PROBE:
+        more = _event_keys(raffle_id, after + EVENT_PROBE, upto)
+        found.update(await cache.aget_many(list(more)))
+        keys.update(more)
+    found = {keys[key]: delta for key, delta in found.items()}
+
+    missing = [seq for seq in range(after + 1, head + 1) if seq not in found]
+    if missing:
+        rows = AvailabilityEvent.objects.filter(raffle_id=raffle_id, seq__in=missing)
+        async for seq, delta in rows.values_list("seq", "delta"):
+            found[seq] = delta
+    return head, _consecutive_events(after, head, upto, found)
+
+
+def get_events(raffle_id: int, after: int, limit: int) -> tuple[int, list | None]:
+    """
+    Versión sync de aget_events.
+    """
+    head_key = _event_head_key(raffle_id)
+    keys = _event_keys(raffle_id, after, after + EVENT_PROBE)
+    found = cache.get_many([head_key, *keys])
+    head = found.pop(head_key, 0)
+    if head - after > limit:
+        return head, None
+    upto = max(head, after) + EVENT_PROBE
+    if upto > after + EVENT_PROBE:
+        more = _event_keys(raffle_id, after + EVENT_PROBE, upto)
+        found.update(cache.get_many(list(more)))
+        keys.update(more)
+    found = {keys[key]: delta for key, delta in found.items()}
+
+    missing = [seq for seq in range(after + 1, head + 1) if seq not in found]
+    if missing:
+        rows = AvailabilityEvent.objects.filter(raffle_id=raffle_id, seq__in=missing)
+        found.update(rows.values_list("seq", "delta"))
+    return head, _consecutive_events(after, head, upto, found)
@@ -0,0 +1,381 @@
+"""
+Benchmark de carga y contención del flujo de compra.
+
+- seed_raffle: crea una rifa de tamaño configurable con tickets vendidos y
+  transferencias pendientes repartidos de forma realista (lo usa seed_demo).
+- run_benchmark: lanza compradores simulados en hilos que reservan, confirman
+  y navegan la grilla, y devuelve un resumen JSON comparable entre commits
+  (ver `manage.py bench_purchase`).
+"""
+import json
+import platform
+import random
+import subprocess
+import threading
+import time
+from collections import Counter, deque
+from datetime import timedelta
+
+import django
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from . import availability, intervals, search
+from .models import Payment, Raffle, Reservation, Ticket
+from .views import PAGE_SIZE, TRANSFER_HOLD_HOURS, _confirm_tickets_from_payment_id
+
+DISTRIBUTIONS = ("uniform", "popular")
+
+# Tamaño de cada compra: la mayoría compra 1 o 2 números
+_PURCHASE_SIZES = (1, 1, 1, 1, 1, 2, 2, 3, 5, 10)
+
+_CREATE_BATCH = 1000
+
+
+# ========= Datos de prueba =========
+
+def _pick_numbers(rng: random.Random, total: int, k: int, distribution: str) -> list[int]:
+    """
+    k números distintos entre 1 y total. Con 'popular' la mitad sale del
+    primer 5% de la rifa (los números bajos se venden primero).
+    """
+    k = min(k, total)
+    if distribution != "popular":
+        return rng.sample(range(1, total + 1), k)
+
+    hot_top = max(min(total, 100), total // 20)
+    picked = rng.sample(range(1, hot_top + 1), min(k // 2, hot_top))
+    seen = set(picked)
+    extra = rng.sample(range(1, total + 1), min(total, k + len(picked)))
+    picked += [n for n in extra if n not in seen][:k - len(picked)]
+    return picked
+
+
+def _group(rng: random.Random, numbers: list[int]):
+    i = 0
+    while i < len(numbers):
+        size = rng.choice(_PURCHASE_SIZES)
+        yield numbers[i:i + size]
+        i += size
+
+
+def seed_raffle(numbers_total: int, sold: float = 0.0, pending: float = 0.0,
+                distribution: str = "uniform", seed: int | None = None,
+                title: str = "Rifa benchmark", price_clp: int = 3000,
+                allows_ranges: bool = False) -> Raffle:
+    """
+    Crea una rifa activa con `sold` (fracción) de números vendidos y
+    `pending` (fracción) reservados por transferencias vigentes.
+    Con el mismo `seed` produce siempre los mismos números.
+    """
+    rng = random.Random(seed)
+    raffle = Raffle.objects.create(
+        title=title,
+        description="Rifa generada para pruebas de carga.",
+        price_clp=price_clp,
+        numbers_total=numbers_total,
+        is_active=True,
+        allows_ranges=allows_ranges,
+    )
+
+    n_sold = int(numbers_total * sold)
+    n_pending = int(numbers_total * pending)
+    chosen = _pick_numbers(rng, numbers_total, n_sold + n_pending, distribution)
+    now = timezone.now()
+
+    def create_payments(groups, status):
+        payments = [
+            Payment(
+                raffle=raffle,
+                amount_clp=price_clp * len(group),
+                gateway="transfer",
+                gateway_payment_id=f"seed-{raffle.id}-{status}-{i}",
+                status=status,
+                buyer_name=f"Comprador {i}",
+                buyer_email=f"comprador{i}@example.com",
+                paid_at=now if status == "paid" else None,
+                expires_at=now + timedelta(hours=rng.uniform(1, TRANSFER_HOLD_HOURS)),
+                metadata={"chosen_numbers": group, "payment_method": "transfer", "seed": True},
+            )
+            for i, group in enumerate(groups)
+        ]
+        for p in payments:
+            p.refresh_numbers_summary()
+        payments = Payment.objects.bulk_create(payments, batch_size=_CREATE_BATCH)
+        search.index_payments(payments)
+        return payments
+
+    paid_groups = list(_group(rng, chosen[:n_sold]))
+    tickets = [
+        Ticket(
+            raffle=raffle, number=n, payment=p,
+            buyer_name=p.buyer_name, buyer_email=p.buyer_email,
+        )
+        for p, group in zip(create_payments(paid_groups, "paid"), paid_groups)
+        for n in group
+    ]
+    Ticket.objects.bulk_create(tickets, batch_size=_CREATE_BATCH)
+
+    pending_groups = list(_group(rng, chosen[n_sold:]))
+    holds = [
+        Reservation(raffle=raffle, number=n, payment=p, expires_at=p.expires_at)
+        for p, group in zip(create_payments(pending_groups, "pending"), pending_groups)
+        for n in group
+    ]
+    Reservation.objects.bulk_create(holds, batch_size=_CREATE_BATCH)
+    return raffle
+
+
+# ========= Verificación =========
+
+def _overlap_size(spans) -> int:
+    """
+    Cantidad de números cubiertos por más de un tramo de `spans`.
+    """
+    overlap = 0
+    reach = 0
+    for lo, hi in sorted(spans):
+        if lo <= reach:
+            overlap += min(hi, reach) - lo + 1
+        reach = max(reach, hi)
+    return overlap
+
+
+def find_double_bookings(raffle_id: int) -> dict:
+    """
+    Números vendidos dos veces, reservados dos veces o reservados estando
+    vendidos. Todo en 0 es lo esperado.
+    """
+    sold = [
+        (n, end or n)
+        for n, end in Ticket.objects.filter(raffle_id=raffle_id).values_list("number", "number_end")
+    ]
+    held = [
+        (n, end or n)
+        for n, end, _expires_at in availability.iter_pending_reserved_numbers(raffle_id)
+    ]
+    return {
+        "sold_twice": _overlap_size(sold),
+        "held_twice": _overlap_size(held),
+        "held_while_sold": intervals.size(
+            intervals.intersect(intervals.normalize(held), intervals.normalize(sold))
+        ),
+    }
+
+
+# ========= Compradores simulados =========
+
+OPERATIONS = ("reserve", "confirm", "grid")
+DEFAULT_MIX = {"reserve": 0.3, "confirm": 0.1, "grid": 0.6}
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    """
+    "reserve=0.3,confirm=0.1,grid=0.6" → {"reserve": 0.3, ...}.
+    Lanza ValueError si hay operaciones desconocidas o pesos inválidos.
+    """
+    mix = {}
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise ValueError(name)
+        mix[name] = float(weight)
+        if mix[name] < 0:
+            raise ValueError(part)
+    if not any(mix.values()):
+        raise ValueError(value)
+    return mix
+
+
+class _Buyer:
+    """
+    Un comprador simulado: su propio Client, conexión a la BD y contador de
+    consultas. Guarda (segundos, consultas, resultado) por operación.
+    """
+
+    def __init__(self, idx: int, raffle: Raffle, opts: dict, pool: deque, lock: threading.Lock):
+        seed = opts["seed"]
+        self.idx = idx
+        self.raffle = raffle
+        self.opts = opts
+        self.pool = pool
+        self.lock = lock
+        self.rng = random.Random(None if seed is None else seed * 1000 + idx)
+        self.client = Client()
+        self.queries = 0
+        self.samples: dict[str, list[tuple[float, int, str]]] = {op: [] for op in OPERATIONS}
+
+    def _count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def _pick_for_reserve(self) -> list[int]:
+        total = self.raffle.numbers_total
+        hot = min(self.opts["hot_numbers"], total)
+        size = self.rng.choice(_PURCHASE_SIZES)
+        picked = set()
+        while len(picked) < min(size, total):
+            if self.rng.random() < self.opts["hot_ratio"]:
+                picked.add(self.rng.randint(1, hot))
+            else:
+                picked.add(self.rng.randint(1, total))
+        return sorted(picked)
+
+    def reserve(self, i: int):
+        email = f"bench{self.idx}-{i}@example.com"
+        resp = self.client.post(
+            reverse("transfer_reserve"),
+            json.dumps({
+                "chosen_numbers": self._pick_for_reserve(),
+                "buyer": {"name": f"Bench {self.idx}", "email": email},
+            }),
+            content_type="application/json",
+            # Una IP por request: el benchmark mide la app, no el rate limit
+            REMOTE_ADDR=f"10.{self.idx % 256}.{i // 256 % 256}.{i % 256}",
+        )
+        return str(resp.status_code), email if resp.status_code == 200 else None
+
+    def confirm(self, i: int):
+        with self.lock:
+            gateway_payment_id = self.pool.popleft() if self.pool else None
+        if gateway_payment_id is None:
+            return None, None
+        ok = _confirm_tickets_from_payment_id(gateway_payment_id)
+        return ("ok" if ok else "missing"), None
+
+    def grid(self, i: int):
+        pages = max(1, -(-self.raffle.numbers_total // PAGE_SIZE))
+        # La mitad de las visitas se queda en la primera página
+        page = 1 if self.rng.random() < 0.5 else self.rng.randint(1, pages)
+        resp = self.client.get(reverse("grid_page"), {"page": page})
+        return str(resp.status_code), None
+
+    def run(self):
+        ops = list(self.opts["mix"])
+        weights = [self.opts["mix"][op] for op in ops]
+        try:
+            with connection.execute_wrapper(self._count_query):
+                for i in range(self.opts["requests"]):
+                    op = self.rng.choices(ops, weights)[0]
+                    self.queries = 0
+                    start = time.perf_counter()
+                    try:
+                        outcome, email = getattr(self, op)(i)
+                    except Exception as e:
+                        outcome, email = f"error:{type(e).__name__}", None
+                    elapsed = time.perf_counter() - start
+                    if outcome is None:
+                        continue  # nada que confirmar todavía
+                    self.samples[op].append((elapsed, self.queries, outcome))
+                    if email:
+                        # Fuera de la medición: el pago recién creado queda para confirmar
+                        gateway_payment_id = (
+                            Payment.objects.filter(raffle=self.raffle, buyer_email=email)
+                            .values_list("gateway_payment_id", flat=True).first()
+                        )
+                        with self.lock:
+                            self.pool.append(gateway_payment_id)
+        finally:
+            connection.close()
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def _summarize(samples: list[tuple[float, int, str]], elapsed: float) -> dict:
+    latencies = sorted(s[0] * 1000 for s in samples)
+    queries = [s[1] for s in samples]
+    outcomes = Counter(s[2] for s in samples)
+    count = len(samples)
+    return {
+        "count": count,
+        "throughput_rps": round(count / elapsed, 2) if elapsed else 0.0,
+        "errors": sum(v for k, v in outcomes.items() if k.startswith("error") or k.startswith("5")),
+        "outcomes": dict(sorted(outcomes.items())),
+        "latency_ms": {
+            "mean": round(sum(latencies) / count, 3) if count else 0.0,
+            "p50": round(_percentile(latencies, 50), 3),
+            "p95": round(_percentile(latencies, 95), 3),
+            "p99": round(_percentile(latencies, 99), 3),
+            "max": round(latencies[-1], 3) if latencies else 0.0,
+        },
+        "queries": {
+            "mean": round(sum(queries) / count, 2) if count else 0.0,
+            "max": max(queries, default=0),
+        },
+    }
+
+
+def _git_commit() -> str | None:
+    from django.conf import settings
+
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def run_benchmark(raffle: Raffle, workers: int = 8, requests: int = 200,
+                  mix: dict[str, float] | None = None, seed: int | None = None,
+                  hot_numbers: int = 200, hot_ratio: float = 0.2) -> dict:
+    """
+    Corre `workers` compradores en paralelo, `requests` operaciones cada uno,
+    sobre la rifa dada. Las transferencias pendientes de la rifa quedan como
+    candidatas a confirmar. Devuelve el resumen (ver bench_purchase).
+    """
+    opts = {
+        "requests": requests,
+        "mix": mix or DEFAULT_MIX,
+        "seed": seed,
+        "hot_numbers": hot_numbers,
+        "hot_ratio": hot_ratio,
+    }
+    pending = list(
+        Payment.objects.filter(raffle=raffle, gateway="transfer", status="pending")
+        .order_by("id").values_list("gateway_payment_id", flat=True)
+    )
+    random.Random(seed).shuffle(pending)
+    pool, lock = deque(pending), threading.Lock()
+
+    buyers = [_Buyer(i, raffle, opts, pool, lock) for i in range(workers)]
+    threads = [threading.Thread(target=b.run, name=f"bench-buyer-{b.idx}") for b in buyers]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    merged = {op: [s for b in buyers for s in b.samples[op]] for op in OPERATIONS}
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "started_at": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "numbers_total": raffle.numbers_total,
+            "workers": workers,
+            "requests_per_worker": requests,
+            "mix": opts["mix"],
+            "seed": seed,
+            "hot_numbers": hot_numbers,
+            "hot_ratio": hot_ratio,
+            "elapsed_s": round(elapsed, 3),
+        },
+        "operations": {
+            op: _summarize(samples, elapsed) for op, samples in merged.items() if samples
+        },
+        "total": _summarize([s for samples in merged.values() for s in samples], elapsed),
+        "double_booking": find_double_bookings(raffle.id),
+    }
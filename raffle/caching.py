@@ -0,0 +1,168 @@
+"""
+Cache de objetos "calientes" que cambian muy poco (rifa activa, premios) y de páginas
+completas casi estáticas (premios, donaciones, pago exitoso).
+"""
+import hashlib
+from functools import wraps
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from . import metrics
+
+# La rifa activa cambia muy rara vez; el TTL acota cuánto puede quedar
+# desactualizado un worker que no vio la invalidación explícita.
+ACTIVE_RAFFLE_CACHE_TTL = 60
+
+_ACTIVE_RAFFLE_KEY = "raffle:active"
+_NO_RAFFLE = "none"  # centinela: "no hay rifa activa" también se cachea
+
+
+def get_active_raffle():
+    """
+    Devuelve la rifa activa (o None) leyendo primero de la cache.
+    """
+    from .models import Raffle
+
+    cached = cache.get(_ACTIVE_RAFFLE_KEY)
+    metrics.cache_lookup("active_raffle", cached is not None)
+    if cached is not None:
+        return None if cached == _NO_RAFFLE else cached
+
+    raffle = Raffle.objects.filter(is_active=True).order_by("id").first()
+    cache.set(_ACTIVE_RAFFLE_KEY, raffle or _NO_RAFFLE, ACTIVE_RAFFLE_CACHE_TTL)
+    return raffle
+
+
+async def aget_active_raffle():
+    """
+    Versión async de get_active_raffle.
+    """
+    from .models import Raffle
+
+    cached = await cache.aget(_ACTIVE_RAFFLE_KEY)
+    metrics.cache_lookup("active_raffle", cached is not None)
+    if cached is not None:
+        return None if cached == _NO_RAFFLE else cached
+
+    raffle = await Raffle.objects.filter(is_active=True).order_by("id").afirst()
+    await cache.aset(_ACTIVE_RAFFLE_KEY, raffle or _NO_RAFFLE, ACTIVE_RAFFLE_CACHE_TTL)
+    return raffle
+
+
+def invalidate_active_raffle():
+    cache.delete(_ACTIVE_RAFFLE_KEY)
+    # Las páginas cacheadas muestran datos de la rifa activa
+    invalidate_pages()
+
+
+# ========= Listado de premios =========
+
+# Se invalida explícitamente al cambiar un premio; el TTL es solo un tope.
+PRIZES_CACHE_TTL = 60 * 60 * 24
+
+
+def _prizes_key(raffle_id) -> str:
+    from .images import manifest_version
+
+    return f"raffle:prizes:{raffle_id}:{manifest_version()}"
+
+
+def get_prize_listing(raffle_id) -> list[dict]:
+    """
+    Listado de premios de la rifa ya renderizado (ver prizes.build_listing).
+    """
+    from .prizes import build_listing
+
+    key = _prizes_key(raffle_id)
+    listing = cache.get(key)
+    metrics.cache_lookup("prizes", listing is not None)
+    if listing is None:
+        listing = build_listing(raffle_id)
+        cache.set(key, listing, PRIZES_CACHE_TTL)
+    return listing
+
+
+def invalidate_prizes(raffle_id):
+    cache.delete(_prizes_key(raffle_id))
+    invalidate_pages()
+
+
+# ========= Cache de páginas completas =========
+#
+# Se guarda solo el HTML (nunca headers ni cookies): la cookie CSRF y demás
+# headers los sigue poniendo el middleware en cada respuesta. Todas las
+# páginas comparten una "versión" que se cambia para invalidarlas juntas.
+
+PAGE_CACHE_TTL = 60 * 60       # en el servidor (acotado por si falla una invalidación)
+PAGE_CACHE_MAX_AGE = 60 * 10   # en el navegador; luego revalida con ETag
+
+_PAGES_VERSION_KEY = "raffle:pages:version"
+
+
+def _pages_version() -> str:
+    version = cache.get(_PAGES_VERSION_KEY)
+    if version is None:
+        cache.add(_PAGES_VERSION_KEY, uuid4().hex[:12], None)
+        version = cache.get(_PAGES_VERSION_KEY)
+    return version
+
+
+def invalidate_pages():
+    """
+    Invalida todas las páginas cacheadas con cached_page.
+    """
+    cache.set(_PAGES_VERSION_KEY, uuid4().hex[:12], None)
+
+
+def cached_page(name: str, public: bool = True, vary_on_query=()):
+    """
+    Cachea el HTML de una vista GET que no depende del usuario.
+    - La clave incluye solo los parámetros GET de `vary_on_query`.
+    - Responde con ETag (304 si el navegador ya la tiene) y Cache-Control
+      public/private con max-age PAGE_CACHE_MAX_AGE. Usar public=False en
+      vistas que ponen cookies (ej. ensure_csrf_cookie) para que un proxy
+      compartido no las guarde.
+    - Nunca cachea respuestas que no sean 200 ni HTML con {% csrf_token %}
+      (el token es de cada visitante).
+    Va debajo de ensure_csrf_cookie / require_GET, pegado a la vista.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+
+            params = "&".join(f"{k}={request.GET.get(k, '')}" for k in vary_on_query)
+            digest = hashlib.blake2b(params.encode(), digest_size=8).hexdigest()
+            key = f"raffle:page:{name}:{_pages_version()}:{digest}"
+
+            entry = cache.get(key)
+            metrics.cache_lookup("page", entry is not None)
+            if entry is None:
+                response = view(request, *args, **kwargs)
+                if (
+                    response.status_code != 200
+                    or response.streaming
+                    or b"csrfmiddlewaretoken" in response.content
+                ):
+                    return response
+                entry = {
+                    "content": response.content,
+                    "content_type": response["Content-Type"],
+                    "etag": quote_etag(hashlib.blake2b(response.content, digest_size=12).hexdigest()),
+                }
+                cache.set(key, entry, PAGE_CACHE_TTL)
+
+            response = get_conditional_response(request, etag=entry["etag"])
+            if response is None:
+                response = HttpResponse(entry["content"], content_type=entry["content_type"])
+            response["ETag"] = entry["etag"]
+            visibility = {"public": True} if public else {"private": True}
+            patch_cache_control(response, max_age=PAGE_CACHE_MAX_AGE, **visibility)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,33 @@
+"""
+Checks de despliegue (`manage.py check --deploy`).
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Backends en memoria con incr/add atómicos, compartidos entre procesos y servidores
+PRODUCTION_CACHE_BACKENDS = (
+    "django.core.cache.backends.redis.RedisCache",
+    "django.core.cache.backends.memcached.PyMemcacheCache",
+    "django.core.cache.backends.memcached.PyLibMCCache",
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_production_cache(app_configs, **kwargs):
+    """
+    El rate limit cuenta con cache.add + cache.incr, y los mapas de
+    disponibilidad, sus eventos y las métricas viven en la cache. La cache en
+    BD (por defecto) es atómica pero suma escrituras a la BD en cada request
+    y desaloja claves al azar al pasar CACHE_MAX_ENTRIES; la de archivos
+    además pierde incrementos; LocMem no se comparte entre procesos.
+    """
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    if backend in PRODUCTION_CACHE_BACKENDS:
+        return []
+    return [
+        Error(
+            f"La cache default ({backend}) no sirve para producción.",
+            hint="Usar Redis o Memcached en CACHE_URL (p. ej. redis://localhost:6379/0).",
+            id="raffle.E001",
+        )
+    ]
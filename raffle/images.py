@@ -0,0 +1,57 @@
+"""
+Variantes optimizadas (WebP/AVIF en varios anchos) de las imágenes estáticas.
+
+`manage.py optimize_images` las genera en static/img/opt/ junto con un
+manifest.json; collectstatic les agrega el hash de contenido como a cualquier
+otro archivo estático. El tag {% picture %} (templatetags/images.py) lee el
+manifest para armar <picture>/srcset y, si una imagen no tiene variantes,
+cae al <img> original.
+"""
+import hashlib
+import json
+from functools import lru_cache
+
+from django.contrib.staticfiles import finders
+
+OUTPUT_DIR = "img/opt"
+MANIFEST_PATH = f"{OUTPUT_DIR}/manifest.json"
+
+# Imágenes a optimizar (rutas relativas a static/, se aceptan patrones glob)
+SOURCES = (
+    "img/Milo_fondo.png",
+    "img/lollapalooza_logo.jpg",
+    "img/prizes/*.png",
+    "img/prizes/*.jpg",
+)
+
+WIDTHS = (320, 640, 960, 1280, 1920)
+
+# Formato → (extensión, opciones de guardado de Pillow). AVIF primero: es el
+# más liviano y el navegador usa la primera <source> que soporta.
+FORMATS = {
+    "avif": ("avif", {"quality": 50}),
+    "webp": ("webp", {"quality": 75, "method": 6}),
+}
+
+
+@lru_cache(maxsize=1)
+def load_manifest() -> dict:
+    """
+    {ruta original: {"width", "height", "sha256", "variants": {formato: [[ancho, ruta], ...]}}}
+    Vacío si todavía no se corrió optimize_images.
+    """
+    path = finders.find(MANIFEST_PATH)
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+@lru_cache(maxsize=1)
+def manifest_version() -> str:
+    """
+    Hash corto del manifest: cambia cuando cambian las imágenes y con ellas
+    las URLs con hash, así que sirve para versionar HTML cacheado que las use.
+    """
+    data = json.dumps(load_manifest(), sort_keys=True).encode()
+    return hashlib.blake2b(data, digest_size=6).hexdigest()
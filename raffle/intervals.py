@@ -0,0 +1,65 @@
+"""
+Aritmética de intervalos cerrados [desde, hasta] de números de rifa.
+Se usa para tickets y reservas por tramo (ej. 10000-10999) sin expandir
+cada número.
+"""
+from bisect import bisect_right
+
+
+def normalize(ranges) -> list[tuple[int, int]]:
+    """
+    Ordena y une tramos que se solapan o son contiguos.
+    """
+    merged: list[tuple[int, int]] = []
+    for lo, hi in sorted((int(a), int(b)) for a, b in ranges):
+        if merged and lo <= merged[-1][1] + 1:
+            if hi > merged[-1][1]:
+                merged[-1] = (merged[-1][0], hi)
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+def size(ranges) -> int:
+    return sum(hi - lo + 1 for lo, hi in ranges)
+
+
+def subtract(ranges, taken) -> list[tuple[int, int]]:
+    """
+    Partes de `ranges` que no están en `taken` (ambos normalizados).
+    """
+    result = []
+    taken = list(taken)
+    i = 0
+    for lo, hi in ranges:
+        cur = lo
+        while i < len(taken) and taken[i][1] < cur:
+            i += 1
+        j = i
+        while j < len(taken) and taken[j][0] <= hi:
+            t_lo, t_hi = taken[j]
+            if t_lo > cur:
+                result.append((cur, t_lo - 1))
+            cur = max(cur, t_hi + 1)
+            if cur > hi:
+                break
+            j += 1
+        if cur <= hi:
+            result.append((cur, hi))
+    return result
+
+
+def intersect(ranges, other) -> list[tuple[int, int]]:
+    """
+    Partes de `ranges` que sí están en `other` (ambos normalizados).
+    """
+    covered = subtract(ranges, other)
+    return subtract(ranges, covered)
+
+
+def contains(ranges, n: int) -> bool:
+    """
+    True si n cae en algún tramo de `ranges` (normalizado).
+    """
+    i = bisect_right(ranges, (n, float("inf"))) - 1
+    return i >= 0 and ranges[i][0] <= n <= ranges[i][1]
@@ -0,0 +1,105 @@
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from raffle import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark de carga del flujo de compra (reservar, confirmar, grilla) "
+        "sobre una BD de prueba desechable. Imprime un resumen JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--numbers", type=int, default=10_000, help="Tamaño de la rifa")
+        parser.add_argument("--sold", type=float, default=0.3, help="Fracción vendida al inicio")
+        parser.add_argument("--pending", type=float, default=0.05, help="Fracción reservada al inicio")
+        parser.add_argument("--distribution", choices=benchmark.DISTRIBUTIONS, default="popular")
+        parser.add_argument("--workers", type=int, default=8, help="Compradores simultáneos (hilos)")
+        parser.add_argument("--requests", type=int, default=200, help="Operaciones por comprador")
+        parser.add_argument(
+            "--mix", default="reserve=0.3,confirm=0.1,grid=0.6",
+            help="Peso de cada operación (reserve, confirm, grid)",
+        )
+        parser.add_argument("--hot-numbers", type=int, default=200,
+                            help="Números 'populares' donde se concentran las reservas")
+        parser.add_argument("--hot-ratio", type=float, default=0.2,
+                            help="Fracción de números pedidos dentro de los populares")
+        parser.add_argument("--seed", type=int, default=1, help="Semilla (mismo valor → mismos datos)")
+        parser.add_argument("--output", help="Guardar el JSON en este archivo")
+        parser.add_argument(
+            "--keep-cache", action="store_true",
+            help="Usar la cache configurada (por defecto una LocMemCache aislada)",
+        )
+
+    def handle(self, *args, **opts):
+        try:
+            mix = benchmark.parse_mix(opts["mix"])
+        except ValueError:
+            raise CommandError(f"--mix inválido: {opts['mix']!r}")
+        if opts["workers"] < 1 or opts["requests"] < 1 or opts["numbers"] < 1:
+            raise CommandError("--numbers, --workers y --requests deben ser positivos")
+        if not 0 <= opts["sold"] + opts["pending"] <= 1:
+            raise CommandError("--sold + --pending debe estar entre 0 y 1")
+
+        caches = settings.CACHES
+        if not opts["keep_cache"]:
+            caches = {"default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "raffle-bench",
+            }}
+
+        # BD de prueba desechable: nunca se toca la BD real. En SQLite se usa
+        # un archivo (no memoria) para que los hilos compitan por bloqueos reales.
+        old_name = connection.settings_dict["NAME"]
+        if connection.vendor == "sqlite":
+            connection.settings_dict.setdefault("TEST", {})["NAME"] = os.path.join(
+                tempfile.gettempdir(), "raffle_bench.sqlite3",
+            )
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(CACHES=caches):
+                self.stderr.write(f"Sembrando rifa de {opts['numbers']} números…")
+                raffle = benchmark.seed_raffle(
+                    opts["numbers"],
+                    sold=opts["sold"],
+                    pending=opts["pending"],
+                    distribution=opts["distribution"],
+                    seed=opts["seed"],
+                )
+                self.stderr.write(
+                    f"Corriendo {opts['workers']} compradores × {opts['requests']} operaciones…"
+                )
+                result = benchmark.run_benchmark(
+                    raffle,
+                    workers=opts["workers"],
+                    requests=opts["requests"],
+                    mix=mix,
+                    seed=opts["seed"],
+                    hot_numbers=opts["hot_numbers"],
+                    hot_ratio=opts["hot_ratio"],
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        result["meta"].update({
+            "sold": opts["sold"],
+            "pending": opts["pending"],
+            "distribution": opts["distribution"],
+        })
+        payload = json.dumps(result, indent=2, ensure_ascii=False)
+        if opts["output"]:
+            with open(opts["output"], "w", encoding="utf-8") as fh:
+                fh.write(payload + "\n")
+        self.stdout.write(payload)
+
+        if any(result["double_booking"].values()):
+            raise CommandError(f"Números duplicados: {result['double_booking']}")
@@ -0,0 +1,94 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from raffle.models import Raffle, Payment, Ticket, Reservation
+
+TABLES = {m._meta.db_table for m in (Raffle, Payment, Ticket, Reservation)}
+
+# SQLite: "SCAN tabla" (sin SEARCH) = recorrido completo
+_SQLITE_SCAN = re.compile(r"\bSCAN (\w+)")
+# Postgres: con enable_seqscan=off solo queda Seq Scan si no hay índice usable
+_PG_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+def hot_queries():
+    """
+    Consultas de las rutas calientes (reserva, disponibilidad, confirmación,
+    barrido), con parámetros de ejemplo.
+    """
+    raffle_id = Raffle.objects.order_by("id").values_list("id", flat=True).first() or 1
+    now = timezone.now()
+    numbers = [1, 2, 3]
+
+    return [
+        ("transfer_reserve: reservas recientes por email", Payment.objects.filter(
+            raffle_id=raffle_id, gateway="transfer", status="pending",
+            buyer_email="comprador@example.com", created_at__gte=now - timedelta(hours=24),
+        )),
+        ("transfer_reserve: números ya vendidos", Ticket.objects.filter(
+            raffle_id=raffle_id, number__in=numbers,
+        ).values_list("number", flat=True)),
+        ("transfer_reserve: liberar reservas vencidas", Reservation.objects.filter(
+            raffle_id=raffle_id, number__in=numbers, is_active=True, expires_at__lte=now,
+        )),
+        ("disponibilidad: tickets de la rifa", Ticket.objects.filter(
+            raffle_id=raffle_id,
+        ).values_list("number", "number_end")),
+        ("disponibilidad: reservas activas", Reservation.objects.filter(
+            raffle_id=raffle_id, is_active=True, expires_at__gt=now,
+        ).values_list("number", "number_end", "expires_at")),
+        ("check_number: reserva activa", Reservation.objects.filter(
+            raffle_id=raffle_id, number=1, is_active=True, expires_at__gt=now,
+        )),
+        ("confirmación: reservas de los pagos", Reservation.objects.filter(
+            payment_id__in=[1, 2],
+        ).values_list("payment_id", "number")),
+        ("barrido: transferencias vencidas", Payment.objects.filter(
+            gateway="transfer", status="pending", expires_at__lte=now,
+        ).order_by("expires_at").values_list("id", flat=True)),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta EXPLAIN sobre las consultas calientes y falla si alguna "
+        "recorre una tabla completa (SQLite y Postgres)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--show", action="store_true", help="Mostrar los planes completos")
+
+    def handle(self, *args, **opts):
+        vendor = connection.vendor
+        if vendor == "sqlite":
+            pattern = _SQLITE_SCAN
+        elif vendor == "postgresql":
+            pattern = _PG_SCAN
+        else:
+            raise CommandError(f"Motor no soportado: {vendor}")
+
+        failures = []
+        with transaction.atomic():
+            if vendor == "postgresql":
+                with connection.cursor() as cur:
+                    # Solo para esta transacción: con tablas chicas el planner
+                    # preferiría un Seq Scan aunque exista el índice
+                    cur.execute("SET LOCAL enable_seqscan = off")
+
+            for name, qs in hot_queries():
+                plan = qs.explain()
+                scanned = sorted({t for t in pattern.findall(plan) if t in TABLES})
+                if opts["show"]:
+                    self.stdout.write(f"--- {name}\n{plan}\n")
+                if scanned:
+                    failures.append(f"{name}: recorre {', '.join(scanned)}")
+                    self.stdout.write(self.style.ERROR(f"FULL SCAN  {name}"))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"OK         {name}"))
+
+        if failures:
+            raise CommandError("Consultas sin índice:\n" + "\n".join(failures))
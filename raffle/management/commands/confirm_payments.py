@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from raffle.admin import _numbers_label
+from raffle.views import _confirm_payments_batch, CONFIRM_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Confirma en lote Payments (marca paid y emite tickets), mostrando el avance"
+
+    def add_arguments(self, parser):
+        parser.add_argument("ids", nargs="*", type=int, help="IDs de Payment a confirmar")
+        parser.add_argument("--file", help="Archivo con un ID de Payment por línea")
+        parser.add_argument("--chunk-size", type=int, default=CONFIRM_BATCH_SIZE)
+
+    def handle(self, *args, **opts):
+        ids = list(opts["ids"])
+        if opts["file"]:
+            with open(opts["file"], encoding="utf-8") as fh:
+                for line in fh:
+                    line = line.strip()
+                    if line:
+                        try:
+                            ids.append(int(line))
+                        except ValueError:
+                            raise CommandError(f"ID inválido en {opts['file']}: {line!r}")
+
+        if not ids:
+            raise CommandError("Indica al menos un ID de Payment")
+        if opts["chunk_size"] <= 0:
+            raise CommandError("--chunk-size debe ser mayor que 0")
+
+        def progress(done, total):
+            self.stdout.write(f"{done}/{total} pagos confirmados")
+
+        summary = _confirm_payments_batch(ids, chunk_size=opts["chunk_size"], progress=progress)
+
+        results = summary["results"]
+        for r in results:
+            if r["conflict_numbers"] or r["conflict_ranges"]:
+                self.stdout.write(self.style.WARNING(
+                    f"Payment {r['payment_id']}: números ya vendidos "
+                    f"{_numbers_label(r['conflict_numbers'], r['conflict_ranges'])}"
+                ))
+        if summary["missing"]:
+            self.stdout.write(self.style.WARNING(
+                f"No existen: {', '.join(str(i) for i in summary['missing'])}"
+            ))
+
+        # Como en la acción del admin: un tramo es un solo ticket
+        tickets = sum(len(r["paid_numbers"]) + len(r["paid_ranges"]) for r in results)
+        self.stdout.write(self.style.SUCCESS(
+            f"Se procesaron {len(results)} pagos, {tickets} tickets emitidos"
+        ))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from raffle.sweeper import sweep_expired_reservations, SWEEP_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Marca como 'expired' las reservas por transferencia vencidas y libera sus números"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=SWEEP_BATCH_SIZE)
+        parser.add_argument(
+            "--loop", type=int, default=0, metavar="SEGUNDOS",
+            help="Repetir el barrido cada N segundos (0 = una sola vez)",
+        )
+
+    def handle(self, *args, **opts):
+        while True:
+            swept = sweep_expired_reservations(batch_size=opts["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"Reservas expiradas: {swept}"))
+            if not opts["loop"]:
+                return
+            time.sleep(opts["loop"])
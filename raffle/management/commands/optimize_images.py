@@ -0,0 +1,122 @@
+import glob
+import hashlib
+import json
+import os
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from raffle import images
+
+STATIC_DIR = os.path.join(apps.get_app_config("raffle").path, "static")
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera variantes WebP/AVIF en varios anchos de las imágenes de "
+        f"static/ ({images.OUTPUT_DIR}/). Correr antes de collectstatic."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Regenerar aunque no hayan cambiado")
+        parser.add_argument(
+            "--widths", default=",".join(str(w) for w in images.WIDTHS),
+            help="Anchos a generar, separados por coma",
+        )
+
+    def handle(self, *args, **opts):
+        try:
+            from PIL import Image, features
+        except ImportError:
+            raise CommandError("Falta Pillow: pip install Pillow")
+
+        try:
+            widths = sorted({int(w) for w in opts["widths"].split(",") if w.strip()})
+        except ValueError:
+            raise CommandError(f"--widths inválido: {opts['widths']!r}")
+
+        formats = {}
+        for name, spec in images.FORMATS.items():
+            if features.check(name):
+                formats[name] = spec
+            else:
+                self.stderr.write(self.style.WARNING(f"Pillow sin soporte {name}: se omite"))
+        if not formats:
+            raise CommandError("Pillow no soporta ninguno de los formatos de salida")
+
+        manifest_file = os.path.join(STATIC_DIR, images.MANIFEST_PATH)
+        old = {}
+        if os.path.exists(manifest_file) and not opts["force"]:
+            with open(manifest_file, encoding="utf-8") as fh:
+                old = json.load(fh)
+
+        sources = sorted({
+            os.path.relpath(path, STATIC_DIR).replace(os.sep, "/")
+            for pattern in images.SOURCES
+            for path in glob.glob(os.path.join(STATIC_DIR, pattern))
+        })
+
+        manifest = {}
+        for rel in sources:
+            src = os.path.join(STATIC_DIR, rel)
+            sha = _sha256(src)
+            entry = old.get(rel)
+            if entry and entry["sha256"] == sha and self._outputs_exist(entry):
+                manifest[rel] = entry
+                continue
+
+            with Image.open(src) as img:
+                img.load()
+                width, height = img.size
+                has_alpha = img.mode in ("RGBA", "LA") or "transparency" in img.info
+                img = img.convert("RGBA" if has_alpha else "RGB")
+
+                targets = [w for w in widths if w < width] + [min(width, widths[-1])]
+                variants = {name: [] for name in formats}
+                stem = os.path.splitext(rel[len("img/"):] if rel.startswith("img/") else rel)[0]
+                for w in sorted(set(targets)):
+                    resized = img if w == width else img.resize(
+                        (w, round(height * w / width)), Image.LANCZOS,
+                    )
+                    for name, (ext, save_opts) in formats.items():
+                        out_rel = f"{images.OUTPUT_DIR}/{stem}-{w}w.{ext}"
+                        out = os.path.join(STATIC_DIR, out_rel)
+                        os.makedirs(os.path.dirname(out), exist_ok=True)
+                        resized.save(out, format=name.upper(), **save_opts)
+                        variants[name].append([w, out_rel])
+
+            manifest[rel] = {"width": width, "height": height, "sha256": sha, "variants": variants}
+            self.stdout.write(f"{rel}: {width}x{height} → {len(set(targets))} anchos")
+
+        before = after = 0
+        for rel, entry in manifest.items():
+            before += os.path.getsize(os.path.join(STATIC_DIR, rel))
+            # Lo que baja un celular: la variante más angosta ≥ 640 px del primer formato
+            first = next(iter(entry["variants"].values()))
+            mobile = next((p for w, p in first if w >= 640), first[-1][1])
+            after += os.path.getsize(os.path.join(STATIC_DIR, mobile))
+
+        os.makedirs(os.path.dirname(manifest_file), exist_ok=True)
+        with open(manifest_file, "w", encoding="utf-8") as fh:
+            json.dump(manifest, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(manifest)} imágenes: {before / 1e6:.1f} MB originales → "
+            f"{after / 1e6:.2f} MB en celular (640 px)"
+        ))
+
+    def _outputs_exist(self, entry) -> bool:
+        return all(
+            os.path.exists(os.path.join(STATIC_DIR, path))
+            for variants in entry["variants"].values()
+            for _w, path in variants
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from raffle.search import rebuild
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice de búsqueda de compradores (SearchToken) desde los pagos"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **opts):
+        total = rebuild(batch=opts["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Pagos indexados: {total}"))
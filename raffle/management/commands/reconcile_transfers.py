@@ -0,0 +1,67 @@
+import os
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from raffle import reconciliation
+
+
+class Command(BaseCommand):
+    help = (
+        "Concilia una cartola bancaria (CSV) con las transferencias pendientes: "
+        "confirma los calces seguros y deja el resto por revisar en el admin"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV exportado desde el banco")
+        parser.add_argument("--encoding", default="utf-8-sig", help="Ej. latin-1 para cartolas antiguas")
+        parser.add_argument("--since", help="Considerar transferencias desde esta fecha (AAAA-MM-DD)")
+        parser.add_argument("--window-days", type=int, default=reconciliation.WINDOW_DAYS,
+                            help="Días entre la reserva y el abono")
+        parser.add_argument("--batch-size", type=int, default=reconciliation.BATCH_SIZE)
+        parser.add_argument("--dry-run", action="store_true", help="Mostrar el resultado sin guardar ni confirmar")
+
+    def handle(self, *args, **opts):
+        since = None
+        if opts["since"]:
+            try:
+                since = timezone.make_aware(datetime.strptime(opts["since"], "%Y-%m-%d"))
+            except ValueError:
+                raise CommandError(f"--since inválido: {opts['since']!r}")
+
+        def on_error(line_no, message):
+            self.stderr.write(self.style.WARNING(f"Línea {line_no}: {message}"))
+
+        def progress(summary):
+            self.stdout.write(
+                f"{summary['lines']} líneas: {summary['matched']} confirmadas, "
+                f"{summary['review']} por revisar"
+            )
+
+        try:
+            with open(opts["path"], encoding=opts["encoding"], newline="") as fh:
+                summary = reconciliation.reconcile(
+                    fh,
+                    source=os.path.basename(opts["path"]),
+                    since=since,
+                    window_days=opts["window_days"],
+                    batch_size=opts["batch_size"],
+                    dry_run=opts["dry_run"],
+                    on_error=on_error,
+                    progress=progress,
+                )
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            raise CommandError(str(e))
+
+        if summary["duplicates"]:
+            self.stdout.write(f"{summary['duplicates']} líneas ya importadas antes (omitidas)")
+        if summary["conflicts"]:
+            self.stdout.write(self.style.WARNING(
+                f"{summary['conflicts']} pagos confirmados con números ya vendidos (quedan por revisar)"
+            ))
+        prefix = "[simulación] " if opts["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{summary['matched']} transferencias confirmadas "
+            f"({summary['tickets']} tickets), {summary['review']} por revisar"
+        ))
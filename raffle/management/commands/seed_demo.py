@@ -1,16 +1,46 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from raffle.benchmark import DISTRIBUTIONS, seed_raffle
 from raffle.models import Raffle
+from raffle.prizes import create_default_prizes
 
 class Command(BaseCommand):
-    help = "Crea rifa demo"
+    help = "Crea rifa demo (con --numbers, una rifa del tamaño indicado con ventas simuladas)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--numbers", type=int, help="Crear una rifa nueva de este tamaño")
+        parser.add_argument("--sold", type=float, default=0.0, help="Fracción de números vendidos")
+        parser.add_argument("--pending", type=float, default=0.0,
+                            help="Fracción de números reservados por transferencia")
+        parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="uniform")
+        parser.add_argument("--seed", type=int, help="Semilla para repetir los mismos datos")
+        parser.add_argument("--ranges", action="store_true", help="Permitir compra por tramos")
+
+    def handle(self, *args, **opts):
+        if opts["numbers"]:
+            if not 0 <= opts["sold"] + opts["pending"] <= 1:
+                raise CommandError("--sold + --pending debe estar entre 0 y 1")
+            raffle = seed_raffle(
+                opts["numbers"],
+                sold=opts["sold"],
+                pending=opts["pending"],
+                distribution=opts["distribution"],
+                seed=opts["seed"],
+                title=f"Rifa demo {opts['numbers']}",
+                allows_ranges=opts["ranges"],
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"Rifa {raffle.id} creada: {raffle.tickets.count()} vendidos, "
+                f"{raffle.reservations.count()} reservados"
+            ))
+            return
 
-    def handle(self, *args, **kwargs):
         if not Raffle.objects.exists():
-            Raffle.objects.create(
+            raffle = Raffle.objects.create(
                 title="Rifa Milo",
                 description="Rifa para ayudar a Milo 🐶. Elige uno o más números, escribe tus datos y paga para participar.",
                 price_clp=3000, numbers_total=500, is_active=True
             )
+            create_default_prizes(raffle)
             self.stdout.write(self.style.SUCCESS("Rifa demo creada"))
         else:
             self.stdout.write("Ya existe una rifa")
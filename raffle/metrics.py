@@ -0,0 +1,309 @@
+"""
+Métricas de la app en formato Prometheus.
+
+Cada worker acumula contadores e histogramas en memoria y cada
+RAFFLE_METRICS_FLUSH_SECONDS deja una foto completa en la cache compartida,
+en un casillero propio que toma con cache.add. El endpoint /metrics exporta
+las fotos de todos los workers vivos con la etiqueta `worker` (los totales se
+suman en Prometheus), así que con varios procesos de gunicorn se necesita una
+cache compartida (Redis, memcached o BD; no LocMemCache).
+
+Las consultas SQL se atribuyen a la request en curso con un execute_wrapper
+instalado en cada conexión y un ContextVar, que también funciona con vistas
+async (sync_to_async copia el contexto).
+"""
+import os
+import socket
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+
+# nombre → (tipo, ayuda, buckets de histograma)
+METRICS = {
+    "raffle_http_requests_total": (
+        "counter", "Requests atendidas por vista, método y código de respuesta.", None,
+    ),
+    "raffle_http_request_duration_seconds": (
+        "histogram", "Duración de la request por vista.",
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    ),
+    "raffle_http_response_size_bytes": (
+        "histogram", "Tamaño del cuerpo de la respuesta (sin streams).",
+        (1_000, 5_000, 10_000, 50_000, 100_000, 500_000, 1_000_000),
+    ),
+    "raffle_db_queries_per_request": (
+        "histogram", "Consultas SQL por request.",
+        (0, 1, 2, 5, 10, 20, 50, 100),
+    ),
+    "raffle_db_query_duration_seconds_total": (
+        "counter", "Tiempo total en consultas SQL por vista.", None,
+    ),
+    "raffle_cache_lookups_total": (
+        "counter", "Lecturas de cache por cache lógica y resultado (hit/miss).", None,
+    ),
+    "raffle_reservations_created_total": (
+        "counter", "Reservas por transferencia creadas.", None,
+    ),
+    "raffle_numbers_reserved_total": (
+        "counter", "Números reservados por transferencia.", None,
+    ),
+    "raffle_reservation_conflicts_total": (
+        "counter", "Reservas rechazadas con 409 por números ya tomados.", None,
+    ),
+    "raffle_numbers_sold_total": (
+        "counter", "Números vendidos (tickets emitidos; un tramo suma cada número). "
+                   "Usar rate() para tickets por segundo.", None,
+    ),
+}
+
+WORKER_TTL = 60 * 10  # la foto de un worker muerto desaparece después de esto
+MAX_WORKERS = 256     # casilleros de la cache; los workers de más no se exportan
+
+_WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+_slot: int | None = None  # casillero de este worker
+
+_lock = threading.Lock()
+_counters: dict[tuple, float] = {}
+_histograms: dict[tuple, list] = {}  # (nombre, labels) → [conteo por bucket..., suma, total]
+_last_flush = 0.0
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels):
+    if not value:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels):
+    buckets = METRICS[name][2]
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * len(buckets) + [0.0, 0]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                hist[i] += 1
+        hist[-2] += value
+        hist[-1] += 1
+
+
+def cache_lookup(cache_name: str, hit: bool):
+    inc("raffle_cache_lookups_total", cache=cache_name, result="hit" if hit else "miss")
+
+
+# ========= Consultas SQL por request =========
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+current_request: ContextVar[RequestStats | None] = ContextVar("raffle_metrics_request", default=None)
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    stats = current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - start
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    """
+    Receptor de connection_created: cuenta las consultas de cada conexión.
+    """
+    if _query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_wrapper)
+
+
+# ========= Agregación entre workers =========
+
+def _snapshot() -> dict:
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "histograms": {k: list(v) for k, v in _histograms.items()},
+        }
+
+
+def _flush_due() -> bool:
+    interval = getattr(settings, "RAFFLE_METRICS_FLUSH_SECONDS", 10)
+    return time.monotonic() - _last_flush >= interval
+
+
+def _mark_flushed():
+    global _last_flush
+    _last_flush = time.monotonic()
+
+
+def _slot_key(slot: int) -> str:
+    return f"raffle:metrics:slot:{slot}"
+
+
+def _free_slots(found: dict) -> list[int]:
+    return [slot for slot in range(MAX_WORKERS) if _slot_key(slot) not in found]
+
+
+def _owns(entry) -> bool:
+    return bool(entry) and entry.get("worker") == _WORKER_ID
+
+
+def flush():
+    """
+    Guarda la foto de este worker en su casillero de la cache compartida. Si
+    todavía no tiene uno (o expiró y lo tomó otro), toma el primero libre
+    con cache.add, que es atómico: dos workers nunca comparten casillero.
+    """
+    global _slot
+    _mark_flushed()
+    entry = {"worker": _WORKER_ID, **_snapshot()}
+    if _slot is not None and _owns(cache.get(_slot_key(_slot))):
+        cache.set(_slot_key(_slot), entry, WORKER_TTL)
+        return
+    _slot = None
+    found = cache.get_many([_slot_key(slot) for slot in range(MAX_WORKERS)])
+    for slot in _free_slots(found):
+        if cache.add(_slot_key(slot), entry, WORKER_TTL):
+            _slot = slot
+            return
+
+
+async def aflush():
+    global _slot
+    _mark_flushed()
+    entry = {"worker": _WORKER_ID, **_snapshot()}
+    if _slot is not None and _owns(await cache.aget(_slot_key(_slot))):
+        await cache.aset(_slot_key(_slot), entry, WORKER_TTL)
+        return
+    _slot = None
+    found = await cache.aget_many([_slot_key(slot) for slot in range(MAX_WORKERS)])
+    for slot in _free_slots(found):
+        if await cache.aadd(_slot_key(slot), entry, WORKER_TTL):
+            _slot = slot
+            return
+
+
+def maybe_flush():
+    if _flush_due():
+        flush()
+
+
+async def amaybe_flush():
+    if _flush_due():
+        await aflush()
+
+
+def _with_worker(labels: tuple, worker: str) -> tuple:
+    return tuple(sorted(labels + (("worker", worker),)))
+
+
+def collect() -> dict:
+    """
+    Junta las fotos de todos los workers vivos (incluida la de este, recién
+    guardada). Cada serie lleva la etiqueta `worker` en vez de sumarse aquí:
+    cuando un worker muere su serie desaparece y sum(rate(...)) en
+    Prometheus no ve bajar el total.
+    """
+    flush()
+    snapshots = {}
+    for entry in cache.get_many([_slot_key(slot) for slot in range(MAX_WORKERS)]).values():
+        # Un mismo proceso puede quedar con dos casilleros por un momento
+        snapshots[entry["worker"]] = entry
+
+    counters: dict[tuple, float] = {}
+    histograms: dict[tuple, list] = {}
+    for worker, snap in snapshots.items():
+        for (name, labels), value in snap["counters"].items():
+            counters[name, _with_worker(labels, worker)] = value
+        for (name, labels), hist in snap["histograms"].items():
+            histograms[name, _with_worker(labels, worker)] = list(hist)
+    from .sweeper import get_sweeper_stats
+
+    return {
+        "counters": counters, "histograms": histograms, "workers": len(snapshots),
+        "sweeper": get_sweeper_stats(),
+    }
+
+
+# ========= Formato de texto de Prometheus =========
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value) -> str:
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+def _sweeper_lines(stats: dict) -> list[str]:
+    """
+    Totales del barrido de reservas vencidas (los guarda en la cache el
+    propio barrido, no cada worker).
+    """
+    if not stats:
+        return []
+    last_run = datetime.fromisoformat(stats["last_run_at"]).timestamp()
+    return [
+        "# HELP raffle_sweeper_runs_total Barridos de reservas vencidas ejecutados.",
+        "# TYPE raffle_sweeper_runs_total counter",
+        f"raffle_sweeper_runs_total {stats['runs']}",
+        "# HELP raffle_sweeper_expired_total Pagos por transferencia expirados por el barrido.",
+        "# TYPE raffle_sweeper_expired_total counter",
+        f"raffle_sweeper_expired_total {stats['swept_total']}",
+        "# HELP raffle_sweeper_last_run_timestamp_seconds Hora (epoch) del último barrido.",
+        "# TYPE raffle_sweeper_last_run_timestamp_seconds gauge",
+        f"raffle_sweeper_last_run_timestamp_seconds {_number(last_run)}",
+    ]
+
+
+def render(data: dict) -> str:
+    lines = [
+        "# HELP raffle_metrics_workers Workers con métricas vigentes en la cache.",
+        "# TYPE raffle_metrics_workers gauge",
+        f"raffle_metrics_workers {data['workers']}",
+    ]
+    lines.extend(_sweeper_lines(data.get("sweeper")))
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, labels), value in sorted(data["counters"].items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+            continue
+        for (metric, labels), hist in sorted(data["histograms"].items()):
+            if metric != name:
+                continue
+            for bound, count in zip(buckets, hist):
+                lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {count}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {hist[-1]}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(hist[-2])}")
+            lines.append(f"{name}_count{_labels(labels)} {hist[-1]}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,61 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics
+
+
+class MetricsMiddleware:
+    """
+    Registra por nombre de URL: latencia, consultas SQL (cantidad y tiempo)
+    y tamaño de la respuesta. Funciona en modo sync y async para no forzar
+    a las vistas async a pasar por un hilo.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = metrics.RequestStats()
+        token = metrics.current_request.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current_request.reset(token)
+        self._record(request, response, stats, time.perf_counter() - start)
+        metrics.maybe_flush()
+        return response
+
+    async def __acall__(self, request):
+        stats = metrics.RequestStats()
+        token = metrics.current_request.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current_request.reset(token)
+        self._record(request, response, stats, time.perf_counter() - start)
+        await metrics.amaybe_flush()
+        return response
+
+    def _record(self, request, response, stats, elapsed):
+        match = getattr(request, "resolver_match", None)
+        view = (match.view_name if match else None) or "<unmatched>"
+
+        metrics.inc(
+            "raffle_http_requests_total",
+            view=view, method=request.method, status=response.status_code,
+        )
+        metrics.observe("raffle_http_request_duration_seconds", elapsed, view=view)
+        metrics.observe("raffle_db_queries_per_request", stats.queries, view=view)
+        metrics.inc("raffle_db_query_duration_seconds_total", stats.db_seconds, view=view)
+        if not response.streaming:
+            metrics.observe("raffle_http_response_size_bytes", len(response.content), view=view)
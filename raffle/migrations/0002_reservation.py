@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_reservations(apps, schema_editor):
+    """
+    Crea una Reservation por cada número en metadata['chosen_numbers']
+    de los pagos por transferencia pendientes.
+    """
+    Payment = apps.get_model("raffle", "Payment")
+    Reservation = apps.get_model("raffle", "Reservation")
+
+    now = timezone.now()
+    active_keys = set()
+    rows = []
+
+    pending = Payment.objects.filter(
+        gateway="transfer", status="pending", expires_at__isnull=False,
+    ).order_by("created_at", "id")
+
+    for p in pending.iterator():
+        meta = p.metadata if isinstance(p.metadata, dict) else {}
+        for n in meta.get("chosen_numbers", []):
+            try:
+                n = int(n)
+            except (TypeError, ValueError):
+                continue
+            key = (p.raffle_id, n)
+            # Si dos reservas chocan, la más antigua queda activa
+            is_active = p.expires_at > now and key not in active_keys
+            if is_active:
+                active_keys.add(key)
+            rows.append(Reservation(
+                raffle_id=p.raffle_id,
+                number=n,
+                payment_id=p.id,
+                expires_at=p.expires_at,
+                is_active=is_active,
+            ))
+
+    Reservation.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffle', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='raffle.payment')),
+                ('raffle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='raffle.raffle')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('raffle', 'number'), name='uniq_active_reservation')],
+            },
+        ),
+        migrations.RunPython(backfill_reservations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffle', '0002_reservation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['raffle', 'gateway', 'status', 'buyer_email', 'created_at'], name='payment_buyer_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('gateway', 'transfer'), ('status', 'pending')), fields=['expires_at'], name='payment_pending_transfer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['raffle', 'expires_at'], name='reservation_active_idx'),
+        ),
+    ]
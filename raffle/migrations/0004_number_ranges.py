@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffle', '0003_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='raffle',
+            name='allows_ranges',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='number_end',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='number_end',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:35
+
+import django.db.models.deletion
+from django.contrib.staticfiles import finders
+from django.db import migrations, models
+
+
+# Copia congelada de raffle.prizes.DEFAULT_PRIZES al momento de la migración:
+# la migración no debe cambiar si después cambian los premios por defecto
+DEFAULT_PRIZES = [
+    ("Pase diario a Lollapalooza Chile 2026 (viernes 13 de marzo)", "img/prizes/lollapalooza.jpg",
+     "Un pase diario para vivir Lollapalooza Chile 2026 el día viernes 13 de marzo."),
+    ("$50.000 CLP", "img/prizes/50000clp.png",
+     "Premio en dinero por un valor de $50.000 CLP."),
+    ("Plancha de pelo", "img/prizes/plancha_pelo.jpg",
+     "Plancha de pelo para lucir un look increíble."),
+    ("Sesión de limpieza facial", "img/prizes/limpieza_facial.jpg",
+     "Una sesión de limpieza facial para cuidar tu piel."),
+    ("Tabla de picar (grande)", "img/prizes/tabla_picar_grande.png",
+     "Hermosa tabla de picar artesanal hecha con madera nativa."),
+    ("Tabla de picar (pequeña)", "img/prizes/tabla_picar_pequena.png",
+     "Versión pequeña de la tabla de picar artesanal, perfecta para el uso diario."),
+    ("Tabla de picoteo", "img/prizes/tabla_picoteo.png",
+     "Tabla de picoteo artesanal ideal para compartir."),
+    ("Vaporizador facial", "img/prizes/vaporizador_facial.jpg",
+     "Vaporizador facial ideal para rutinas de skincare."),
+    ("Vino Carmenere Gran Reserva", "img/prizes/vino_carmenere.png",
+     "Botella de vino Carmenere Gran Reserva."),
+    ("Vino Cabernet Sauvignon", "img/prizes/vino_cabernet.png",
+     "Botella de vino Cabernet Sauvignon para compartir."),
+    ("Torta 3 leches para 20 personas", "img/prizes/torta.png",
+     "Deliciosa torta casera para celebrar con hasta 20 personas."),
+    ("Pan de Pascua", "img/prizes/pan_pascua.jpg",
+     "Pan de pascua casero con frutos secos."),
+]
+
+
+def image_size(path):
+    # Sin el manifest de optimize_images (código vivo): solo Pillow
+    full = finders.find(path)
+    if not full:
+        return None, None
+    try:
+        from PIL import Image
+        with Image.open(full) as img:
+            return img.size
+    except (ImportError, OSError):
+        return None, None
+
+
+def seed_prizes(apps, schema_editor):
+    # Los premios estaban fijos en views.prizes_page: pasan a la rifa activa
+    Raffle = apps.get_model("raffle", "Raffle")
+    Prize = apps.get_model("raffle", "Prize")
+    for raffle in Raffle.objects.filter(is_active=True):
+        if Prize.objects.filter(raffle_id=raffle.pk).exists():
+            continue
+        prizes = []
+        for position, (name, image, description) in enumerate(DEFAULT_PRIZES, start=1):
+            width, height = image_size(image)
+            prizes.append(Prize(
+                raffle_id=raffle.pk, position=position, name=name, image=image,
+                description=description, image_width=width, image_height=height,
+            ))
+        Prize.objects.bulk_create(prizes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffle', '0004_number_ranges'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Prize',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('name', models.CharField(max_length=200)),
+                ('description', models.TextField(blank=True)),
+                ('image', models.CharField(blank=True, max_length=200)),
+                ('image_width', models.PositiveIntegerField(blank=True, editable=False, null=True)),
+                ('image_height', models.PositiveIntegerField(blank=True, editable=False, null=True)),
+                ('raffle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prizes', to='raffle.raffle')),
+                ('winner_ticket', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='prizes_won', to='raffle.ticket')),
+            ],
+            options={
+                'ordering': ['raffle', 'position', 'id'],
+            },
+        ),
+        migrations.RunPython(seed_prizes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:36
+
+from django.db import migrations, models
+
+BATCH = 2000
+
+# Copia congelada de raffle.models.numbers_summaries al momento de la migración
+NUMBERS_SUMMARY_MAX = 200
+
+
+def _numbers_summary(numbers, ranges=()):
+    parts = [str(n) for n in numbers] + [f"{lo}-{hi}" for lo, hi in ranges]
+    label = ", ".join(parts)
+    if len(label) <= NUMBERS_SUMMARY_MAX:
+        return label
+    shown = label[:NUMBERS_SUMMARY_MAX - 12].rsplit(", ", 1)[0]
+    return f"{shown} … (+{len(parts) - shown.count(', ') - 1})"
+
+
+def numbers_summaries(metadata, chosen_number=None):
+    meta = metadata if isinstance(metadata, dict) else {}
+    chosen = _numbers_summary(meta.get("chosen_numbers") or [], meta.get("chosen_ranges") or [])
+    if not chosen and chosen_number:
+        chosen = str(chosen_number)
+    conflicts = _numbers_summary(meta.get("conflict_numbers") or [], meta.get("conflict_ranges") or [])
+    return chosen, conflicts
+
+
+def fill_summaries(apps, schema_editor):
+    Payment = apps.get_model("raffle", "Payment")
+    batch = []
+    for p in Payment.objects.only("id", "metadata", "chosen_number").iterator(chunk_size=BATCH):
+        p.numbers_summary, p.conflicts_summary = numbers_summaries(p.metadata, p.chosen_number)
+        batch.append(p)
+        if len(batch) >= BATCH:
+            Payment.objects.bulk_update(batch, ["numbers_summary", "conflicts_summary"])
+            batch = []
+    if batch:
+        Payment.objects.bulk_update(batch, ["numbers_summary", "conflicts_summary"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffle', '0005_prize'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='conflicts_summary',
+            field=models.CharField(blank=True, editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='numbers_summary',
+            field=models.CharField(blank=True, editable=False, max_length=200),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', '-id'], name='payment_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['gateway', '-id'], name='payment_gateway_idx'),
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:38
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Copia congelada de raffle.search (tokens e índice) al momento de la migración
+TOKEN_MAX = 64
+BATCH = 2000
+
+_SPLIT = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return [t[:TOKEN_MAX] for t in _SPLIT.split(text) if t]
+
+
+def payment_tokens(buyer_name, buyer_email, buyer_phone, gateway_payment_id):
+    tokens = set(normalize(buyer_name))
+    tokens.update(normalize(buyer_email))
+    tokens.update(normalize(gateway_payment_id))
+    digits = "".join(ch for ch in buyer_phone or "" if ch.isdigit())
+    if digits:
+        tokens.add(digits[:TOKEN_MAX])
+        if digits.startswith("56") and len(digits) > 9:
+            tokens.add(digits[2:TOKEN_MAX + 2])
+    return tokens
+
+
+def build_index(apps, schema_editor):
+    Payment = apps.get_model("raffle", "Payment")
+    SearchToken = apps.get_model("raffle", "SearchToken")
+    fields = ("id", "buyer_name", "buyer_email", "buyer_phone", "gateway_payment_id")
+    rows = []
+    for pk, *values in Payment.objects.order_by("id").values_list(*fields).iterator(chunk_size=BATCH):
+        rows.extend(SearchToken(payment_id=pk, token=t) for t in payment_tokens(*values))
+        if len(rows) >= BATCH:
+            SearchToken.objects.bulk_create(rows)
+            rows = []
+    SearchToken.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffle', '0006_payment_admin_summaries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['number'], name='ticket_number_idx'),
+        ),
+        migrations.AddField(
+            model_name='searchtoken',
+            name='payment',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='raffle.payment'),
+        ),
+        migrations.AddIndex(
+            model_name='searchtoken',
+            index=models.Index(fields=['token', 'payment'], name='searchtoken_token_idx'),
+        ),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
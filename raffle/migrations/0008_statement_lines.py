@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffle', '0007_search_tokens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatementLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(blank=True, max_length=200)),
+                ('line_no', models.PositiveIntegerField()),
+                ('fingerprint', models.CharField(max_length=64, unique=True)),
+                ('booked_on', models.DateField()),
+                ('amount_clp', models.PositiveIntegerField()),
+                ('payer_name', models.CharField(blank=True, max_length=200)),
+                ('description', models.CharField(blank=True, max_length=300)),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('status', models.CharField(choices=[('matched', 'Confirmada automáticamente'), ('review', 'Por revisar'), ('resolved', 'Resuelta a mano'), ('ignored', 'Ignorada')], default='review', max_length=10)),
+                ('candidates', models.JSONField(blank=True, default=list)),
+                ('note', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='statement_lines', to='raffle.payment')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', '-id'], name='statementline_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffle', '0008_statement_lines'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventSequence',
+            fields=[
+                ('raffle', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='event_sequence', serialize=False, to='raffle.raffle')),
+                ('last_seq', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AvailabilityEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveBigIntegerField()),
+                ('delta', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('raffle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_events', to='raffle.raffle')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='availabilityevent_created_idx')],
+                'constraints': [models.UniqueConstraint(fields=('raffle', 'seq'), name='uniq_raffle_event_seq')],
+            },
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+
+from .caching import invalidate_active_raffle, invalidate_prizes
 
 class Raffle(models.Model):
     title = models.CharField(max_length=200)
@@ -8,6 +10,8 @@ class Raffle(models.Model):
     starts_at = models.DateTimeField(null=True, blank=True)
     ends_at = models.DateTimeField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
+    # Permite vender/reservar tramos completos (ej. 10000-10999) como una sola fila
+    allows_ranges = models.BooleanField(default=False)
 
     def __str__(self):
         return self.title
@@ -16,6 +20,43 @@ class Raffle(models.Model):
         super().save(*args, **kwargs)
         if self.is_active:
             Raffle.objects.exclude(pk=self.pk).update(is_active=False)
+        # Después del commit: antes, otro request podría volver a cachear
+        # la rifa activa vieja
+        transaction.on_commit(invalidate_active_raffle)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(invalidate_active_raffle)
+        return result
+
+
+# Largo de los resúmenes de números que muestra la lista del admin
+NUMBERS_SUMMARY_MAX = 200
+
+
+def _numbers_summary(numbers, ranges=()) -> str:
+    parts = [str(n) for n in numbers] + [f"{lo}-{hi}" for lo, hi in ranges]
+    label = ", ".join(parts)
+    if len(label) <= NUMBERS_SUMMARY_MAX:
+        return label
+    shown = label[:NUMBERS_SUMMARY_MAX - 12].rsplit(", ", 1)[0]
+    return f"{shown} … (+{len(parts) - shown.count(', ') - 1})"
+
+
+def numbers_summaries(metadata, chosen_number=None) -> tuple[str, str]:
+    """
+    (elegidos, en conflicto) como texto corto, a partir de metadata.
+    """
+    meta = metadata if isinstance(metadata, dict) else {}
+    chosen = _numbers_summary(meta.get("chosen_numbers") or [], meta.get("chosen_ranges") or [])
+    if not chosen and chosen_number:
+        chosen = str(chosen_number)
+    conflicts = _numbers_summary(meta.get("conflict_numbers") or [], meta.get("conflict_ranges") or [])
+    return chosen, conflicts
+
+
+# Campos de Payment que alimentan el índice de búsqueda (ver search.py)
+SEARCH_FIELDS = {"buyer_name", "buyer_email", "buyer_phone", "gateway_payment_id"}
 
 
 class Payment(models.Model):
@@ -39,14 +80,59 @@ class Payment(models.Model):
     paid_at = models.DateTimeField(null=True, blank=True)
     expires_at = models.DateTimeField(null=True, blank=True)
     metadata = models.JSONField(default=dict, blank=True)
+    # Resúmenes de metadata para listar sin parsear JSON por fila (ver save)
+    numbers_summary = models.CharField(max_length=NUMBERS_SUMMARY_MAX, blank=True, editable=False)
+    conflicts_summary = models.CharField(max_length=NUMBERS_SUMMARY_MAX, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Filtros del admin; -id es el orden por defecto del listado
+            models.Index(fields=["status", "-id"], name="payment_status_idx"),
+            models.Index(fields=["gateway", "-id"], name="payment_gateway_idx"),
+            # Límite de reservas por email en transfer_reserve
+            models.Index(
+                fields=["raffle", "gateway", "status", "buyer_email", "created_at"],
+                name="payment_buyer_recent_idx",
+            ),
+            # Barrido de reservas vencidas: solo transferencias pendientes
+            models.Index(
+                fields=["expires_at"],
+                condition=models.Q(gateway="transfer", status="pending"),
+                name="payment_pending_transfer_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.gateway}:{self.gateway_payment_id} ({self.status})"
 
+    def refresh_numbers_summary(self):
+        """
+        Recalcula numbers_summary/conflicts_summary. save() lo hace solo; los
+        caminos masivos (bulk_create/bulk_update) deben llamarlo a mano.
+        """
+        self.numbers_summary, self.conflicts_summary = numbers_summaries(
+            self.metadata, self.chosen_number,
+        )
+
+    def save(self, *args, **kwargs):
+        self.refresh_numbers_summary()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"metadata", "chosen_number"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "numbers_summary", "conflicts_summary"}
+        super().save(*args, **kwargs)
+        if update_fields is None or SEARCH_FIELDS & set(update_fields):
+            from .search import index_payment
+            index_payment(self)
+        # Un pago que deja de estar pendiente ya no retiene números
+        if self.status != "pending":
+            self.reservations.filter(is_active=True).update(is_active=False)
+
 
 class Ticket(models.Model):
     raffle = models.ForeignKey(Raffle, on_delete=models.CASCADE, related_name="tickets")
     number = models.PositiveIntegerField()
+    # Tickets por tramo: cubre number..number_end (None = un solo número)
+    number_end = models.PositiveIntegerField(null=True, blank=True)
     payment = models.ForeignKey(Payment, on_delete=models.PROTECT, related_name="tickets")
 
     buyer_name = models.CharField(max_length=150)
@@ -58,6 +144,181 @@ class Ticket(models.Model):
         constraints = [
             models.UniqueConstraint(fields=["raffle", "number"], name="uniq_raffle_number")
         ]
+        indexes = [
+            # Búsqueda por número en el admin sin filtrar por rifa
+            models.Index(fields=["number"], name="ticket_number_idx"),
+        ]
 
     def __str__(self):
+        if self.number_end:
+            return f"{self.raffle_id} - #{self.number}-{self.number_end}"
         return f"{self.raffle_id} - #{self.number}"
+
+
+class SearchToken(models.Model):
+    """
+    Palabra normalizada (nombre, email, teléfono, ID de pasarela) de un
+    Payment, para buscar por prefijo con el índice en vez de icontains.
+    """
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name="search_tokens")
+    token = models.CharField(max_length=64)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["token", "payment"], name="searchtoken_token_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.token} → {self.payment_id}"
+
+
+class Reservation(models.Model):
+    """
+    Reserva (hold) de un número para un Payment pendiente.
+    Solo puede haber una reserva activa por (rifa, número).
+    """
+    raffle = models.ForeignKey(Raffle, on_delete=models.CASCADE, related_name="reservations")
+    number = models.PositiveIntegerField()
+    # Reservas por tramo: cubre number..number_end (None = un solo número)
+    number_end = models.PositiveIntegerField(null=True, blank=True)
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name="reservations")
+    expires_at = models.DateTimeField()
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["raffle", "number"],
+                condition=models.Q(is_active=True),
+                name="uniq_active_reservation",
+            )
+        ]
+        indexes = [
+            # Mapa de disponibilidad: reservas activas no vencidas de la rifa
+            models.Index(
+                fields=["raffle", "expires_at"],
+                condition=models.Q(is_active=True),
+                name="reservation_active_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.raffle_id} - #{self.number} ({self.payment_id})"
+
+
+class EventSequence(models.Model):
+    """
+    Último id de evento de disponibilidad de la rifa (ver
+    availability.publish_event). Se incrementa con un UPDATE que bloquea la
+    fila hasta el commit: dos workers nunca reciben el mismo id, tenga o no
+    la cache incrementos atómicos.
+    """
+    raffle = models.OneToOneField(
+        Raffle, on_delete=models.CASCADE, primary_key=True, related_name="event_sequence",
+    )
+    last_seq = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.raffle_id}: {self.last_seq}"
+
+
+class AvailabilityEvent(models.Model):
+    """
+    Cambio de disponibilidad publicado (el mismo delta que reciben los
+    navegadores). La cache guarda los recientes; de aquí se recuperan los que
+    la cache perdió. El barrido borra los más antiguos que EVENT_RETENTION.
+    """
+    raffle = models.ForeignKey(Raffle, on_delete=models.CASCADE, related_name="availability_events")
+    seq = models.PositiveBigIntegerField()
+    delta = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["raffle", "seq"], name="uniq_raffle_event_seq")
+        ]
+        indexes = [
+            models.Index(fields=["created_at"], name="availabilityevent_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.raffle_id} - evento {self.seq}"
+
+
+class Prize(models.Model):
+    """
+    Premio de una rifa. `image` es una ruta dentro de static/ (ej.
+    img/prizes/torta.png); width/height se calculan al guardar para que la
+    página reserve el espacio de la imagen antes de cargarla.
+    """
+    raffle = models.ForeignKey(Raffle, on_delete=models.CASCADE, related_name="prizes")
+    position = models.PositiveIntegerField(default=0)
+    name = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    image = models.CharField(max_length=200, blank=True)
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    winner_ticket = models.ForeignKey(
+        Ticket, on_delete=models.SET_NULL, null=True, blank=True, related_name="prizes_won",
+    )
+
+    class Meta:
+        ordering = ["raffle", "position", "id"]
+
+    def __str__(self):
+        return f"{self.raffle_id} - {self.position}. {self.name}"
+
+    def save(self, *args, **kwargs):
+        from .prizes import image_size
+
+        self.image_width, self.image_height = image_size(self.image)
+        super().save(*args, **kwargs)
+        raffle_id = self.raffle_id
+        transaction.on_commit(lambda: invalidate_prizes(raffle_id))
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        raffle_id = self.raffle_id
+        transaction.on_commit(lambda: invalidate_prizes(raffle_id))
+        return result
+
+
+class StatementLine(models.Model):
+    """
+    Abono de una cartola bancaria importada con reconcile_transfers.
+    Las que calzan con seguridad con una transferencia pendiente se confirman
+    solas ("matched"); el resto queda en "review" con el pago sugerido (si
+    hay) para revisar en el admin.
+    """
+    STATUS_CHOICES = [
+        ("matched", "Confirmada automáticamente"),
+        ("review", "Por revisar"),
+        ("resolved", "Resuelta a mano"),
+        ("ignored", "Ignorada"),
+    ]
+    source = models.CharField(max_length=200, blank=True)
+    line_no = models.PositiveIntegerField()
+    # Identifica la línea para no procesarla dos veces al reimportar la cartola
+    fingerprint = models.CharField(max_length=64, unique=True)
+    booked_on = models.DateField()
+    amount_clp = models.PositiveIntegerField()
+    payer_name = models.CharField(max_length=200, blank=True)
+    description = models.CharField(max_length=300, blank=True)
+    reference = models.CharField(max_length=100, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="review")
+    payment = models.ForeignKey(
+        Payment, on_delete=models.SET_NULL, null=True, blank=True, related_name="statement_lines",
+    )
+    candidates = models.JSONField(default=list, blank=True)
+    note = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "-id"], name="statementline_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.booked_on} ${self.amount_clp} {self.payer_name or self.description} ({self.status})"
@@ -0,0 +1,118 @@
+"""
+Catálogo de premios: armado del listado que muestra /premios/.
+
+El listado se guarda ya renderizado en la cache (caching.get_prize_listing)
+y se reconstruye solo cuando cambia un premio: por request queda una lectura
+de cache.
+"""
+from django.contrib.staticfiles import finders
+from django.db import transaction
+
+from .images import load_manifest
+
+# Premios con que partió la rifa (los carga la migración 0005 y seed_demo)
+DEFAULT_PRIZES = [
+    ("Pase diario a Lollapalooza Chile 2026 (viernes 13 de marzo)", "img/prizes/lollapalooza.jpg",
+     "Un pase diario para vivir Lollapalooza Chile 2026 el día viernes 13 de marzo."),
+    ("$50.000 CLP", "img/prizes/50000clp.png",
+     "Premio en dinero por un valor de $50.000 CLP."),
+    ("Plancha de pelo", "img/prizes/plancha_pelo.jpg",
+     "Plancha de pelo para lucir un look increíble."),
+    ("Sesión de limpieza facial", "img/prizes/limpieza_facial.jpg",
+     "Una sesión de limpieza facial para cuidar tu piel."),
+    ("Tabla de picar (grande)", "img/prizes/tabla_picar_grande.png",
+     "Hermosa tabla de picar artesanal hecha con madera nativa."),
+    ("Tabla de picar (pequeña)", "img/prizes/tabla_picar_pequena.png",
+     "Versión pequeña de la tabla de picar artesanal, perfecta para el uso diario."),
+    ("Tabla de picoteo", "img/prizes/tabla_picoteo.png",
+     "Tabla de picoteo artesanal ideal para compartir."),
+    ("Vaporizador facial", "img/prizes/vaporizador_facial.jpg",
+     "Vaporizador facial ideal para rutinas de skincare."),
+    ("Vino Carmenere Gran Reserva", "img/prizes/vino_carmenere.png",
+     "Botella de vino Carmenere Gran Reserva."),
+    ("Vino Cabernet Sauvignon", "img/prizes/vino_cabernet.png",
+     "Botella de vino Cabernet Sauvignon para compartir."),
+    ("Torta 3 leches para 20 personas", "img/prizes/torta.png",
+     "Deliciosa torta casera para celebrar con hasta 20 personas."),
+    ("Pan de Pascua", "img/prizes/pan_pascua.jpg",
+     "Pan de pascua casero con frutos secos."),
+]
+
+
+def create_default_prizes(raffle):
+    """
+    Crea DEFAULT_PRIZES para la rifa si todavía no tiene premios.
+    """
+    from .caching import invalidate_prizes
+    from .models import Prize
+
+    if Prize.objects.filter(raffle_id=raffle.pk).exists():
+        return 0
+    prizes = []
+    for position, (name, image, description) in enumerate(DEFAULT_PRIZES, start=1):
+        width, height = image_size(image)
+        prizes.append(Prize(
+            raffle_id=raffle.pk, position=position, name=name, image=image,
+            description=description, image_width=width, image_height=height,
+        ))
+    Prize.objects.bulk_create(prizes)
+    raffle_id = raffle.pk
+    transaction.on_commit(lambda: invalidate_prizes(raffle_id))
+    return len(prizes)
+
+
+def image_size(path: str):
+    """
+    (ancho, alto) de una imagen de static/: primero desde el manifest de
+    optimize_images y si no, abriéndola con Pillow. (None, None) si no se puede.
+    """
+    if not path:
+        return None, None
+    entry = load_manifest().get(path)
+    if entry:
+        return entry["width"], entry["height"]
+
+    full = finders.find(path)
+    if not full:
+        return None, None
+    try:
+        from PIL import Image
+        with Image.open(full) as img:
+            return img.size
+    except (ImportError, OSError):
+        return None, None
+
+
+def build_listing(raffle_id: int) -> list[dict]:
+    """
+    Premios de la rifa listos para el template, con el <picture> ya renderizado.
+    """
+    from .models import Prize
+    from .templatetags.images import picture
+
+    listing = []
+    prizes = (
+        Prize.objects.filter(raffle_id=raffle_id)
+        .select_related("winner_ticket")
+        .order_by("position", "id")
+    )
+    for prize in prizes:
+        winner = prize.winner_ticket
+        listing.append({
+            "position": prize.position,
+            "name": prize.name,
+            "description": prize.description,
+            "picture": picture(
+                prize.image, alt=prize.name,
+                sizes="(min-width: 768px) 50vw, 100vw",
+                img_class="w-full h-full object-contain block",
+                picture_class="contents",
+                width=prize.image_width, height=prize.image_height,
+            ) if prize.image else "",
+            "winner_number": (
+                None if winner is None
+                else f"{winner.number}-{winner.number_end}" if winner.number_end
+                else str(winner.number)
+            ),
+        })
+    return listing
@@ -0,0 +1,310 @@
+"""
+Conciliación de cartolas bancarias con las transferencias pendientes.
+
+reconcile() lee el CSV del banco fila a fila y lo procesa por lotes:
+1. descarta abonos ya importados (StatementLine.fingerprint),
+2. busca candidatos en un índice en memoria de transferencias por
+   monto → ventana de fechas → nombre de quien paga,
+3. confirma en bloque los calces seguros con _confirm_payments_batch (el
+   mismo camino que la acción del admin) y
+4. deja el resto como StatementLine "review" para revisar en el admin.
+"""
+import csv
+import hashlib
+import io
+import itertools
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import search
+from .models import Payment, StatementLine
+from .views import _confirm_payments_batch
+
+# Días después de la reserva en que puede aparecer el abono en la cartola
+WINDOW_DAYS = 3
+# Transferencias más antiguas que esto no se consideran
+LOOKBACK_DAYS = 30
+# Fracción mínima de las palabras del nombre del comprador que debe aparecer
+# en el nombre/glosa del abono para confirmarlo solo
+MIN_NAME_SCORE = 0.5
+BATCH_SIZE = 500
+# Ids de pagos candidatos que se guardan por línea (para revisar a mano)
+MAX_CANDIDATES = 20
+
+# Palabras de las glosas (y de nombres) que no sirven para distinguir pagos
+STOPWORDS = {
+    "de", "del", "la", "las", "los", "y", "a", "desde", "para", "por",
+    "transf", "transferencia", "trf", "tef", "abono", "pago", "deposito", "otro", "banco",
+}
+
+# Nombres de columna aceptados (normalizados con search.normalize y "_")
+COLUMNS = {
+    "date": ("fecha", "fecha_operacion", "fecha_contable", "fecha_movimiento", "date"),
+    "amount": ("abono", "abonos", "monto_abono", "deposito", "depositos", "monto", "amount", "credit"),
+    "name": ("nombre", "nombre_origen", "titular", "remitente", "ordenante", "name"),
+    "description": ("glosa", "descripcion", "detalle", "concepto", "description"),
+    "reference": ("referencia", "n_operacion", "numero_operacion", "operacion", "documento", "reference"),
+}
+# Filas iniciales donde buscar el encabezado (las cartolas traen datos de la cuenta antes)
+HEADER_SEARCH_ROWS = 30
+
+_DELIMITERS = ";,\t|"
+_DATE_FORMATS = ("%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d", "%d/%m/%y", "%d.%m.%Y")
+
+
+def parse_amount(text: str) -> int | None:
+    """
+    "$12.000" / "12.000,00" / "12000.00" → 12000. None si está vacío.
+    """
+    text = (text or "").strip().replace("$", "").replace(" ", "").replace("\xa0", "")
+    if not text:
+        return None
+    negative = text.startswith("-") or (text.startswith("(") and text.endswith(")"))
+    text = text.strip("-+()")
+    if "," in text:
+        whole, _, decimals = text.rpartition(",")
+        if len(decimals) == 3 and "." not in text:
+            whole = text  # 12,000: coma de miles
+        text = whole.replace(".", "").replace(",", "")
+    else:
+        parts = text.split(".")
+        text = parts[0] if len(parts) == 2 and len(parts[1]) != 3 else "".join(parts)
+    if not text.isdigit():
+        raise ValueError("monto inválido")
+    return -int(text) if negative else int(text)
+
+
+def parse_date(text: str) -> date:
+    value = (text or "").strip().split(" ")[0].split("T")[0]
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError("fecha inválida")
+
+
+def _words(text: str) -> set[str]:
+    return set(search.normalize(text)) - STOPWORDS
+
+
+def _header_key(text: str) -> str:
+    return "_".join(search.normalize(text))
+
+
+def _find_columns(header: list[str]) -> dict | None:
+    keys = [_header_key(h) for h in header]
+    columns = {}
+    for field, aliases in COLUMNS.items():
+        for alias in aliases:
+            if alias in keys:
+                columns[field] = keys.index(alias)
+                break
+    if "date" in columns and "amount" in columns:
+        return columns
+    return None
+
+
+def read_statement(stream, on_error=None):
+    """
+    Genera un dict por abono (monto > 0) del CSV: line_no, booked_on,
+    amount_clp, payer_name, description, reference. Detecta el separador y
+    salta las filas previas al encabezado. `on_error(line_no, mensaje)`
+    recibe las filas que no se pudieron leer.
+    """
+    sample = stream.read(8192)
+    sample += stream.readline()  # completar la última línea de la muestra
+    try:
+        delimiter = csv.Sniffer().sniff(sample, delimiters=_DELIMITERS).delimiter
+    except csv.Error:
+        # Las filas previas al encabezado suelen confundir al Sniffer
+        delimiter = max(_DELIMITERS, key=sample.count)
+    reader = csv.reader(itertools.chain(io.StringIO(sample), stream), delimiter=delimiter)
+
+    columns = None
+    for row in reader:
+        columns = _find_columns(row)
+        if columns or reader.line_num >= HEADER_SEARCH_ROWS:
+            break
+    if not columns:
+        raise ValueError("No se encontró el encabezado (se necesitan columnas de fecha y monto)")
+
+    def cell(row, field, limit):
+        i = columns.get(field)
+        return row[i].strip()[:limit] if i is not None and i < len(row) else ""
+
+    for row in reader:
+        if not any(c.strip() for c in row):
+            continue
+        try:
+            amount = parse_amount(cell(row, "amount", 50))
+            if amount is None or amount <= 0:
+                continue  # cargos o filas de totales
+            booked_on = parse_date(cell(row, "date", 50))
+        except ValueError as e:
+            if on_error:
+                on_error(reader.line_num, f"{e}: {row!r}")
+            continue
+        yield {
+            "line_no": reader.line_num,
+            "booked_on": booked_on,
+            "amount_clp": amount,
+            "payer_name": cell(row, "name", 200),
+            "description": cell(row, "description", 300),
+            "reference": cell(row, "reference", 100),
+        }
+
+
+def build_index(since=None) -> dict[tuple[int, date], dict]:
+    """
+    Transferencias pendientes o expiradas desde `since`, agrupadas por
+    (monto, día de la reserva). Cada grupo tiene la lista de pagos y un
+    índice palabra del nombre → pagos.
+    """
+    if since is None:
+        since = timezone.now() - timedelta(days=LOOKBACK_DAYS)
+    index = {}
+    rows = (
+        Payment.objects.filter(gateway="transfer", status__in=("pending", "expired"), created_at__gte=since)
+        .order_by("created_at", "id")
+        .values_list("id", "amount_clp", "created_at", "buyer_name", "status")
+    )
+    for pk, amount, created_at, name, status in rows.iterator(chunk_size=2000):
+        group = index.setdefault(
+            (amount, timezone.localdate(created_at)),
+            {"payments": [], "by_token": defaultdict(list)},
+        )
+        payment = {"id": pk, "tokens": _words(name), "status": status, "taken": False}
+        group["payments"].append(payment)
+        for token in payment["tokens"]:
+            group["by_token"][token].append(payment)
+    return index
+
+
+def match_line(line: dict, index: dict, window_days: int = WINDOW_DAYS) -> dict:
+    """
+    Decide qué hacer con un abono. Devuelve status ("matched" o "review"),
+    payment_id (confirmado o sugerido), candidates y note.
+    """
+    # El abono llega entre el día de la reserva (o el anterior, por zona
+    # horaria) y window_days después
+    booked_on = line["booked_on"]
+    groups = [
+        group
+        for offset in range(-1, window_days + 1)
+        if (group := index.get((line["amount_clp"], booked_on - timedelta(days=offset))))
+    ]
+    result = {"status": "review", "payment_id": None, "candidates": [], "note": ""}
+
+    # Solo se puntúan los pagos que comparten alguna palabra con el abono
+    words = _words(f"{line['payer_name']} {line['description']}")
+    named = {
+        p["id"]: p
+        for group in groups
+        for word in words
+        for p in group["by_token"].get(word, ())
+        if not p["taken"]
+    }
+    if named:
+        scored = sorted(
+            ((len(p["tokens"] & words) / len(p["tokens"]), p) for p in named.values()),
+            key=lambda sp: -sp[0],
+        )
+    else:
+        scored = [
+            (0.0, p)
+            for p in itertools.islice(
+                (p for group in groups for p in group["payments"] if not p["taken"]), 2,
+            )
+        ]
+    result["candidates"] = [p["id"] for _, p in scored[:MAX_CANDIDATES]]
+    if not scored:
+        result["note"] = "Sin transferencia pendiente por ese monto y fecha"
+        return result
+
+    best_score, best = scored[0]
+    if len(scored) > 1 and scored[1][0] == best_score:
+        result["note"] = "Varios pagos posibles con el mismo monto"
+        return result
+
+    result["payment_id"] = best["id"]
+    if best_score < MIN_NAME_SCORE:
+        result["note"] = "El nombre no coincide con el del pago sugerido"
+    elif best["status"] != "pending":
+        result["note"] = "La reserva del pago sugerido ya expiró"
+    else:
+        result["status"] = "matched"
+        best["taken"] = True
+    return result
+
+
+def _fingerprint(line: dict, occurrence: int) -> str:
+    key = "|".join([
+        line["booked_on"].isoformat(), str(line["amount_clp"]),
+        " ".join(search.normalize(line["payer_name"])),
+        " ".join(search.normalize(line["description"])),
+        line["reference"], str(occurrence),
+    ])
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def reconcile(stream, source: str = "", since=None, window_days: int = WINDOW_DAYS,
+              batch_size: int = BATCH_SIZE, dry_run: bool = False, on_error=None, progress=None) -> dict:
+    """
+    Importa y concilia una cartola (stream de texto). Cada lote va en una
+    transacción: se guardan sus StatementLine y se confirman sus calces.
+    Con dry_run no escribe nada. `progress(resumen)` se llama por lote.
+    """
+    index = build_index(since)
+    seen = Counter()
+    summary = {"lines": 0, "duplicates": 0, "matched": 0, "review": 0, "tickets": 0, "conflicts": 0}
+
+    rows = read_statement(stream, on_error=on_error)
+    while batch := list(itertools.islice(rows, batch_size)):
+        for line in batch:
+            base = (line["booked_on"], line["amount_clp"], line["payer_name"], line["description"], line["reference"])
+            seen[base] += 1
+            line["fingerprint"] = _fingerprint(line, seen[base])
+        known = set(
+            StatementLine.objects.filter(fingerprint__in=[l["fingerprint"] for l in batch])
+            .values_list("fingerprint", flat=True)
+        )
+        summary["lines"] += len(batch)
+        summary["duplicates"] += len(known)
+
+        lines = []
+        for line in batch:
+            if line["fingerprint"] in known:
+                continue
+            result = match_line(line, index, window_days)
+            summary[result["status"]] += 1
+            lines.append(StatementLine(source=source[:200], **line, **result))
+
+        if not dry_run and lines:
+            _save_batch(lines, summary)
+        if progress:
+            progress(summary)
+    return summary
+
+
+def _save_batch(lines: list[StatementLine], summary: dict):
+    with transaction.atomic():
+        StatementLine.objects.bulk_create(lines)
+        matched = {l.payment_id: l for l in lines if l.status == "matched"}
+        if not matched:
+            return
+        results = _confirm_payments_batch(list(matched))["results"]
+        conflicted = []
+        for r in results:
+            summary["tickets"] += len(r["paid_numbers"]) + len(r["paid_ranges"])
+            if r["conflict_numbers"] or r["conflict_ranges"]:
+                line = matched[r["payment_id"]]
+                line.status = "review"
+                line.note = "Confirmado, pero con números ya vendidos: avisar a quien compró"
+                conflicted.append(line)
+        if conflicted:
+            StatementLine.objects.bulk_update(conflicted, ["status", "note"])
+            summary["conflicts"] += len(conflicted)
@@ -0,0 +1,159 @@
+"""
+Búsqueda de compradores y pagos por tokens indexados.
+
+Cada Payment guarda en SearchToken las palabras normalizadas de su nombre,
+email, teléfono e ID de pasarela (minúsculas, sin tildes, solo [a-z0-9]).
+Buscar "perez gmail" exige que el pago tenga un token que empiece con "perez"
+y otro que empiece con "gmail". Cada término es un rango sobre el índice de
+token (token >= t AND token < siguiente(t)), así que funciona igual en
+Postgres y SQLite sin recorrer la tabla: con solo [a-z0-9] el orden es el
+mismo con collation binaria o de idioma.
+"""
+import re
+import unicodedata
+
+from django.db import transaction
+from django.db.models import Q
+
+TOKEN_MAX = 64
+MAX_TERMS = 8
+
+_ALNUM = "0123456789abcdefghijklmnopqrstuvwxyz"
+_SPLIT = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text: str) -> list[str]:
+    """
+    "José Pérez-Soto" → ["jose", "perez", "soto"]
+    """
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return [t[:TOKEN_MAX] for t in _SPLIT.split(text) if t]
+
+
+def payment_tokens(buyer_name, buyer_email, buyer_phone, gateway_payment_id) -> set[str]:
+    tokens = set(normalize(buyer_name))
+    tokens.update(normalize(buyer_email))
+    tokens.update(normalize(gateway_payment_id))
+    digits = "".join(ch for ch in buyer_phone or "" if ch.isdigit())
+    if digits:
+        tokens.add(digits[:TOKEN_MAX])
+        # +56 9 1234 5678 también se encuentra como 912345678
+        if digits.startswith("56") and len(digits) > 9:
+            tokens.add(digits[2:TOKEN_MAX + 2])
+    return tokens
+
+
+def _prefix_upper(term: str) -> str | None:
+    """
+    Menor string mayor que todos los que empiezan con `term` (None si no hay).
+    """
+    chars = list(term)
+    while chars:
+        i = _ALNUM.index(chars[-1])
+        if i + 1 < len(_ALNUM):
+            chars[-1] = _ALNUM[i + 1]
+            return "".join(chars)
+        chars.pop()
+    return None
+
+
+def index_payments(payments):
+    """
+    Reescribe los tokens de los pagos (ya guardados) dados.
+    """
+    from .models import SearchToken
+
+    payments = [p for p in payments if p.pk]
+    if not payments:
+        return
+    with transaction.atomic():
+        SearchToken.objects.filter(payment_id__in=[p.pk for p in payments]).delete()
+        SearchToken.objects.bulk_create(
+            [
+                SearchToken(payment_id=p.pk, token=token)
+                for p in payments
+                for token in payment_tokens(
+                    p.buyer_name, p.buyer_email, p.buyer_phone, p.gateway_payment_id,
+                )
+            ],
+            batch_size=2000,
+        )
+
+
+def index_payment(payment):
+    """
+    Sincroniza los tokens de un pago; no escribe si no cambiaron.
+    """
+    from .models import SearchToken
+
+    wanted = payment_tokens(
+        payment.buyer_name, payment.buyer_email, payment.buyer_phone, payment.gateway_payment_id,
+    )
+    current = set(SearchToken.objects.filter(payment_id=payment.pk).values_list("token", flat=True))
+    if wanted != current:
+        index_payments([payment])
+
+
+def rebuild(batch: int = 2000) -> int:
+    """
+    Reconstruye todo el índice por lotes; devuelve la cantidad de pagos.
+    """
+    from .models import Payment, SearchToken
+
+    SearchToken.objects.all().delete()
+    fields = ("id", "buyer_name", "buyer_email", "buyer_phone", "gateway_payment_id")
+    total = 0
+    rows = []
+    for pk, *values in Payment.objects.order_by("id").values_list(*fields).iterator(chunk_size=batch):
+        rows.extend(SearchToken(payment_id=pk, token=t) for t in payment_tokens(*values))
+        total += 1
+        if len(rows) >= batch:
+            SearchToken.objects.bulk_create(rows)
+            rows = []
+    SearchToken.objects.bulk_create(rows)
+    return total
+
+
+def matching_payment_ids(query: str):
+    """
+    Subconsulta con los ids de Payment que calzan con todos los términos.
+    Un término numérico también calza con el id del pago. None si la
+    búsqueda no tiene términos.
+    """
+    from .models import Payment, SearchToken
+
+    terms = list(dict.fromkeys(normalize(query)))[:MAX_TERMS]
+    if not terms:
+        return None
+
+    ids = Payment.objects.all()
+    for term in terms:
+        in_range = Q(token__gte=term)
+        upper = _prefix_upper(term)
+        if upper is not None:
+            in_range &= Q(token__lt=upper)
+        match = Q(id__in=SearchToken.objects.filter(in_range).values("payment_id"))
+        if term.isdigit() and len(term) <= 18:
+            match |= Q(id=int(term))
+        ids = ids.filter(match)
+    return ids.values("id")
+
+
+def filter_payments(queryset, query: str):
+    ids = matching_payment_ids(query)
+    return queryset if ids is None else queryset.filter(id__in=ids)
+
+
+def filter_tickets(queryset, query: str):
+    """
+    Tickets cuyo pago calza con la búsqueda o, si es un número, ese número.
+    """
+    ids = matching_payment_ids(query)
+    if ids is None:
+        return queryset
+    match = Q(payment_id__in=ids)
+    query = query.strip()
+    if query.isdigit() and len(query) <= 18:
+        match |= Q(number=int(query))
+    return queryset.filter(match)
@@ -11,6 +11,20 @@
 
   const priceEl = document.getElementById("raffle-config");
   const PRICE = Number(priceEl?.dataset.price || "0");
+  // "server": páginas HTMX; "client": una descarga de disponibilidad y
+  // paginación local (ver availability_api)
+  const GRID_MODE = priceEl?.dataset.gridMode || "server";
+  const AVAILABILITY_URL = priceEl?.dataset.availabilityUrl || "";
+  const STREAM_URL = priceEl?.dataset.streamUrl || "";
+  const CHECK_BATCH_URL = priceEl?.dataset.checkBatchUrl || "";
+  const GRID_URL = priceEl?.dataset.gridUrl || "";
+  const GRID_OVERVIEW_URL = priceEl?.dataset.gridOverviewUrl || "";
+
+  // Mismas clases que raffle/_grid.html
+  const TAKEN_BTN_CLASS =
+    "px-2 py-1 text-xs bg-gray-300 text-gray-500 border border-gray-400 rounded cursor-not-allowed opacity-70";
+  const FREE_BTN_CLASS =
+    "px-2 py-1 text-xs bg-white border rounded text-gray-800 number-btn";
 
   const grid = document.getElementById("numbers-grid");
 
@@ -46,18 +60,90 @@
     return Array.from(buttons).some((btn) => !btn.disabled);
   }
 
+  // true mientras se espera la respuesta de grid_page?seek=1
+  let seeking = false;
+
+  // Libres por página según grid_overview (modo servidor); null si no se cargó
+  let overview = null;
+
+  // Próxima página con números libres después de `current`: undefined si
+  // no hay resumen, null si ninguna tiene
+  function nextPageWithFree(current) {
+    if (!overview) return undefined;
+    for (let page = current + 1; page <= overview.free.length; page++) {
+      if (overview.free[page - 1] > 0) return page;
+    }
+    return null;
+  }
+
+  // Completa el paginador con cuántas páginas tienen números libres
+  function decoratePager(root) {
+    const label = root?.querySelector("[data-grid-free-pages]");
+    if (!label || !overview) return;
+    const pages = overview.free.filter((n) => n > 0).length;
+    label.textContent =
+      pages === 1 ? "1 página con números libres" : `${pages} páginas con números libres`;
+  }
+
+  async function loadOverview() {
+    if (!GRID_OVERVIEW_URL) return;
+    try {
+      // Cache-Control: no-cache + ETag: el navegador revalida con 304
+      const resp = await fetch(GRID_OVERVIEW_URL, { headers: { Accept: "application/json" } });
+      if (!resp.ok) return;
+      overview = await resp.json();
+    } catch (e) {
+      return;
+    }
+    decoratePager(document.getElementById("numbers-grid"));
+  }
+
+  // Los cambios en vivo llegan en ráfagas: un solo refresco del resumen por ráfaga
+  let overviewTimer = null;
+  function scheduleOverview() {
+    if (GRID_MODE === "client" || overviewTimer) return;
+    overviewTimer = setTimeout(() => {
+      overviewTimer = null;
+      loadOverview();
+    }, 1000);
+  }
+
   function autoSkipSoldOut(root) {
     if (!root) return;
 
+    // Si veníamos de un seek y la página sigue llena, no hay más libres
+    if (seeking) {
+      seeking = false;
+      return;
+    }
+
     const hasFree = pageHasFreeNumbers(root);
     if (hasFree) return; // ya hay números disponibles en esta página
 
-    // No hay números disponibles → buscamos el botón "Siguiente"
     const nextBtn = document.querySelector("[data-grid-next]");
-    if (nextBtn && !nextBtn.disabled) {
-      // Esto hará que HTMX cargue la siguiente página
-      nextBtn.click();
+    if (!nextBtn || nextBtn.disabled) return;
+
+    // Modo servidor: una sola petición a la próxima página con libres según
+    // el resumen, o que la busque el servidor (grid_page?seek=1) si no hay
+    // resumen, en vez de avanzar de a una
+    const pager = root.querySelector("[data-grid-pager]");
+    const current = Number(pager?.dataset.currentPage || "0");
+    if (current && window.htmx && GRID_URL) {
+      const target = nextPageWithFree(current);
+      if (target === null) return; // ninguna página siguiente tiene libres
+      seeking = true;
+      const url = target
+        ? `${GRID_URL}?page=${target}`
+        : `${GRID_URL}?page=${current + 1}&seek=1`;
+      window.htmx.ajax("GET", url, {
+        target: "#numbers-grid",
+        swap: "innerHTML",
+      });
+      return;
     }
+
+    // Modo cliente (o sin htmx): avanzar a la página siguiente
+    nextBtn.click();
   }
 
   // Si no estamos en la página de la rifa (no hay grilla ni resumen), salimos
@@ -163,6 +249,7 @@
       }
     });
 
+    decoratePager(gridEl);
     // Después de cargar una nueva página de números, saltar si está llena
     autoSkipSoldOut(gridEl);
   }
@@ -178,6 +265,35 @@
     handleGridUpdate(e.target);
   });
 
+  // Si falla la petición de seek no llega ningún swap: soltar la bandera
+  // para que la próxima página llena vuelva a saltar
+  ["htmx:responseError", "htmx:sendError", "htmx:timeout"].forEach((name) => {
+    document.body.addEventListener(name, () => {
+      seeking = false;
+    });
+  });
+
+  /**
+   * Valida la selección completa antes de reservar (una sola consulta).
+   * Devuelve la lista de números que ya no están libres; si la validación
+   * no se puede hacer, devuelve [] y el backend decide (409).
+   */
+  async function findUnavailable(numbers) {
+    if (!CHECK_BATCH_URL || !numbers.length) return [];
+    try {
+      const resp = await fetch(
+        `${CHECK_BATCH_URL}?numbers=${encodeURIComponent(numbers.join(","))}`,
+        { headers: { Accept: "application/json" } },
+      );
+      if (!resp.ok) return [];
+      const data = await resp.json();
+      if (data.all_free) return [];
+      return numbers.filter((n) => data.numbers?.[String(n)]?.status !== "free");
+    } catch (e) {
+      return [];
+    }
+  }
+
   async function reserveByTransfer() {
     if (!window.selected || !(window.selected instanceof Set)) {
       alert("Error interno: selección no disponible.");
@@ -209,6 +325,21 @@
     }
     showLoader();
 
+    // Pre-validar la selección para evitar el 409 y el reintento
+    const unavailable = await findUnavailable(numbers);
+    if (unavailable.length) {
+      unavailable.forEach((n) => setNumberTaken(n, true));
+      const msg =
+        `Estos números ya no están disponibles: ${unavailable.join(", ")}. ` +
+        `Los quitamos de tu selección; revisa y vuelve a reservar.`;
+      if (transferMsg) transferMsg.textContent = msg;
+      // Si la selección quedó vacía la sección de transferencia se oculta
+      if (!selected.size) alert(msg);
+      hideLoader();
+      if (transferBtn) transferBtn.disabled = false;
+      return;
+    }
+
     let resp;
     let data = null;
 
@@ -280,8 +411,162 @@
 
   transferBtn?.addEventListener("click", reserveByTransfer);
 
+  // ===== Modo cliente: grilla paginada en el navegador =====
+
+  const clientGrid = {
+    total: 0,
+    pageSize: 100,
+    taken: null, // Uint8Array, índice n-1 → 1 si está tomado
+    page: 1,
+  };
+
+  function decodeTakenBitmap(b64, total) {
+    const bin = atob(b64 || "");
+    const taken = new Uint8Array(total);
+    for (let i = 0; i < total; i++) {
+      const byte = bin.charCodeAt(i >> 3) || 0;
+      taken[i] = (byte >> (7 - (i & 7))) & 1;
+    }
+    return taken;
+  }
+
+  function clientPageCount() {
+    return Math.max(1, Math.ceil(clientGrid.total / clientGrid.pageSize));
+  }
+
+  function renderClientPage(page) {
+    const pageCount = clientPageCount();
+    page = Math.min(Math.max(1, page), pageCount);
+    clientGrid.page = page;
+
+    const start = (page - 1) * clientGrid.pageSize + 1;
+    const end = Math.min(start + clientGrid.pageSize - 1, clientGrid.total);
+
+    const cells = [];
+    for (let n = start; n <= end; n++) {
+      if (clientGrid.taken[n - 1]) {
+        cells.push(
+          `<button disabled class="${TAKEN_BTN_CLASS}" data-number="${n}">${n}</button>`,
+        );
+      } else {
+        cells.push(
+          `<button class="${FREE_BTN_CLASS}" data-number="${n}">${n}</button>`,
+        );
+      }
+    }
+
+    const prevOff = page <= 1;
+    const nextOff = page >= pageCount;
+    grid.innerHTML =
+      `<div class="gap-2 grid" style="grid-template-columns: repeat(10, minmax(0,1fr));">${cells.join("")}</div>` +
+      `<div class="flex justify-center items-center gap-4 mt-3">` +
+      `<button type="button" class="px-3 py-1 border rounded ${prevOff ? "opacity-50 cursor-not-allowed" : ""}" data-grid-page="${page - 1}" ${prevOff ? "disabled" : ""} aria-label="Anterior">◀︎</button>` +
+      `<span class="text-sm">${page} / ${pageCount}</span>` +
+      `<button type="button" class="px-3 py-1 border rounded ${nextOff ? "opacity-50 cursor-not-allowed" : ""}" data-grid-page="${page + 1}" ${nextOff ? "disabled" : ""} data-grid-next aria-label="Siguiente">▶︎</button>` +
+      `</div>`;
+
+    handleGridUpdate(grid);
+  }
+
+  async function loadAvailability() {
+    let data;
+    try {
+      const resp = await fetch(AVAILABILITY_URL, { headers: { Accept: "application/json" } });
+      if (!resp.ok) return false;
+      data = await resp.json();
+    } catch (e) {
+      console.error("[detail_page] No se pudo cargar la disponibilidad:", e);
+      return false;
+    }
+    clientGrid.total = data.total;
+    clientGrid.pageSize = data.page_size || clientGrid.pageSize;
+    clientGrid.taken = decodeTakenBitmap(data.taken, data.total);
+    renderClientPage(clientGrid.page);
+    return true;
+  }
+
+  if (GRID_MODE === "client" && AVAILABILITY_URL) {
+    grid.addEventListener("click", (ev) => {
+      const pager = ev.target.closest("[data-grid-page]");
+      if (!pager || pager.disabled) return;
+      renderClientPage(Number(pager.dataset.gridPage));
+    });
+    document.body.addEventListener("refreshGrid", () => {
+      loadAvailability();
+    });
+  }
+
+  // ===== Cambios en vivo (Server-Sent Events) =====
+
+  function setNumberTaken(n, taken) {
+    if (clientGrid.taken && n >= 1 && n <= clientGrid.total) {
+      clientGrid.taken[n - 1] = taken ? 1 : 0;
+    }
+
+    if (taken && selected.has(n)) {
+      // Otra persona se quedó con un número que teníamos seleccionado
+      selected.delete(n);
+      refreshSummary();
+      if (transferMsg) {
+        transferMsg.textContent = `El número ${n} acaba de ser tomado por otra persona.`;
+      }
+    }
+
+    const btn = grid.querySelector(`[data-number="${n}"]`);
+    if (!btn) return;
+    btn.disabled = taken;
+    btn.className = taken ? TAKEN_BTN_CLASS : FREE_BTN_CLASS;
+  }
+
+  // Tramo completo (tickets/reservas por rango): sin recorrer número a número
+  function setRangeTaken(lo, hi, taken) {
+    if (clientGrid.taken) {
+      clientGrid.taken.fill(taken ? 1 : 0, Math.max(lo, 1) - 1, Math.min(hi, clientGrid.total));
+    }
+    Array.from(selected)
+      .filter((n) => taken && n >= lo && n <= hi)
+      .forEach((n) => setNumberTaken(n, true));
+
+    grid.querySelectorAll("[data-number]").forEach((btn) => {
+      const n = Number(btn.dataset.number);
+      if (n < lo || n > hi) return;
+      btn.disabled = taken;
+      btn.className = taken ? TAKEN_BTN_CLASS : FREE_BTN_CLASS;
+    });
+  }
+
+  function connectAvailabilityStream() {
+    if (!STREAM_URL || !window.EventSource) return;
+
+    const source = new EventSource(STREAM_URL);
+    source.addEventListener("delta", (ev) => {
+      let delta;
+      try {
+        delta = JSON.parse(ev.data);
+      } catch (e) {
+        return;
+      }
+      (delta.taken || []).forEach((n) => setNumberTaken(n, true));
+      (delta.released || []).forEach((n) => setNumberTaken(n, false));
+      (delta.taken_ranges || []).forEach(([lo, hi]) => setRangeTaken(lo, hi, true));
+      (delta.released_ranges || []).forEach(([lo, hi]) => setRangeTaken(lo, hi, false));
+      scheduleOverview();
+    });
+    source.addEventListener("resync", () => {
+      document.body.dispatchEvent(new Event("refreshGrid"));
+    });
+  }
+
   // Init
   refreshSummary();
-  // Si la primera página está completamente vendida, saltar automáticamente
-  autoSkipSoldOut(grid);
+  connectAvailabilityStream();
+  if (GRID_MODE === "client" && AVAILABILITY_URL) {
+    // Si falla la descarga queda la primera página renderizada por el servidor
+    loadAvailability();
+  } else {
+    document.body.addEventListener("refreshGrid", scheduleOverview);
+    loadOverview();
+    // Si la primera página está completamente vendida, saltar automáticamente
+    autoSkipSoldOut(grid);
+  }
 })();
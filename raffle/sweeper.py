@@ -0,0 +1,126 @@
+"""
+Barrido de reservas por transferencia vencidas.
+
+Marca como 'expired' los Payments pendientes cuyo plazo ya pasó, desactiva sus
+reservas y libera los números en el mapa de disponibilidad. Se puede correr
+como comando (`manage.py expire_reservations`, desde cron o con --loop) o en
+un hilo dentro del servidor web (RAFFLE_SWEEP_INTERVAL; lo arrancan
+rifasite/asgi.py y wsgi.py, nunca los comandos de manage.py).
+"""
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from . import availability
+from .models import Payment, Reservation
+
+logger = logging.getLogger(__name__)
+
+SWEEP_BATCH_SIZE = 500
+
+_STATS_KEY = "raffle:sweeper:stats"
+_LOCK_KEY = "raffle:sweeper:lock"
+
+
+def _sweep_batch(now, batch_size: int) -> int:
+    with transaction.atomic():
+        ids = list(
+            Payment.objects.select_for_update(skip_locked=True)
+            .filter(gateway="transfer", status="pending", expires_at__lte=now)
+            .order_by("expires_at")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+
+        released = defaultdict(list)
+        released_ranges = defaultdict(list)
+        holds = Reservation.objects.filter(payment_id__in=ids, is_active=True)
+        for raffle_id, n, end in holds.values_list("raffle_id", "number", "number_end"):
+            if end is None:
+                released[raffle_id].append(n)
+            else:
+                released_ranges[raffle_id].append((n, end))
+
+        Payment.objects.filter(id__in=ids).update(status="expired")
+        holds.update(is_active=False)
+
+        def release():
+            for raffle_id, numbers in released.items():
+                availability.mark_numbers(raffle_id, numbers, availability.FREE)
+            for raffle_id, ranges in released_ranges.items():
+                availability.mark_ranges(raffle_id, ranges, availability.FREE)
+
+        transaction.on_commit(release)
+    return len(ids)
+
+
+def sweep_expired_reservations(batch_size: int = SWEEP_BATCH_SIZE) -> int:
+    """
+    Expira en lotes de `batch_size` todas las reservas vencidas.
+    Devuelve cuántos Payments se marcaron como 'expired'.
+    """
+    now = timezone.now()
+    swept = 0
+    while True:
+        count = _sweep_batch(now, batch_size)
+        swept += count
+        if count < batch_size:
+            break
+
+    stats = cache.get(_STATS_KEY) or {"runs": 0, "swept_total": 0}
+    stats["runs"] += 1
+    stats["swept_total"] += swept
+    stats["last_run_at"] = now.isoformat()
+    stats["last_swept"] = swept
+    cache.set(_STATS_KEY, stats, None)
+
+    if swept:
+        logger.info("Reservas vencidas expiradas: %s", swept)
+    # De paso, los eventos de disponibilidad viejos (ver availability.EVENT_RETENTION)
+    availability.prune_events(now)
+    return swept
+
+
+def get_sweeper_stats() -> dict:
+    """
+    runs, swept_total, last_run_at y last_swept del barrido (los exporta /metrics).
+    """
+    return cache.get(_STATS_KEY) or {}
+
+
+_thread = None
+
+
+def start_background_sweeper(interval: int | None = None):
+    """
+    Corre el barrido cada `interval` segundos (RAFFLE_SWEEP_INTERVAL por
+    defecto) en un hilo daemon del proceso. Con varios workers cada uno tiene
+    su hilo, pero en cada intervalo barre solo el que toma el candado en la
+    cache; igual, cada lote salta las filas bloqueadas.
+    """
+    global _thread
+    if interval is None:
+        interval = getattr(settings, "RAFFLE_SWEEP_INTERVAL", 0)
+    if _thread is not None or interval <= 0:
+        return
+
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            if not cache.add(_LOCK_KEY, os.getpid(), max(interval - 1, 1)):
+                continue
+            try:
+                sweep_expired_reservations()
+            except Exception:
+                logger.exception("Falló el barrido de reservas vencidas")
+
+    _thread = threading.Thread(target=loop, name="reservation-sweeper", daemon=True)
+    _thread.start()
@@ -0,0 +1,47 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from raffle.images import load_manifest
+
+register = template.Library()
+
+_MIME = {"avif": "image/avif", "webp": "image/webp"}
+
+
+@register.simple_tag
+def picture(path, alt="", sizes="100vw", img_class="", picture_class="", loading="lazy",
+            priority=False, width=None, height=None):
+    """
+    <picture> con las variantes de optimize_images (AVIF/WebP por ancho) y la
+    imagen original como respaldo. Sin variantes generadas, solo el <img>
+    (con width/height si se pasan, ej. los precalculados de Prize).
+    Uso: {% picture "img/prizes/torta.png" alt="Torta" sizes="(min-width: 768px) 50vw, 100vw" %}
+    """
+    entry = load_manifest().get(path)
+    if entry:
+        width, height = entry["width"], entry["height"]
+    size_attrs = ""
+    if width and height:
+        size_attrs = format_html(' width="{}" height="{}"', width, height)
+
+    img = format_html(
+        '<img src="{}" alt="{}" class="{}" loading="{}" decoding="async"{}{}>',
+        static(path), alt, img_class,
+        "eager" if priority else loading,
+        format_html(' fetchpriority="high"') if priority else "",
+        size_attrs,
+    )
+    if not entry:
+        return img
+
+    sources = format_html_join(
+        "",
+        '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (_MIME[fmt], ", ".join(f"{static(p)} {w}w" for w, p in variants), sizes)
+            for fmt, variants in entry["variants"].items()
+            if fmt in _MIME and variants
+        ),
+    )
+    return format_html('<picture class="{}">{}{}</picture>', picture_class, sources, img)
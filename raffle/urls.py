@@ -4,13 +4,21 @@ from . import views
 urlpatterns = [
     path("", views.raffle_detail, name="raffle_detail"),
     path("api/check/", views.check_number, name="check_number"),
+    path("api/check/batch/", views.check_numbers_batch, name="check_numbers_batch"),
     path("api/grid/", views.grid_page, name="grid_page"),
+    path("api/grid/overview/", views.grid_overview, name="grid_overview"),
+    path("api/availability/", views.availability_api, name="availability_api"),
+    path("api/availability/stream/", views.availability_stream, name="availability_stream"),
 
     # Export CSV (solo staff)
     path("export/raffle/<int:raffle_id>/tickets.csv", views.export_tickets_csv, name="export_tickets_csv"),
     path("export/raffle/<int:raffle_id>/payments.csv", views.export_payments_csv, name="export_payments_csv"),
 
+    # Métricas Prometheus (staff o token)
+    path("metrics", views.metrics_view, name="metrics"),
+
     path("transfer/reserve/", views.transfer_reserve, name="transfer_reserve"),
+    path("transfer/lucky/", views.transfer_lucky, name="transfer_lucky"),
     path("donar/", views.donation_page, name="donation_page"),
     path("premios/", views.prizes_page, name="prizes_page"),
     path("pago-exitoso/", views.payment_success, name="payment_success"),
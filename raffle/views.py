@@ -1,65 +1,49 @@
-import json, csv
+import asyncio, json, csv, zlib
+from collections import defaultdict
 from datetime import timedelta
 from uuid import uuid4
 
 from math import ceil
 from django.shortcuts import render
-from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest
+from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.views.decorators.http import require_GET, require_POST
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django_ratelimit.decorators import ratelimit
 from django.db import transaction
+from django.db.models import DateTimeField, Q, Value
 from django.utils import timezone
 from django.urls import reverse
 from django.template.loader import render_to_string
 from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date
 
-from .models import Raffle, Ticket, Payment
+from .models import Raffle, Ticket, Payment, Reservation
+from . import availability, caching, intervals, metrics
 
 
 # ========= Utilidades comunes =========
 
 def _get_active_raffle():
-    return Raffle.objects.filter(is_active=True).order_by("id").first()
+    return caching.get_active_raffle()
 
-def _get_taken_numbers_for_raffle(raffle: Raffle) -> set[int]:
-    """
-    Devuelve un set con todos los números que deben aparecer como 'tomados':
-    - Tickets ya emitidos (pagos confirmados).
-    - Reservas por transferencia pendientes y no vencidas.
-    """
-    taken = set(
-        Ticket.objects.filter(raffle=raffle).values_list("number", flat=True)
-    )
-
-    now = timezone.now()
-    pending_transfers = Payment.objects.filter(
-        raffle=raffle,
-        gateway="transfer",
-        status="pending",
-        expires_at__gt=now,
-    )
-
-    for p in pending_transfers:
-        meta = p.metadata or {}
-        if isinstance(meta, dict):
-            nums = meta.get("chosen_numbers", [])
-            for n in nums:
-                try:
-                    taken.add(int(n))
-                except (TypeError, ValueError):
-                    continue
-
-    return taken
+async def _aget_active_raffle():
+    return await caching.aget_active_raffle()
 
 # ========= Vistas HTML =========
 
 PAGE_SIZE = 100  # 10 x 10
+GRID_FRAGMENT_CACHE_TTL = 60 * 10
 
 @ensure_csrf_cookie
 @require_GET
-def raffle_detail(request):
-    raffle = _get_active_raffle()
+async def raffle_detail(request):
+    raffle = await _aget_active_raffle()
     if not raffle:
         return render(request, "raffle/detail.html", {
             "raffle": None,
@@ -71,7 +55,7 @@ def raffle_detail(request):
     start = (current_page - 1) * PAGE_SIZE + 1
     end = min(start + PAGE_SIZE - 1, total)
 
-    taken = list(_get_taken_numbers_for_raffle(raffle))
+    taken = (await availability.apage_state(raffle, start, end))["taken"]
     first_page_numbers = range(start, end + 1)
 
     return render(request, "raffle/detail.html", {
@@ -81,12 +65,13 @@ def raffle_detail(request):
         "current_page": current_page,
         "page_size": PAGE_SIZE,
         "first_page_numbers": first_page_numbers,
+        "grid_mode": settings.RAFFLE_GRID_MODE,
     })
 
 
 @require_GET
-def grid_page(request):
-    raffle = _get_active_raffle()
+async def grid_page(request):
+    raffle = await _aget_active_raffle()
     if not raffle:
         return HttpResponseBadRequest("No hay rifa")
 
@@ -100,24 +85,214 @@ def grid_page(request):
     page_count = ceil(total / PAGE_SIZE)
     page = min(page, page_count)
 
+    # seek=1: saltar a la primera página con números libres desde `page`
+    if request.GET.get("seek") == "1":
+        page = await availability.afirst_free_page(raffle, page, PAGE_SIZE) or page
+
     start = (page - 1) * PAGE_SIZE + 1
     end = min(start + PAGE_SIZE - 1, total)
+    state = await availability.apage_state(raffle, start, end)
+
+    # La versión solo cambia si cambia algún número de esta página
+    version = state["version"]
+    etag = f'"grid-{raffle.id}-{page}-{page_count}-{version}"'
+    last_modified = int(state["updated_at"].timestamp()) if state["updated_at"] else None
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    key = f"raffle:{raffle.id}:grid:{page}:{page_count}:{version}"
+    html = await cache.aget(key)
+    metrics.cache_lookup("grid_fragment", html is not None)
+    if html is None:
+        html = render_to_string("raffle/_grid.html", {
+            "numbers": range(start, end + 1),
+            "taken": state["taken"],
+            "current_page": page,
+            "page_count": page_count,
+        })
+        await cache.aset(key, html, GRID_FRAGMENT_CACHE_TTL)
+
+    resp = HttpResponse(html)
+    resp["ETag"] = etag
+    if last_modified is not None:
+        resp["Last-Modified"] = http_date(last_modified)
+    # El navegador puede guardar el fragmento, pero debe revalidarlo siempre
+    resp["Cache-Control"] = "no-cache"
+    return resp
 
-    taken = _get_taken_numbers_for_raffle(raffle)
-    numbers = range(start, end + 1)
 
-    html = render_to_string("raffle/_grid.html", {
-        "numbers": numbers,
-        "taken": taken,
-        "current_page": page,
-        "page_count": page_count,
+async def _ataken_spans(raffle) -> list[tuple[int, int]]:
+    """
+    Tramos tomados de toda la rifa, recortados a 1..numbers_total.
+    """
+    total = raffle.numbers_total
+    return intervals.intersect([(1, total)], await availability.ataken_intervals(raffle.id, 1, total))
+
+
+@require_GET
+async def grid_overview(request):
+    """
+    Resumen por página para el paginador: números libres en cada página.
+    """
+    raffle = await _aget_active_raffle()
+    if not raffle:
+        return JsonResponse({"error": "No hay rifa activa"}, status=400)
+
+    if raffle.allows_ranges:
+        spans = await _ataken_spans(raffle)
+        version = availability.spans_version(spans)
+    else:
+        bitmap = (await availability.aget_availability_entry(raffle))["bitmap"]
+        version = availability.range_version(bitmap, 1, len(bitmap))
+    etag = f'"grid-overview-{raffle.id}-{PAGE_SIZE}-{version}"'
+
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    if raffle.allows_ranges:
+        free = availability.page_free_counts_from_spans(spans, raffle.numbers_total, PAGE_SIZE)
+    else:
+        free = availability.page_free_counts(bitmap, PAGE_SIZE)
+    resp = JsonResponse({
+        "page_size": PAGE_SIZE,
+        "page_count": len(free),
+        "free": free,
+        "version": version,
     })
-    return HttpResponse(html)
+    resp["ETag"] = etag
+    resp["Cache-Control"] = "no-cache"
+    return resp
 
 
 @require_GET
-def check_number(request):
-    raffle = _get_active_raffle()
+async def availability_api(request):
+    """
+    Disponibilidad completa de la rifa en formato compacto, para que el
+    cliente pagine la grilla sin volver al servidor.
+    - format=bitmap (por defecto): base64, 1 bit por número (1 = tomado)
+    - format=ranges: lista de tramos [desde, hasta] tomados
+    """
+    raffle = await _aget_active_raffle()
+    if not raffle:
+        return JsonResponse({"error": "No hay rifa activa"}, status=400)
+
+    fmt = request.GET.get("format", "bitmap")
+    if fmt not in ("bitmap", "ranges"):
+        return JsonResponse({"error": "Formato inválido"}, status=400)
+
+    # Con tramos se responde desde taken_intervals, sin armar el mapa
+    if raffle.allows_ranges:
+        spans = await _ataken_spans(raffle)
+        version = availability.spans_version(spans)
+        last_modified = None
+    else:
+        entry = await availability.aget_availability_entry(raffle)
+        bitmap = entry["bitmap"]
+        version = availability.range_version(bitmap, 1, len(bitmap))
+        last_modified = int(entry["updated_at"].timestamp())
+    etag = f'"availability-{raffle.id}-{fmt}-{version}"'
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    key = f"raffle:{raffle.id}:availability-json:{fmt}:{version}"
+    payload = await cache.aget(key)
+    metrics.cache_lookup("availability_json", payload is not None)
+    if payload is None:
+        data = {
+            "raffle_id": raffle.id,
+            "total": raffle.numbers_total,
+            "page_size": PAGE_SIZE,
+            "version": version,
+            "format": fmt,
+        }
+        if raffle.allows_ranges and fmt == "bitmap":
+            data["taken"] = availability.encode_taken_spans(spans, raffle.numbers_total)
+        elif raffle.allows_ranges:
+            data["taken"] = [list(span) for span in spans]
+        elif fmt == "bitmap":
+            data["taken"] = availability.encode_taken_bitmap(bitmap)
+        else:
+            data["taken"] = availability.taken_ranges(bitmap)
+        payload = json.dumps(data, separators=(",", ":"))
+        await cache.aset(key, payload, GRID_FRAGMENT_CACHE_TTL)
+
+    resp = HttpResponse(payload, content_type="application/json")
+    resp["ETag"] = etag
+    if last_modified is not None:
+        resp["Last-Modified"] = http_date(last_modified)
+    resp["Cache-Control"] = "no-cache"
+    return resp
+
+
+STREAM_POLL_SECONDS = 1
+STREAM_PING_SECONDS = 15
+STREAM_MAX_SECONDS = 60 * 5   # el navegador reconecta solo (Last-Event-ID)
+STREAM_MAX_BACKLOG = 200      # más eventos pendientes que esto → resync
+
+
+@require_GET
+async def availability_stream(request):
+    """
+    Server-Sent Events con los cambios de disponibilidad de la rifa activa:
+    - event: delta  → {"taken": [...], "released": [...]}
+    - event: resync → el cliente debe recargar la grilla completa
+    Solo bajo ASGI; con WSGI el stream ocuparía un worker completo.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)  # 204 → EventSource no reintenta
+
+    raffle = await _aget_active_raffle()
+    if not raffle:
+        return HttpResponse(status=204)
+
+    try:
+        last_seen = int(request.headers.get("Last-Event-ID", ""))
+    except ValueError:
+        last_seen = None
+
+    async def events():
+        current = await availability.aget_event_seq(raffle.id)
+        seq = current if last_seen is None or last_seen > current else last_seen
+        yield f"retry: 3000\nid: {seq}\n\n"
+        if last_seen is not None and last_seen > current:
+            # Un id que esta BD nunca emitió (p. ej. se recreó): recargar todo
+            yield f"id: {seq}\nevent: resync\ndata: {{}}\n\n"
+
+        loop = asyncio.get_running_loop()
+        started = last_ping = loop.time()
+        while loop.time() - started < STREAM_MAX_SECONDS:
+            head, pending = await availability.aget_events(raffle.id, seq, STREAM_MAX_BACKLOG)
+            if pending is None:
+                # Cliente muy atrasado
+                seq = head
+                yield f"id: {seq}\nevent: resync\ndata: {{}}\n\n"
+            for event_id, delta in pending or ():
+                if delta is None:
+                    # Evento ya purgado: no se puede reconstruir el cambio
+                    seq = max(head, event_id)
+                    yield f"id: {seq}\nevent: resync\ndata: {{}}\n\n"
+                    break
+                seq = event_id
+                yield f"id: {event_id}\nevent: delta\ndata: {json.dumps(delta)}\n\n"
+            if not pending and loop.time() - last_ping >= STREAM_PING_SECONDS:
+                last_ping = loop.time()
+                yield ": ping\n\n"
+            await asyncio.sleep(STREAM_POLL_SECONDS)
+
+    resp = StreamingHttpResponse(events(), content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"  # nginx: no acumular el stream
+    return resp
+
+
+@require_GET
+async def check_number(request):
+    raffle = await _aget_active_raffle()
     if not raffle:
         return HttpResponse("No hay rifa activa", status=400)
     try:
@@ -128,18 +303,174 @@ def check_number(request):
     if n < 1 or n > raffle.numbers_total:
         return HttpResponseBadRequest("Fuera de rango")
 
-    exists = Ticket.objects.filter(raffle=raffle, number=n).exists()
+    covers = Q(number=n)
+    if raffle.allows_ranges:
+        covers |= Q(number_end__isnull=False, number__lte=n, number_end__gte=n)
+
+    exists = await Ticket.objects.filter(covers, raffle=raffle).aexists()
     if exists:
         return HttpResponse('<span class="text-red-600">No disponible</span>')
+    held = await Reservation.objects.filter(
+        covers, raffle=raffle, is_active=True, expires_at__gt=timezone.now(),
+    ).aexists()
+    if held:
+        return HttpResponse('<span class="text-yellow-600">Reservado</span>')
     return HttpResponse('<span class="text-green-600">Disponible</span>')
 
 
+BATCH_CHECK_MAX = 200
+
+
+def _parse_numbers_param(value: str, limit: int) -> list[int]:
+    """
+    Interpreta "1,2,10-15" como [1, 2, 10, 11, ..., 15].
+    Lanza ValueError si el formato es inválido o supera `limit` números.
+    """
+    numbers: list[int] = []
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        if "-" in part:
+            lo, hi = (int(x) for x in part.split("-", 1))
+            if lo > hi or hi - lo + 1 > limit:
+                raise ValueError(part)
+            numbers.extend(range(lo, hi + 1))
+        else:
+            numbers.append(int(part))
+        if len(numbers) > limit:
+            raise ValueError(part)
+    return list(dict.fromkeys(numbers))
+
+
+@require_GET
+async def check_numbers_batch(request):
+    """
+    Estado de varios números a la vez (?numbers=1,2,10-15), contando tickets
+    y reservas activas en una sola consulta:
+    {"numbers": {"1": {"status": "free"}, "2": {"status": "reserved", "until": ...},
+                 "10": {"status": "sold"}}, "all_free": false}
+    """
+    raffle = await _aget_active_raffle()
+    if not raffle:
+        return JsonResponse({"error": "No hay rifa activa"}, status=400)
+
+    try:
+        numbers = _parse_numbers_param(request.GET.get("numbers", ""), BATCH_CHECK_MAX)
+    except ValueError:
+        return JsonResponse(
+            {"error": f"Números inválidos (máximo {BATCH_CHECK_MAX} por consulta)"},
+            status=400,
+        )
+    if not numbers:
+        return JsonResponse({"error": "Debes indicar al menos un número"}, status=400)
+    for n in numbers:
+        if n < 1 or n > raffle.numbers_total:
+            return JsonResponse({"error": f"Número fuera de rango: {n}"}, status=400)
+
+    sold = Ticket.objects.filter(raffle=raffle, number__in=numbers).annotate(
+        state=Value("sold"), until=Value(None, output_field=DateTimeField()),
+    ).values_list("number", "state", "until")
+    held = Reservation.objects.filter(
+        raffle=raffle, number__in=numbers, is_active=True, expires_at__gt=timezone.now(),
+    ).annotate(state=Value("reserved")).values_list("number", "state", "expires_at")
+
+    result = {str(n): {"status": "free"} for n in numbers}
+    async for n, state, until in sold.union(held, all=True):
+        # Vendido manda sobre reservado
+        if result[str(n)]["status"] == "sold":
+            continue
+        result[str(n)] = {"status": state}
+        if state == "reserved":
+            result[str(n)]["until"] = until.isoformat()
+
+    if raffle.allows_ranges:
+        await _apply_range_states(raffle, numbers, result)
+
+    return JsonResponse({
+        "numbers": result,
+        "all_free": all(v["status"] == "free" for v in result.values()),
+    })
+
+
+async def _apply_range_states(raffle: Raffle, numbers: list[int], result: dict):
+    """
+    Completa `result` con los tickets y reservas por tramo que cubren números
+    consultados (una consulta por tabla, solo tramos que tocan min..max).
+    """
+    in_span = Q(number_end__isnull=False, number__lte=max(numbers), number_end__gte=min(numbers))
+    sold = intervals.normalize([
+        row async for row in
+        Ticket.objects.filter(in_span, raffle=raffle).values_list("number", "number_end")
+    ])
+    held = [
+        row async for row in
+        Reservation.objects.filter(
+            in_span, raffle=raffle, is_active=True, expires_at__gt=timezone.now(),
+        ).values_list("number", "number_end", "expires_at")
+    ]
+    for n in numbers:
+        if intervals.contains(sold, n):
+            result[str(n)] = {"status": "sold"}
+            continue
+        for lo, hi, until in held:
+            if lo <= n <= hi and result[str(n)]["status"] == "free":
+                result[str(n)] = {"status": "reserved", "until": until.isoformat()}
+
+
 # ========= Confirmación de pago → creación de tickets =========
 
+def _chosen_numbers_for_payment(p: Payment, reserved: list[int] | None = None) -> list[int]:
+    """
+    Números que el Payment intentó comprar.
+    Las reservas (Reservation) son la fuente de verdad; metadata['chosen_numbers']
+    (o 'chosen_number' legacy) queda como respaldo para pagos sin reservas.
+    `reserved` permite pasar las reservas ya cargadas (confirmación en lote).
+    """
+    if reserved is None:
+        reserved = list(
+            p.reservations.filter(number_end__isnull=True)
+            .order_by("id").values_list("number", flat=True)
+        )
+    if reserved:
+        return reserved
+
+    if isinstance(p.metadata, dict) and "chosen_numbers" in p.metadata:
+        try:
+            return [int(x) for x in p.metadata.get("chosen_numbers", [])]
+        except (TypeError, ValueError):
+            return []
+    if getattr(p, "chosen_number", None):
+        try:
+            return [int(p.chosen_number)]
+        except (TypeError, ValueError):
+            return []
+    return []
+
+
+def _chosen_ranges_for_payment(p: Payment, reserved=None) -> list[tuple[int, int]]:
+    """
+    Tramos (desde, hasta) que el Payment intentó comprar: sus reservas por
+    tramo o, en su defecto, metadata['chosen_ranges'].
+    """
+    if reserved is None:
+        reserved = list(
+            p.reservations.filter(number_end__isnull=False)
+            .values_list("number", "number_end")
+        )
+    if reserved:
+        return intervals.normalize(reserved)
+
+    if isinstance(p.metadata, dict) and p.metadata.get("chosen_ranges"):
+        try:
+            return intervals.normalize(p.metadata["chosen_ranges"])
+        except (TypeError, ValueError):
+            return []
+    return []
+
+
 def _confirm_tickets_from_payment_id(gateway_payment_id: str):
     """
     Marca Payment como paid (idempotente) y crea Tickets para cada número
-    en metadata['chosen_numbers'] (o 'chosen_number' legacy).
+    reservado por el Payment (Reservation), o en su defecto para
+    metadata['chosen_numbers'] (o 'chosen_number' legacy).
 
     - Si algunos números ya están vendidos (por otro Payment),
       crea tickets solo para los disponibles.
@@ -157,19 +488,10 @@ def _confirm_tickets_from_payment_id(gateway_payment_id: str):
             return False
 
         # Números originales que se intentaron comprar
-        chosen_numbers: list[int] = []
-        if isinstance(p.metadata, dict) and "chosen_numbers" in p.metadata:
-            try:
-                chosen_numbers = [int(x) for x in p.metadata.get("chosen_numbers", [])]
-            except (TypeError, ValueError):
-                chosen_numbers = []
-        elif getattr(p, "chosen_number", None):
-            try:
-                chosen_numbers = [int(p.chosen_number)]
-            except (TypeError, ValueError):
-                chosen_numbers = []
-
-        if not chosen_numbers:
+        chosen_numbers = _chosen_numbers_for_payment(p)
+        chosen_ranges = _chosen_ranges_for_payment(p)
+
+        if not chosen_numbers and not chosen_ranges:
             # No hay números, solo marcamos como pagado
             if p.status != "paid":
                 p.status = "paid"
@@ -177,32 +499,49 @@ def _confirm_tickets_from_payment_id(gateway_payment_id: str):
                 p.save()
             return True
 
-        paid_numbers: list[int] = []
-        conflict_numbers: list[int] = []
-
-        # Intentar crear/obtener ticket para cada número
-        for n in chosen_numbers:
-            ticket, created = Ticket.objects.get_or_create(
-                raffle=p.raffle,
-                number=n,
-                defaults={
-                    "payment": p,
-                    "buyer_name": p.buyer_name,
-                    "buyer_email": p.buyer_email,
-                    "buyer_phone": p.buyer_phone,
-                },
+        uses_ranges = availability.lock_raffle_for_ranges(p.raffle_id)
+
+        # Dueño actual de cada número (una sola consulta)
+        owners = dict(
+            Ticket.objects.filter(raffle_id=p.raffle_id, number__in=chosen_numbers)
+            .values_list("number", "payment_id")
+        )
+        if uses_ranges:
+            # Números dentro de un ticket por tramo: ya vendidos
+            for n in availability.covered_by_ranges(p.raffle_id, chosen_numbers, holds=False):
+                owners[n] = None
+
+        # Crear de una vez los tickets que faltan; si otro pago se adelanta,
+        # uniq_raffle_number descarta la fila y se refleja al releer
+        missing = [n for n in chosen_numbers if n not in owners]
+        if missing:
+            Ticket.objects.bulk_create(
+                [
+                    Ticket(
+                        raffle_id=p.raffle_id,
+                        number=n,
+                        payment=p,
+                        buyer_name=p.buyer_name,
+                        buyer_email=p.buyer_email,
+                        buyer_phone=p.buyer_phone,
+                    )
+                    for n in missing
+                ],
+                ignore_conflicts=True,
             )
-            if created:
-                # Ticket nuevo asignado a este Payment
-                paid_numbers.append(n)
-            else:
-                # Ticket ya existía: conflicto (otro pago se quedó con ese número)
-                # Solo lo consideramos conflicto si NO está ya asociado a este mismo Payment
-                if ticket.payment_id != p.id:
-                    conflict_numbers.append(n)
-                else:
-                    # Ya existía un ticket de este mismo Payment (idempotencia)
-                    paid_numbers.append(n)
+            owners.update(
+                Ticket.objects.filter(raffle_id=p.raffle_id, number__in=chosen_numbers)
+                .values_list("number", "payment_id")
+            )
+
+        paid_ranges, conflict_ranges = availability.sell_ranges(p, chosen_ranges)
+
+        # Ticket de este mismo Payment (nuevo o por idempotencia) → pagado;
+        # ticket de otro Payment → conflicto
+        paid_numbers = [n for n in chosen_numbers if owners.get(n) == p.id]
+        conflict_numbers = [n for n in chosen_numbers if owners.get(n) != p.id]
+        issued = sum(1 for n in missing if owners.get(n) == p.id)
+        transaction.on_commit(lambda: metrics.inc("raffle_numbers_sold_total", issued))
 
         # Actualizar metadata con el resultado
         meta = p.metadata or {}
@@ -212,6 +551,10 @@ def _confirm_tickets_from_payment_id(gateway_payment_id: str):
         meta.setdefault("chosen_numbers", chosen_numbers)
         meta["paid_numbers"] = sorted(set(paid_numbers))
         meta["conflict_numbers"] = sorted(set(conflict_numbers))
+        if chosen_ranges:
+            meta.setdefault("chosen_ranges", [list(r) for r in chosen_ranges])
+            meta["paid_ranges"] = [list(r) for r in paid_ranges]
+            meta["conflict_ranges"] = [list(r) for r in conflict_ranges]
 
         p.metadata = meta
 
@@ -222,15 +565,287 @@ def _confirm_tickets_from_payment_id(gateway_payment_id: str):
 
         p.save()
 
+        raffle_id = p.raffle_id
+        sold = meta["paid_numbers"]
+        transaction.on_commit(
+            lambda: availability.mark_numbers(raffle_id, sold, availability.SOLD)
+        )
+        if paid_ranges:
+            transaction.on_commit(
+                lambda: availability.mark_ranges(raffle_id, paid_ranges, availability.SOLD)
+            )
+
     return True
 
+
+CONFIRM_BATCH_SIZE = 200
+
+
+def _confirm_payments_chunk(payment_ids, results: list[dict]):
+    """
+    Confirma un grupo de Payments en una sola transacción:
+    - bloquea todos los Payments juntos,
+    - carga reservas y tickets existentes con una consulta por tabla,
+    - reparte los números en orden de created_at (el pago más antiguo gana),
+    - crea todos los tickets con un solo bulk_create.
+    Los tramos (rifas con allows_ranges) se emiten después, pago por pago
+    y en el mismo orden, con la rifa bloqueada.
+    Agrega a `results` un dict por Payment confirmado.
+    """
+    now = timezone.now()
+
+    with transaction.atomic():
+        payments = list(
+            Payment.objects.select_for_update()
+            .filter(id__in=payment_ids)
+            .order_by("created_at", "id")
+        )
+        if not payments:
+            return
+
+        reserved: dict[int, list[int]] = defaultdict(list)
+        reserved_ranges: dict[int, list[tuple[int, int]]] = defaultdict(list)
+        rows = (
+            Reservation.objects.filter(payment_id__in=[p.id for p in payments])
+            .order_by("id")
+            .values_list("payment_id", "number", "number_end")
+        )
+        for payment_id, n, end in rows:
+            if end is None:
+                reserved[payment_id].append(n)
+            else:
+                reserved_ranges[payment_id].append((n, end))
+
+        chosen = {
+            p.id: list(dict.fromkeys(_chosen_numbers_for_payment(p, reserved.get(p.id, []))))
+            for p in payments
+        }
+        chosen_ranges = {
+            p.id: _chosen_ranges_for_payment(p, reserved_ranges.get(p.id, []))
+            for p in payments
+        }
+
+        # Bloqueo por rifa (en orden de id, para no cruzarse con otro lote)
+        ranged = {
+            raffle_id
+            for raffle_id in sorted({p.raffle_id for p in payments})
+            if availability.lock_raffle_for_ranges(raffle_id)
+        }
+
+        # Números pedidos por rifa, para leer dueños con una consulta por rifa
+        wanted: dict[int, set[int]] = defaultdict(set)
+        for p in payments:
+            wanted[p.raffle_id].update(chosen[p.id])
+
+        def load_owners():
+            owners = {}
+            for raffle_id, numbers in wanted.items():
+                qs = Ticket.objects.filter(raffle_id=raffle_id, number__in=numbers)
+                for n, payment_id in qs.values_list("number", "payment_id"):
+                    owners[(raffle_id, n)] = payment_id
+                if raffle_id in ranged:
+                    # Números dentro de un ticket por tramo: ya vendidos
+                    for n in availability.covered_by_ranges(raffle_id, numbers, holds=False):
+                        owners[(raffle_id, n)] = None
+            return owners
+
+        owners = load_owners()
+
+        new_tickets = []
+        claimed = dict(owners)
+        for p in payments:
+            for n in chosen[p.id]:
+                key = (p.raffle_id, n)
+                if key in claimed:
+                    continue
+                claimed[key] = p.id
+                new_tickets.append(Ticket(
+                    raffle_id=p.raffle_id,
+                    number=n,
+                    payment=p,
+                    buyer_name=p.buyer_name,
+                    buyer_email=p.buyer_email,
+                    buyer_phone=p.buyer_phone,
+                ))
+
+        if new_tickets:
+            Ticket.objects.bulk_create(new_tickets, ignore_conflicts=True, batch_size=1000)
+            owners = load_owners()
+        issued = sum(1 for t in new_tickets if owners.get((t.raffle_id, t.number)) == t.payment_id)
+
+        sold: dict[int, list[int]] = defaultdict(list)
+        sold_ranges: dict[int, list[tuple[int, int]]] = defaultdict(list)
+        for p in payments:
+            paid_ranges, conflict_ranges = availability.sell_ranges(p, chosen_ranges[p.id])
+            paid_numbers = [n for n in chosen[p.id] if owners.get((p.raffle_id, n)) == p.id]
+            conflict_numbers = [n for n in chosen[p.id] if owners.get((p.raffle_id, n)) != p.id]
+
+            meta = p.metadata if isinstance(p.metadata, dict) else {}
+            if chosen[p.id]:
+                meta.setdefault("chosen_numbers", chosen[p.id])
+                meta["paid_numbers"] = sorted(paid_numbers)
+                meta["conflict_numbers"] = sorted(conflict_numbers)
+            if chosen_ranges[p.id]:
+                meta.setdefault("chosen_ranges", [list(r) for r in chosen_ranges[p.id]])
+                meta["paid_ranges"] = [list(r) for r in paid_ranges]
+                meta["conflict_ranges"] = [list(r) for r in conflict_ranges]
+            p.metadata = meta
+            p.refresh_numbers_summary()
+
+            sold[p.raffle_id].extend(paid_numbers)
+            sold_ranges[p.raffle_id].extend(paid_ranges)
+            results.append({
+                "payment_id": p.id,
+                "gateway_payment_id": p.gateway_payment_id,
+                "paid_numbers": sorted(paid_numbers),
+                "conflict_numbers": sorted(conflict_numbers),
+                "paid_ranges": paid_ranges,
+                "conflict_ranges": conflict_ranges,
+            })
+
+        # status/paid_at son iguales para todos: un UPDATE simple en vez de
+        # sumarlos a los CASE de bulk_update
+        Payment.objects.filter(
+            id__in=[p.id for p in payments if p.status != "paid"],
+        ).update(status="paid", paid_at=now)
+        Payment.objects.bulk_update(payments, ["metadata", "numbers_summary", "conflicts_summary"])
+        # bulk_update no pasa por Payment.save: liberar las reservas aquí
+        Reservation.objects.filter(
+            payment_id__in=[p.id for p in payments], is_active=True,
+        ).update(is_active=False)
+
+        def mark_sold():
+            for raffle_id, numbers in sold.items():
+                availability.mark_numbers(raffle_id, numbers, availability.SOLD)
+            for raffle_id, ranges in sold_ranges.items():
+                availability.mark_ranges(raffle_id, ranges, availability.SOLD)
+            metrics.inc("raffle_numbers_sold_total", issued)
+
+        transaction.on_commit(mark_sold)
+
+
+def _confirm_payments_batch(payment_ids, chunk_size: int = CONFIRM_BATCH_SIZE, progress=None) -> dict:
+    """
+    Confirma muchos Payments a la vez, en bloques de `chunk_size`
+    (una transacción por bloque). Los bloques se recorren por created_at,
+    así que ante números repetidos siempre gana el pago más antiguo.
+
+    `progress(done, total)` se llama al terminar cada bloque.
+    Devuelve un resumen:
+      * 'results': un dict por Payment (paid_numbers / conflict_numbers y
+        paid_ranges / conflict_ranges)
+      * 'missing': ids que no existen
+    """
+    ids = list(
+        Payment.objects.filter(id__in=payment_ids)
+        .order_by("created_at", "id")
+        .values_list("id", flat=True)
+    )
+    missing = sorted(set(payment_ids) - set(ids))
+
+    results: list[dict] = []
+    total = len(ids)
+    for i in range(0, total, chunk_size):
+        _confirm_payments_chunk(ids[i:i + chunk_size], results)
+        if progress:
+            progress(min(i + chunk_size, total), total)
+
+    return {"results": results, "missing": missing}
+
 # ========= Reservar Transferencia 12 horas =========
 
+MAX_NUMBERS_PER_TRANSFER = 50
+MAX_RANGE_NUMBERS_PER_TRANSFER = 100_000  # suma de los tramos de una reserva
+TRANSFER_HOLD_HOURS = 12
+
+
+def _parse_buyer(data: dict):
+    """
+    Devuelve (name, email, phone) o None si faltan datos válidos.
+    """
+    buyer = data.get("buyer") or {}
+    name = (buyer.get("name") or "").strip()
+    email = (buyer.get("email") or "").strip()
+    phone = (buyer.get("phone") or "").strip()
+    if not name or not email or "@" not in email:
+        return None
+    return name, email, phone
+
+
+def _too_many_recent_transfers(raffle: Raffle, email: str) -> bool:
+    # opcional: limitar reservas por email en ventana de tiempo
+    recent_pending = Payment.objects.filter(
+        raffle=raffle,
+        gateway="transfer",
+        status="pending",
+        buyer_email=email,
+        created_at__gte=timezone.now() - timedelta(hours=24),
+    ).count()
+    return recent_pending >= 5
+
+
+def _create_transfer_payment(request, raffle: Raffle, numbers: list[int], buyer, expires_at,
+                             ranges=()) -> Payment:
+    """
+    Crea el Payment 'pending' de una reserva por transferencia.
+    Debe llamarse dentro de transaction.atomic().
+    """
+    name, email, phone = buyer
+    metadata = {
+        "chosen_numbers": numbers,
+        "payment_method": "transfer",
+        "client_ip": request.META.get("REMOTE_ADDR"),
+        "user_agent": request.META.get("HTTP_USER_AGENT", ""),
+    }
+    if ranges:
+        metadata["chosen_ranges"] = [list(r) for r in ranges]
+    return Payment.objects.create(
+        raffle=raffle,
+        amount_clp=int(raffle.price_clp) * (len(numbers) + intervals.size(ranges)),
+        gateway="transfer",
+        gateway_payment_id=f"transfer-{raffle.id}-{uuid4()}",
+        status="pending",
+        buyer_name=name,
+        buyer_email=email,
+        buyer_phone=phone,
+        expires_at=expires_at,
+        metadata=metadata,
+    )
+
+
+def _transfer_reserved_response(raffle: Raffle, numbers: list[int], expires_at, ranges=(), **extra):
+    transaction.on_commit(
+        lambda: availability.mark_numbers(raffle.id, numbers, availability.RESERVED, expires_at)
+    )
+    if ranges:
+        transaction.on_commit(
+            lambda: availability.mark_ranges(raffle.id, ranges, availability.RESERVED, expires_at)
+        )
+    count = len(numbers) + intervals.size(ranges)
+
+    def count_reservation():
+        metrics.inc("raffle_reservations_created_total")
+        metrics.inc("raffle_numbers_reserved_total", count)
+
+    transaction.on_commit(count_reservation)
+    success_url = reverse("payment_success") + "?kind=transfer"
+    return JsonResponse(
+        {
+            "ok": True,
+            "reserved_until": expires_at.isoformat(),
+            "count": count,
+            "redirect_url": success_url,
+            **extra,
+        }
+    )
+
+
 @require_POST
 @ratelimit(key="ip", rate="10/m", block=True)
 def transfer_reserve(request):
     """
     Reserva números para pago por transferencia por 12 horas.
+    En rifas con allows_ranges acepta además "chosen_ranges": [[desde, hasta], ...].
     No crea tickets; solo un Payment 'pending' con gateway='transfer'.
     Cuando confirmes manualmente la transferencia, podrás marcarlo como 'paid'
     y usar _confirm_tickets_from_payment_id para generar los Tickets.
@@ -245,15 +860,15 @@ def transfer_reserve(request):
         return JsonResponse({"error": "JSON inválido"}, status=400)
 
     chosen_numbers = data.get("chosen_numbers") or []
-    buyer = data.get("buyer") or {}
+    chosen_ranges = data.get("chosen_ranges") or []
 
     # Validaciones básicas
-    if not chosen_numbers:
+    if not chosen_numbers and not chosen_ranges:
         return JsonResponse({"error": "Debes seleccionar al menos un número"}, status=400)
 
-    # Normalizar a int
+    # Normalizar a int (sin repetidos, conservando el orden)
     try:
-        chosen_numbers = [int(n) for n in chosen_numbers]
+        chosen_numbers = list(dict.fromkeys(int(n) for n in chosen_numbers))
     except (TypeError, ValueError):
         return JsonResponse({"error": "Números inválidos"}, status=400)
 
@@ -262,125 +877,263 @@ def transfer_reserve(request):
         if n < 1 or n > raffle.numbers_total:
             return JsonResponse({"error": f"Número fuera de rango: {n}"}, status=400)
 
-    name = (buyer.get("name") or "").strip()
-    email = (buyer.get("email") or "").strip()
-    phone = (buyer.get("phone") or "").strip()
+    if chosen_ranges:
+        if not raffle.allows_ranges:
+            return JsonResponse({"error": "Esta rifa no vende tramos de números"}, status=400)
+        try:
+            chosen_ranges = intervals.normalize(chosen_ranges)
+        except (TypeError, ValueError):
+            return JsonResponse({"error": "Tramos inválidos"}, status=400)
+        for lo, hi in chosen_ranges:
+            if lo < 1 or hi > raffle.numbers_total or lo > hi:
+                return JsonResponse({"error": f"Tramo fuera de rango: {lo}-{hi}"}, status=400)
+        if intervals.size(chosen_ranges) > MAX_RANGE_NUMBERS_PER_TRANSFER:
+            return JsonResponse(
+                {"error": f"No puedes reservar más de {MAX_RANGE_NUMBERS_PER_TRANSFER} números en tramos"},
+                status=400,
+            )
+        # Los sueltos que ya vienen dentro de un tramo se cobran una sola vez
+        chosen_numbers = [n for n in chosen_numbers if not intervals.contains(chosen_ranges, n)]
 
-    if not name or not email or "@" not in email:
+    buyer = _parse_buyer(data)
+    if buyer is None:
         return JsonResponse(
             {"error": "Debes ingresar nombre y un correo válido"},
             status=400,
         )
     
     # límite máximo de números por reserva
-    if len(chosen_numbers) > 50:
+    if len(chosen_numbers) > MAX_NUMBERS_PER_TRANSFER:
         return JsonResponse({"error": "No puedes reservar más de 50 números por transferencia"}, status=400)
 
-    # opcional: limitar reservas por email en ventana de tiempo
-    recent_pending = Payment.objects.filter(
-        raffle=raffle,
-        gateway="transfer",
-        status="pending",
-        buyer_email=email,
-        created_at__gte=timezone.now() - timedelta(hours=24),
-    ).count()
-    if recent_pending >= 5:
+    if _too_many_recent_transfers(raffle, buyer[1]):
         return JsonResponse(
             {"error": "Has realizado demasiadas reservas por transferencia en las últimas 24 horas."},
             status=429,
         )
 
-    client_ip = request.META.get("REMOTE_ADDR")
-    user_agent = request.META.get("HTTP_USER_AGENT", "")
-
-    now = timezone.now()
-    expires_at = now + timedelta(hours=12)
+    expires_at = timezone.now() + timedelta(hours=TRANSFER_HOLD_HOURS)
 
     with transaction.atomic():
-        # Recalcular taken dentro de la transacción para evitar carreras
-        taken = _get_taken_numbers_for_raffle(raffle)
-        conflict = taken.intersection(chosen_numbers)
-        if conflict:
+        payment = _create_transfer_payment(
+            request, raffle, chosen_numbers, buyer, expires_at, ranges=chosen_ranges,
+        )
+
+        # La BD detecta los choques al insertar las reservas
+        conflict = []
+        if chosen_numbers:
+            conflict = availability.hold_numbers(raffle, payment, chosen_numbers, expires_at)
+        conflict_ranges = []
+        if not conflict and chosen_ranges:
+            conflict_ranges = availability.hold_ranges(raffle, payment, chosen_ranges, expires_at)
+        if conflict or conflict_ranges:
+            transaction.set_rollback(True)
+            metrics.inc("raffle_reservation_conflicts_total", source="transfer_reserve")
             return JsonResponse(
                 {
                     "error": "Algunos números ya no están disponibles. Recarga la página para verlos.",
-                    "conflict_numbers": sorted(conflict),
+                    "conflict_numbers": conflict,
+                    "conflict_ranges": [list(r) for r in conflict_ranges],
                 },
                 status=409,
             )
 
-        total = int(raffle.price_clp) * len(chosen_numbers)
-        gateway_payment_id = f"transfer-{raffle.id}-{uuid4()}"
-
-        Payment.objects.create(
-            raffle=raffle,
-            amount_clp=total,
-            gateway="transfer",
-            gateway_payment_id=gateway_payment_id,
-            status="pending",
-            buyer_name=name,
-            buyer_email=email,
-            buyer_phone=phone,
-            expires_at=expires_at,
-            metadata={
-                "chosen_numbers": chosen_numbers,
-                "payment_method": "transfer",
-                "client_ip": client_ip,
-                "user_agent": user_agent,
-            },
+        return _transfer_reserved_response(raffle, chosen_numbers, expires_at, ranges=chosen_ranges)
+
+
+LUCKY_MAX_ROUNDS = 3
+
+
+@require_POST
+@ratelimit(key="ip", rate="10/m", block=True)
+def transfer_lucky(request):
+    """
+    Reserva por transferencia `count` números libres elegidos al azar
+    (uniforme entre los libres). Opcional:
+    - "range": [desde, hasta]
+    - "ends_with": "7" → solo números terminados en esos dígitos
+    """
+    raffle = _get_active_raffle()
+    if not raffle:
+        return JsonResponse({"error": "No hay rifa activa"}, status=400)
+
+    try:
+        data = json.loads(request.body.decode())
+    except Exception:
+        return JsonResponse({"error": "JSON inválido"}, status=400)
+
+    try:
+        count = int(data.get("count") or 0)
+        lo, hi = data.get("range") or (1, raffle.numbers_total)
+        lo, hi = int(lo), int(hi)
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "Parámetros inválidos"}, status=400)
+
+    if count < 1 or count > MAX_NUMBERS_PER_TRANSFER:
+        return JsonResponse({"error": "Debes pedir entre 1 y 50 números"}, status=400)
+    if lo < 1 or hi > raffle.numbers_total or lo > hi:
+        return JsonResponse({"error": "Rango inválido"}, status=400)
+
+    ends_with = str(data.get("ends_with") or "").strip()
+    if ends_with and (not ends_with.isdigit() or len(ends_with) > len(str(raffle.numbers_total))):
+        return JsonResponse({"error": "Terminación inválida"}, status=400)
+
+    buyer = _parse_buyer(data)
+    if buyer is None:
+        return JsonResponse(
+            {"error": "Debes ingresar nombre y un correo válido"},
+            status=400,
         )
 
-    success_url = reverse("payment_success") + "?kind=transfer"
+    if _too_many_recent_transfers(raffle, buyer[1]):
+        return JsonResponse(
+            {"error": "Has realizado demasiadas reservas por transferencia en las últimas 24 horas."},
+            status=429,
+        )
 
-    return JsonResponse(
-        {
-            "ok": True,
-            "reserved_until": expires_at.isoformat(),
-            "count": len(chosen_numbers),
-            "redirect_url": success_url,
-        }
-    )
+    expires_at = timezone.now() + timedelta(hours=TRANSFER_HOLD_HOURS)
+    entry = availability.get_availability_entry(raffle, lo, hi)
+
+    with transaction.atomic():
+        payment = _create_transfer_payment(request, raffle, [], buyer, expires_at)
+
+        held: list[int] = []
+        tried: set[int] = set()
+        for _ in range(LUCKY_MAX_ROUNDS):
+            missing = count - len(held)
+            # Se sortean algunos de más para cubrir números tomados por otros
+            # que el mapa en cache todavía no refleja
+            candidates = availability.sample_free_numbers(
+                entry["bitmap"], missing * 2, lo, hi, ends_with, exclude=tried,
+                start=entry["start"],
+            )
+            if not candidates:
+                break
+            tried.update(candidates)
+            held += availability.hold_available_numbers(
+                raffle, payment, candidates, expires_at, limit=missing,
+            )
+            if len(held) >= count:
+                break
+
+        if len(held) < count:
+            transaction.set_rollback(True)
+            metrics.inc("raffle_reservation_conflicts_total", source="transfer_lucky")
+            return JsonResponse(
+                {"error": "No quedan suficientes números libres con esas condiciones."},
+                status=409,
+            )
+
+        held.sort()
+        payment.metadata["chosen_numbers"] = held
+        payment.amount_clp = int(raffle.price_clp) * len(held)
+        payment.save(update_fields=["metadata", "amount_clp"])
+
+        return _transfer_reserved_response(raffle, held, expires_at, reserved_numbers=held)
 
 # ============== exportación csv ======================== #
 
+EXPORT_CHUNK_SIZE = 2000   # filas leídas por ida a la BD
+EXPORT_FLUSH_ROWS = 500    # filas por bloque enviado al cliente
+
+
+class _Echo:
+    """Pseudo-archivo para csv.writer: devuelve la línea en vez de guardarla."""
+    def write(self, value):
+        return value
+
+
+def _iter_csv(header, rows, use_gzip: bool):
+    """
+    Genera el CSV por bloques de EXPORT_FLUSH_ROWS filas, opcionalmente
+    comprimido en gzip a medida que se produce.
+    """
+    writer = csv.writer(_Echo())
+    compressor = zlib.compressobj(wbits=31) if use_gzip else None  # 31 = formato gzip
+
+    def encode(text):
+        data = text.encode("utf-8")
+        return compressor.compress(data) if compressor else data
+
+    block = [writer.writerow(header)]
+    for row in rows:
+        block.append(writer.writerow(row))
+        if len(block) >= EXPORT_FLUSH_ROWS:
+            data = encode("".join(block))
+            block = []
+            if data:
+                yield data
+
+    data = encode("".join(block))
+    if compressor:
+        data += compressor.flush()
+    if data:
+        yield data
+
+
+async def _aiter_blocks(blocks):
+    """
+    Bajo ASGI, StreamingHttpResponse consume un iterador sync entero (en
+    memoria) antes de enviar nada. Este recorre el generador de a un bloque
+    con sync_to_async, así el cursor de la BD avanza a medida que se envía.
+    """
+    next_block = sync_to_async(next)
+    try:
+        while (block := await next_block(blocks, None)) is not None:
+            yield block
+    finally:
+        # Si el cliente corta la descarga, cerrar también el cursor
+        await sync_to_async(blocks.close)()
+
+
+def _csv_response(request, filename: str, header, rows):
+    use_gzip = request.GET.get("gzip") == "1"
+    blocks = _iter_csv(header, rows, use_gzip)
+    if isinstance(request, ASGIRequest):
+        blocks = _aiter_blocks(blocks)
+    if use_gzip:
+        resp = StreamingHttpResponse(blocks, content_type="application/gzip")
+        filename += ".gz"
+    else:
+        resp = StreamingHttpResponse(blocks, content_type="text/csv; charset=utf-8")
+    resp["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return resp
+
+
 @staff_member_required
 def export_tickets_csv(request, raffle_id: int):
-    raffle = Raffle.objects.filter(id=raffle_id).first()
-    if not raffle:
+    if not Raffle.objects.filter(id=raffle_id).exists():
         return HttpResponseBadRequest("Rifa no existe")
 
-    resp = HttpResponse(content_type="text/csv; charset=utf-8")
-    resp["Content-Disposition"] = f'attachment; filename="tickets_raffle_{raffle_id}.csv"'
-    writer = csv.writer(resp)
-    writer.writerow(["raffle_id", "number", "buyer_name", "buyer_email", "buyer_phone", "created_at", "payment_id"])
-
-    qs = Ticket.objects.filter(raffle_id=raffle_id).select_related("payment").order_by("number")
-    for t in qs:
-        writer.writerow([t.raffle_id, t.number, t.buyer_name, t.buyer_email, t.buyer_phone, t.created_at, t.payment_id])
-    return resp
+    header = ["raffle_id", "number", "number_end", "buyer_name", "buyer_email", "buyer_phone", "created_at", "payment_id"]
+    rows = (
+        Ticket.objects.filter(raffle_id=raffle_id)
+        .order_by("number")
+        .values_list(*header)
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    return _csv_response(request, f"tickets_raffle_{raffle_id}.csv", header, rows)
 
 @staff_member_required
 def export_payments_csv(request, raffle_id: int):
-    raffle = Raffle.objects.filter(id=raffle_id).first()
-    if not raffle:
+    if not Raffle.objects.filter(id=raffle_id).exists():
         return HttpResponseBadRequest("Rifa no existe")
 
-    resp = HttpResponse(content_type="text/csv; charset=utf-8")
-    resp["Content-Disposition"] = f'attachment; filename="payments_raffle_{raffle_id}.csv"'
-    writer = csv.writer(resp)
-    writer.writerow(["raffle_id","status","amount_clp","gateway","gateway_payment_id",
-                     "buyer_name","buyer_email","buyer_phone","created_at","paid_at"])
-
-    qs = Payment.objects.filter(raffle_id=raffle_id).order_by("-created_at")
-    for p in qs:
-        writer.writerow([p.raffle_id, p.status, p.amount_clp, p.gateway, p.gateway_payment_id,
-                         p.buyer_name, p.buyer_email, p.buyer_phone, p.created_at, p.paid_at])
-    return resp
+    header = ["raffle_id","status","amount_clp","gateway","gateway_payment_id",
+              "buyer_name","buyer_email","buyer_phone","created_at","paid_at"]
+    rows = (
+        Payment.objects.filter(raffle_id=raffle_id)
+        .order_by("-created_at")
+        .values_list(*header)
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    return _csv_response(request, f"payments_raffle_{raffle_id}.csv", header, rows)
 
 # ============== donaciones ======================== #
 
 @ensure_csrf_cookie
 @require_GET
+@caching.cached_page("donation", public=False)
 def donation_page(request):
     """
     Página simple para recibir donaciones (sin elegir números).
@@ -393,74 +1146,13 @@ def donation_page(request):
 # ============== premios ======================== #
 
 @require_GET
+@caching.cached_page("prizes")
 def prizes_page(request):
     """
     Página con el listado completo de premios de la rifa.
     """
     raffle = _get_active_raffle()
-
-    prizes = [
-        {
-            "name": "Pase diario a Lollapalooza Chile 2026 (viernes 13 de marzo)",
-            "image": "img/prizes/lollapalooza.jpg",
-            "description": "Un pase diario para vivir Lollapalooza Chile 2026 el día viernes 13 de marzo."
-        },
-        {
-            "name": "$50.000 CLP",
-            "image": "img/prizes/50000clp.png",
-            "description": "Premio en dinero por un valor de $50.000 CLP."
-        },
-        {
-            "name": "Plancha de pelo",
-            "image": "img/prizes/plancha_pelo.jpg",
-            "description": "Plancha de pelo para lucir un look increíble."
-        },
-        {
-            "name": "Sesión de limpieza facial",
-            "image": "img/prizes/limpieza_facial.jpg",
-            "description": "Una sesión de limpieza facial para cuidar tu piel."
-        },
-        {
-            "name": "Tabla de picar (grande)",
-            "image": "img/prizes/tabla_picar_grande.png",
-            "description": "Hermosa tabla de picar artesanal hecha con madera nativa."
-        },
-        {
-            "name": "Tabla de picar (pequeña)",
-            "image": "img/prizes/tabla_picar_pequena.png",
-            "description": "Versión pequeña de la tabla de picar artesanal, perfecta para el uso diario."
-        },
-        {
-            "name": "Tabla de picoteo",
-            "image": "img/prizes/tabla_picoteo.png",
-            "description": "Tabla de picoteo artesanal ideal para compartir."
-        },
-        {
-            "name": "Vaporizador facial",
-            "image": "img/prizes/vaporizador_facial.jpg",
-            "description": "Vaporizador facial ideal para rutinas de skincare."
-        },
-        {
-            "name": "Vino Carmenere Gran Reserva",
-            "image": "img/prizes/vino_carmenere.png",
-            "description": "Botella de vino Carmenere Gran Reserva."
-        },
-        {
-            "name": "Vino Cabernet Sauvignon",
-            "image": "img/prizes/vino_cabernet.png",
-            "description": "Botella de vino Cabernet Sauvignon para compartir."
-        },
-        {
-            "name": "Torta 3 leches para 20 personas",
-            "image": "img/prizes/torta.png",
-            "description": "Deliciosa torta casera para celebrar con hasta 20 personas."
-        },
-        {
-            "name": "Pan de Pascua",
-            "image": "img/prizes/pan_pascua.jpg",
-            "description": "Pan de pascua casero con frutos secos."
-        }
-    ]
+    prizes = caching.get_prize_listing(raffle.id) if raffle else []
 
     return render(request, "raffle/prizes.html", {
         "raffle": raffle,
@@ -468,6 +1160,7 @@ def prizes_page(request):
     })
 
 @require_GET
+@caching.cached_page("payment_success", vary_on_query=("kind",))
 def payment_success(request):
     """
     Página de confirmación genérica para reservas o pagos exitosos.
@@ -480,3 +1173,24 @@ def payment_success(request):
         "is_transfer": (kind == "transfer"),
     }
     return render(request, "raffle/payment_success.html", context)
+
+# ============== métricas ======================== #
+
+@require_GET
+def metrics_view(request):
+    """
+    Métricas de todos los workers en formato de texto de Prometheus.
+    Solo staff, o con "Authorization: Bearer <RAFFLE_METRICS_TOKEN>".
+    """
+    token = getattr(settings, "RAFFLE_METRICS_TOKEN", "")
+    auth = request.headers.get("Authorization", "")
+    by_token = bool(token) and constant_time_compare(auth, f"Bearer {token}")
+    if not by_token and not (request.user.is_active and request.user.is_staff):
+        return HttpResponse("No autorizado", status=403)
+
+    resp = HttpResponse(
+        metrics.render(metrics.collect()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+    resp["Cache-Control"] = "no-store"
+    return resp
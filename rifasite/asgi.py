@@ -2,9 +2,16 @@
 ASGI config for rifasite project.
 
 Expone la variable 'application' para servidores ASGI (uvicorn, daphne).
+Necesario para el stream en vivo de disponibilidad (api/availability/stream/).
 """
 import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "rifasite.settings")
 application = get_asgi_application()
+
+# El barrido en segundo plano corre solo en el servidor web (no en migrate,
+# shell ni otros comandos)
+from raffle.sweeper import start_background_sweeper  # noqa: E402
+
+start_background_sweeper()
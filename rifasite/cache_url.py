@@ -0,0 +1,60 @@
+"""
+Configuración de una cache de Django a partir de una URL (como DATABASE_URL):
+
+    redis://[:clave@]host:6379/0        → RedisCache (requiere el paquete redis)
+    memcached://host:11211[,host2:11211] → PyMemcacheCache (requiere pymemcache)
+    file:///ruta/absoluta               → FileBasedCache
+    db://nombre_tabla                   → AtomicDatabaseCache (incr atómico; la
+                                          tabla se crea al migrar)
+    locmem://                           → LocMemCache (no se comparte entre procesos)
+
+Parámetros opcionales en la query: timeout, max_entries, cull_frequency.
+"""
+from urllib.parse import parse_qs, urlparse
+
+from django.core.exceptions import ImproperlyConfigured
+
+BACKENDS = {
+    "redis": "django.core.cache.backends.redis.RedisCache",
+    "rediss": "django.core.cache.backends.redis.RedisCache",
+    "memcached": "django.core.cache.backends.memcached.PyMemcacheCache",
+    "pymemcache": "django.core.cache.backends.memcached.PyMemcacheCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "db": "rifasite.db_cache.AtomicDatabaseCache",
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+}
+
+
+def parse(url: str, key_prefix: str = "", max_entries: int | None = None) -> dict:
+    parsed = urlparse(url)
+    scheme = parsed.scheme
+    if scheme not in BACKENDS:
+        raise ImproperlyConfigured(f"CACHE_URL con esquema no soportado: {scheme!r}")
+
+    if scheme in ("redis", "rediss"):
+        location = parsed._replace(query="").geturl()
+    elif scheme in ("memcached", "pymemcache"):
+        location = parsed.netloc.split(",")
+    elif scheme == "file":
+        location = parsed.path
+    elif scheme == "db":
+        location = parsed.netloc or parsed.path.lstrip("/")
+    else:
+        location = parsed.netloc
+
+    query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+    config = {"BACKEND": BACKENDS[scheme], "LOCATION": location, "KEY_PREFIX": key_prefix}
+    if "timeout" in query:
+        config["TIMEOUT"] = int(query["timeout"])
+
+    # Solo los backends locales (archivo, BD, memoria) desalojan por cantidad
+    if scheme in ("file", "db", "locmem"):
+        options = {}
+        entries = query.get("max_entries", max_entries)
+        if entries is not None:
+            options["MAX_ENTRIES"] = int(entries)
+        if "cull_frequency" in query:
+            options["CULL_FREQUENCY"] = int(query["cull_frequency"])
+        if options:
+            config["OPTIONS"] = options
+    return config
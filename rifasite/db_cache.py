@@ -0,0 +1,52 @@
+"""
+Cache en la BD con incrementos atómicos (esquema db:// de cache_url.py).
+
+DatabaseCache hereda incr de BaseCache (get + set): dos workers que
+incrementan a la vez leen el mismo valor y se pierde uno de los incrementos,
+así que el rate limit cuenta de menos. Aquí incr primero escribe la fila, lo
+que la bloquea hasta el commit (en SQLite bloquea la BD), y recién después
+lee y guarda el valor nuevo, sin tocar el vencimiento.
+"""
+import base64
+import pickle
+
+from asgiref.sync import sync_to_async
+from django.core.cache.backends.db import DatabaseCache
+from django.db import connections, router, transaction
+from django.utils.timezone import now as tz_now
+
+
+class AtomicDatabaseCache(DatabaseCache):
+
+    def incr(self, key, delta=1, version=None):
+        cache_key = self.make_and_validate_key(key, version=version)
+        db = router.db_for_write(self.cache_model_class)
+        connection = connections[db]
+        quote_name = connection.ops.quote_name
+        table = quote_name(self._table)
+        now = tz_now().replace(microsecond=0, tzinfo=None)
+
+        with transaction.atomic(using=db), connection.cursor() as cursor:
+            # UPDATE que no cambia nada: solo toma el bloqueo de la fila
+            cursor.execute(
+                f"UPDATE {table} SET {quote_name('expires')} = {quote_name('expires')} "
+                f"WHERE {quote_name('cache_key')} = %s AND {quote_name('expires')} > %s",
+                [cache_key, connection.ops.adapt_datetimefield_value(now)],
+            )
+            if not cursor.rowcount:
+                raise ValueError(f"Key '{key}' not found")
+            cursor.execute(
+                f"SELECT {quote_name('value')} FROM {table} WHERE {quote_name('cache_key')} = %s",
+                [cache_key],
+            )
+            stored = connection.ops.process_clob(cursor.fetchone()[0])
+            value = pickle.loads(base64.b64decode(stored.encode())) + delta
+            cursor.execute(
+                f"UPDATE {table} SET {quote_name('value')} = %s WHERE {quote_name('cache_key')} = %s",
+                [base64.b64encode(pickle.dumps(value, self.pickle_protocol)).decode("latin1"), cache_key],
+            )
+        return value
+
+    async def aincr(self, key, delta=1, version=None):
+        # BaseCache.aincr usa aget + aset, no incr
+        return await sync_to_async(self.incr)(key, delta, version)
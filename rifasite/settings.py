@@ -3,6 +3,8 @@ from pathlib import Path
 from dotenv import load_dotenv
 import dj_database_url
 
+from . import cache_url
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(BASE_DIR / ".env")
 
@@ -27,6 +29,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "raffle.middleware.MetricsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -56,7 +59,8 @@ if "DATABASE_URL" in os.environ:
         "default": dj_database_url.parse(
             os.environ["DATABASE_URL"],
             conn_max_age=600,
-            ssl_require=True,
+            # DATABASE_SSL_REQUIRE=0 para un Postgres local (ej. benchmarks)
+            ssl_require=os.getenv("DATABASE_SSL_REQUIRE", "1") == "1",
         )
     }
 else:
@@ -67,6 +71,26 @@ else:
         }
     }
 
+# Cache compartida entre workers (rate limit, rifa activa, mapa de
+# disponibilidad, fragmentos de la grilla, métricas). CACHE_URL acepta
+# redis://, memcached://, file://, db:// o locmem:// (ver cache_url.py).
+# Por defecto, una tabla en la misma BD: sin servicios externos, con
+# incrementos atómicos (rate limit exacto) y compartida por todos los
+# procesos. En producción usar Redis (`check --deploy` lo exige). Al superar
+# max_entries Django borra claves sin mirar cuáles son, así que el tope es
+# alto: mapas, eventos y métricas no deben desalojarse.
+CACHES = {
+    "default": cache_url.parse(
+        os.getenv("CACHE_URL", "db://rifa_cache"),
+        key_prefix=os.getenv("CACHE_KEY_PREFIX", "rifa"),
+        max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "100000")),
+    )
+}
+
+# django_ratelimit usa la misma cache, con sus claves bajo "ratelimit:"
+RATELIMIT_USE_CACHE = "default"
+RATELIMIT_CACHE_PREFIX = "ratelimit:"
+
 LANGUAGE_CODE = "es-cl"
 TIME_ZONE = "America/Santiago"
 USE_I18N = True
@@ -74,4 +98,23 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+# STATICFILES_STORAGE ya no existe desde Django 5.1: se configura con STORAGES
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage"},
+}
+
+# Grilla de números: "server" (páginas HTMX) o "client" (una sola descarga
+# de disponibilidad y paginación en el navegador)
+RAFFLE_GRID_MODE = os.getenv("RAFFLE_GRID_MODE", "server")
+
+# Segundos entre barridos de reservas vencidas dentro del servidor web (lo
+# arrancan asgi.py / wsgi.py, no los comandos de manage.py). 0 = desactivado;
+# usar entonces cron con `manage.py expire_reservations` o `--loop N`
+RAFFLE_SWEEP_INTERVAL = int(os.getenv("RAFFLE_SWEEP_INTERVAL", "0"))
+
+# Métricas (/metrics): cada cuántos segundos un worker publica las suyas en la
+# cache compartida, y token opcional para que Prometheus lea sin sesión de staff
+# (header "Authorization: Bearer <token>")
+RAFFLE_METRICS_FLUSH_SECONDS = int(os.getenv("RAFFLE_METRICS_FLUSH_SECONDS", "10"))
+RAFFLE_METRICS_TOKEN = os.getenv("RAFFLE_METRICS_TOKEN", "")
@@ -8,3 +8,9 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "rifasite.settings")
 application = get_wsgi_application()
+
+# El barrido en segundo plano corre solo en el servidor web (no en migrate,
+# shell ni otros comandos)
+from raffle.sweeper import start_background_sweeper  # noqa: E402
+
+start_background_sweeper()